@@ -12,15 +12,40 @@ Features:
 """
 
 import os
+import atexit
+import contextlib
+import csv
 import hashlib
+import importlib
+import io
 import json
+import mmap
 import sqlite3
 import sys
 import signal
 import time
 import re
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import heapq
+import itertools
+import queue
+import random
+import select
+import stat
+import struct
+import ssl
+import tarfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any, BinaryIO, Callable, Iterable, Iterator
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Vendored Libraries Support
@@ -35,9 +60,43 @@ if VENDOR_DIR.exists():
 # ─────────────────────────────────────────────────────────────────────────────
 # Third-party Imports (from vendor or system)
 # ─────────────────────────────────────────────────────────────────────────────
-import questionary
-from internetarchive import get_item
-from tqdm import tqdm
+class LazyImport:
+    """
+    Stands in for a module, or one of its attributes, and imports it on
+    first use. questionary (with prompt_toolkit) is only needed by the
+    menus, internetarchive (with requests) only once IA is contacted and
+    asyncio only by the async engine and multipart uploads, so headless
+    runs, reports and argument errors don't pay for them.
+    """
+    def __init__(self, module: str, attribute: Optional[str] = None):
+        object.__setattr__(self, '_module', module)
+        object.__setattr__(self, '_attribute', attribute)
+        object.__setattr__(self, '_target', None)
+
+    def load(self):
+        """Import the module now (thread-safe: the import system holds its own lock)."""
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            if self._attribute is not None:
+                target = getattr(target, self._attribute)
+            object.__setattr__(self, '_target', target)
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.load(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+
+questionary = LazyImport('questionary')
+get_session = LazyImport('internetarchive', 'get_session')
+HTTPAdapter = LazyImport('requests.adapters', 'HTTPAdapter')
+tqdm = LazyImport('tqdm', 'tqdm')
+asyncio = LazyImport('asyncio')
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Configuration & Identifiers
@@ -49,9 +108,171 @@ IDENTIFIERS_FILE = CONFIG_DIR / "identifiers.json"
 METADATA_FILE = CONFIG_DIR / "metadata.json"
 UPLOAD_LOG_DB = CONFIG_DIR / "upload_log.db"
 
+# Number of files uploaded in parallel by the worker pool
+DEFAULT_UPLOAD_CONCURRENCY = 4
+
+# Upload engines: 'ia' uses internetarchive's item.upload in worker threads,
+# 'async' streams PUTs straight to IA-S3 from a single asyncio event loop
+UPLOAD_ENGINES = ('ia', 'async')
+IA_S3_ENDPOINT = "https://s3.us.archive.org"
+DEFAULT_ASYNC_CONCURRENCY = 64   # PUT requests in flight at once
+DEFAULT_ASYNC_IO_THREADS = 4     # OS threads used for file reads
+
+# Request bodies are read from disk into a reused buffer and handed to the
+# socket this many bytes at a time (--block-size). Over plain HTTP (a local
+# stand-in or proxy) the async engine sends files with sendfile() instead.
+DEFAULT_UPLOAD_BLOCK_SIZE = 1024 * 1024
+UPLOAD_BLOCK_SIZE_RANGE = (4 * 1024, 64 * 1024 ** 2)
+
+# Files at or above this size are uploaded as S3 multipart parts
+DEFAULT_MULTIPART_THRESHOLD = 1024 ** 3   # 1 GiB
+MULTIPART_PART_SIZE = 64 * 1024 ** 2      # Minimum part size (raised for huge files)
+MULTIPART_MAX_PARTS = 10000               # S3 limit on parts per upload
+MULTIPART_PARALLEL_PARTS = 4              # Parts of one file in flight at once
+
+# Small-file packing: files below the threshold are sent as members of
+# uncompressed zip or tar archives, built while they are uploaded
+PACK_FORMATS = ('zip', 'tar')
+DEFAULT_PACK_THRESHOLD = 100 * 1024       # Files smaller than this are packed
+DEFAULT_PACK_SIZE = 64 * 1024 ** 2        # Archives are closed once they reach this size
+PACK_MAX_SIZE = 4 * 1024 ** 3 - 1         # Zip offsets are 32-bit (no ZIP64)
+PACK_MAX_MEMBERS = 10000                  # Files per archive
+PACK_READ_SIZE = 1024 * 1024              # Bytes read from a member at once
+PACK_DIR = '_packed'                      # Remote directory holding the archives
+
+# Shared HTTP session: keep-alive connections kept open per host beyond the
+# upload workers (listing, metadata and limit checks), and hosts pooled
+HTTP_POOL_EXTRA = 4
+HTTP_POOL_HOSTS = 10
+
+# Rate control: uploads in flight grow by one per window of successes and
+# halve on SlowDown/503 (once per cooldown, so a burst counts once). New
+# uploads pause for Retry-After, or the default pause when IA sends none.
+THROTTLE_STATUSES = (429, 503)
+RATE_DECREASE_COOLDOWN = 2.0
+RATE_DEFAULT_PAUSE = 2.0
+RATE_MAX_PAUSE = 300.0
+RATE_CHECK_INTERVAL = 5.0   # Seconds an IA-S3 check_limit answer is reused
+
+# Retries: one budget of attempts per file. A failed file waits out an
+# exponential backoff with jitter in a retry queue while others upload;
+# once this many are waiting, no new files are started.
+UPLOAD_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 300.0
+RETRY_QUEUE_SIZE = 1024
+TRANSIENT_STATUSES = (408, 429)   # Plus every 5xx; other 4xx won't succeed on retry
+
+# Bandwidth cap shared by all uploads of the process; the token bucket holds
+# at most this many seconds' worth of bytes, so idle time can't build a burst
+BANDWIDTH_BURST_SECONDS = 1.0
+# The cap can change while running: the control file holds a rate ('5M', '20%'
+# of --max-bandwidth, or 'off') that overrides the schedule while it exists.
+# Both are re-checked this often, or at once on SIGUSR1.
+BANDWIDTH_CONTROL_FILE = CONFIG_DIR / "bandwidth"
+BANDWIDTH_CHECK_INTERVAL = 5.0
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Batch mode: identifiers uploaded at once, and where per-identifier reports go
+DEFAULT_BATCH_JOBS = 4
+BATCH_REPORT_DIR = CONFIG_DIR / "batch_reports"
+
+# Startup benchmark: the lazily imported dependencies each entry point ends
+# up loading, runs per entry point, and the CSV the results are appended to
+STARTUP_ENTRY_POINTS = {
+    'cli': (),   # --help, --report, argument and validation errors
+    'upload-async': ('tqdm', 'internetarchive', 'asyncio'),
+    'upload-ia': ('tqdm', 'internetarchive', 'requests.adapters'),
+    'interactive': ('tqdm', 'internetarchive', 'requests.adapters', 'questionary'),
+}
+DEFAULT_BENCHMARK_RUNS = 5
+STARTUP_BENCHMARK_LOG = CONFIG_DIR / "startup_benchmark.csv"
+
+# Body throughput benchmark: size of the scratch file sent over loopback,
+# and the block size the HTTP stack used to ask the old body wrapper for
+DEFAULT_BODY_BENCHMARK_SIZE = 256 * 1024 ** 2
+LEGACY_BODY_READ_SIZE = 16 * 1024
+
+# Directory scanner threads; listing directories is I/O-bound (slow on network mounts)
+DEFAULT_SCAN_WORKERS = 16
+
+# Directories modified this close to their snapshot are always re-listed,
+# since a change in the same clock tick would leave the mtime unchanged
+SNAPSHOT_RACY_WINDOW_NS = 2 * 10 ** 9
+
+# Hashing engine: hashlib releases the GIL on large buffers, so threads scale
+DEFAULT_HASH_WORKERS = min(8, os.cpu_count() or 1)
+HASH_BUFFER_SIZE = 4 * 1024 ** 2          # Reusable readinto() buffer per worker
+HASH_MMAP_THRESHOLD = 64 * 1024 ** 2      # Files this big are hashed through mmap
+
+# Page cache use of the one-pass reads for hashing and uploading (--page-cache):
+# 'keep' reads normally, 'drop' reads sequentially and evicts what was read
+# (posix_fadvise), 'direct' bypasses the cache with O_DIRECT where the
+# filesystem allows it
+PAGE_CACHE_MODES = ('keep', 'drop', 'direct')
+PAGE_CACHE_DROP_INTERVAL = 16 * 1024 ** 2   # Bytes read between DONTNEED hints
+DIRECT_IO_ALIGNMENT = 4096                  # O_DIRECT offsets and buffers are multiples of this
+DIRECT_IO_BUFFER_SIZE = 4 * 1024 ** 2       # Aligned read buffer per O_DIRECT file
+
+# Files waiting between pipeline stages (scan → hash → upload → verify), per queue
+PIPELINE_QUEUE_SIZE = 1024
+
+# Uploaded files IA confirmed by MD5 are checked and forgotten in batches of this many
+VERIFY_BATCH_SIZE = 1024
+
+# Progress display: 'auto' draws a bar on a terminal and writes plain status
+# lines otherwise. The bar is redrawn every PROGRESS_INTERVAL seconds and
+# lists the largest active transfers; lines come every PROGRESS_LOG_INTERVAL.
+PROGRESS_MODES = ('auto', 'bar', 'lines', 'off')
+PROGRESS_INTERVAL = 0.5
+PROGRESS_LOG_INTERVAL = 10.0
+PROGRESS_TOP_TRANSFERS = 5
+
+# Watch mode: seconds a file must stay unchanged before upload, and the
+# rescan interval where inotify isn't available
+WATCH_SETTLE_SECONDS = 10
+WATCH_POLL_INTERVAL = 60
+
+# Upload log writes are committed in batches of this many statements,
+# or after this many seconds, whichever comes first
+UPLOAD_LOG_BATCH_SIZE = 500
+UPLOAD_LOG_BATCH_INTERVAL = 2.0
+
+# Stat fields stored per file; if they all match, the file is unchanged
+STAT_FIELDS = ('mtime_ns', 'ctime_ns', 'dev', 'inode')
+
+# Outcome of the latest upload of a file, kept in upload_log; `archive` is
+# the archive a packed file went up in
+HISTORY_FIELDS = ('uploaded_at', 'attempts', 'last_error', 'bytes_per_sec', 'duration', 'archive')
+
+# Process exit codes, so schedulers can tell outcomes apart (2 is argparse's
+# usage error). A run with failed uploads is partial if anything else went up.
+EXIT_OK = 0
+EXIT_FAILED = 1        # No file is on IA: every upload failed, or the run stopped on an error
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3       # Some files failed to upload
+EXIT_MISMATCH = 4      # Every upload went through, but verification found differences
+EXIT_INTERRUPTED = 130
+STATUS_EXIT_CODES = {'ok': EXIT_OK, 'empty': EXIT_FAILED, 'error': EXIT_FAILED, 'failed': EXIT_FAILED,
+                     'invalid': EXIT_USAGE, 'partial': EXIT_PARTIAL, 'mismatch': EXIT_MISMATCH,
+                     'interrupted': EXIT_INTERRUPTED}
+
+# --output json prints one result object on stdout; everything else goes to stderr
+OUTPUT_FORMATS = ('text', 'json')
+
 # Global flag for graceful shutdown
 quit_flag = False
 
+# How progress is shown (--progress); see resolve_progress_mode()
+progress_mode = 'auto'
+
+# Upload body block size (--block-size) and whether sendfile() may be used (--no-sendfile)
+upload_block_size = DEFAULT_UPLOAD_BLOCK_SIZE
+use_sendfile = True
+
+# How file reads use the page cache (--page-cache); see open_for_read()
+page_cache_mode = 'keep'
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Signal Handling
 # ─────────────────────────────────────────────────────────────────────────────
@@ -68,8 +289,15 @@ def signal_handler(sig, frame):
     raise KeyboardInterrupt("Interrupted by user")
 
 
+def bandwidth_signal_handler(sig, frame):
+    # Only sets a flag: the limiter's lock may be held by the interrupted thread
+    bandwidth_limiter.request_refresh()
+
+
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
+if hasattr(signal, 'SIGUSR1'):
+    signal.signal(signal.SIGUSR1, bandwidth_signal_handler)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Configuration Directory & Identifiers
@@ -128,6 +356,27 @@ def save_metadata(identifier: str, metadata: Dict[str, Any]):
         json.dump(all_metadata, f, indent=4, sort_keys=True)
 
 
+def load_metadata_file(path: Path) -> Dict[str, Any]:
+    """
+    Read item metadata from a JSON object with the fields of
+    get_default_metadata(); a list of subjects is joined with semicolons.
+    Raises ValueError for anything else.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object of metadata fields")
+    metadata = get_default_metadata()
+    unknown = sorted(set(data) - set(metadata))
+    if unknown:
+        raise ValueError(f"unknown metadata field(s): {', '.join(unknown)}")
+    for key, value in data.items():
+        if isinstance(value, list) and key == 'subject':
+            value = ';'.join(str(v) for v in value)
+        metadata[key] = '' if value is None else str(value)
+    return metadata
+
+
 def get_default_metadata() -> Dict[str, Any]:
     """Return default metadata structure."""
     return {
@@ -222,11 +471,118 @@ def collect_metadata(identifier: str, existing_metadata: Optional[Dict[str, Any]
 # ─────────────────────────────────────────────────────────────────────────────
 # SQLite Upload Log
 # ─────────────────────────────────────────────────────────────────────────────
-def create_upload_log_db():
-    """Create upload log database if it doesn't exist."""
-    ensure_config_dir()
-    conn = sqlite3.connect(UPLOAD_LOG_DB)
-    c = conn.cursor()
+class UploadLogStore:
+    """
+    Long-lived connection to the upload log database.
+
+    Uses WAL journaling and groups writes into batched transactions that are
+    committed every `batch_size` writes or `batch_interval` seconds, whichever
+    comes first. SQL strings are constant, so sqlite3's statement cache keeps
+    them prepared. All access goes through one lock, so worker threads can
+    share the store; reads see writes still waiting in the open batch.
+    """
+    def __init__(self, path: Path = UPLOAD_LOG_DB, batch_size: int = UPLOAD_LOG_BATCH_SIZE,
+                 batch_interval: float = UPLOAD_LOG_BATCH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.lock = threading.RLock()
+        # Transactions are managed explicitly (BEGIN ... COMMIT)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None,
+                                    timeout=30, cached_statements=256)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.pending = 0
+        self.batch_started = 0.0
+        self.commits = 0
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="upload-log-flush", daemon=True)
+        self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.batch_interval / 4):
+            with self.lock:
+                if self.pending and time.monotonic() - self.batch_started >= self.batch_interval:
+                    self._commit()
+
+    def _commit(self):
+        if self.conn.in_transaction:
+            self.conn.execute('COMMIT')
+            self.commits += 1
+        self.pending = 0
+
+    def write(self, sql: str, params: Any = (), many: bool = False, durable: bool = False):
+        """
+        Run a write statement inside the current batch.
+        `durable=True` commits immediately (e.g. multipart progress).
+        """
+        with self.lock:
+            if not self.conn.in_transaction:
+                self.conn.execute('BEGIN')
+                self.batch_started = time.monotonic()
+            if many:
+                self.conn.executemany(sql, params)
+            else:
+                self.conn.execute(sql, params)
+            self.pending += 1
+            if (durable or self.pending >= self.batch_size
+                    or time.monotonic() - self.batch_started >= self.batch_interval):
+                self._commit()
+
+    def query(self, sql: str, params: Any = ()) -> List[Tuple]:
+        """Run a read statement and return all rows."""
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def flush(self):
+        """Commit the pending batch."""
+        with self.lock:
+            self._commit()
+
+    def close(self):
+        """Flush pending writes and close the connection."""
+        self._stop.set()
+        with self.lock:
+            if self.conn is not None:
+                self._commit()
+                self.conn.close()
+                self.conn = None
+
+
+_upload_log_store: Optional[UploadLogStore] = None
+_upload_log_store_lock = threading.Lock()
+
+
+def get_upload_log_store() -> UploadLogStore:
+    """Return the process-wide upload log store, opening it on first use."""
+    global _upload_log_store
+    with _upload_log_store_lock:
+        if _upload_log_store is None:
+            ensure_config_dir()
+            _upload_log_store = UploadLogStore()
+            # Pending writes are flushed on normal exit, sys.exit() and Ctrl+C
+            atexit.register(close_upload_log_store)
+        return _upload_log_store
+
+
+def close_upload_log_store():
+    """Flush and close the upload log store if it is open."""
+    global _upload_log_store
+    with _upload_log_store_lock:
+        if _upload_log_store is not None:
+            _upload_log_store.close()
+            _upload_log_store = None
+
+
+def _add_column(c: sqlite3.Cursor, table: str, column: str, declaration: str):
+    """Add a column unless it already exists (older scripts added some ad hoc)."""
+    columns = {row[1] for row in c.execute(f'PRAGMA table_info({table})')}
+    if column not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def _migrate_v1(c: sqlite3.Cursor):
+    """Original upload log plus multipart resume state."""
     c.execute('''
         CREATE TABLE IF NOT EXISTS upload_log (
             identifier TEXT,
@@ -237,42 +593,500 @@ def create_upload_log_db():
             PRIMARY KEY (identifier, filename)
         )
     ''')
-    conn.commit()
-    conn.close()
+    # In-progress multipart uploads and their finished parts (for resume)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS multipart_uploads (
+            identifier TEXT,
+            filename TEXT,
+            upload_id TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            part_size INTEGER,
+            PRIMARY KEY (identifier, filename)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS multipart_parts (
+            identifier TEXT,
+            filename TEXT,
+            upload_id TEXT,
+            part_number INTEGER,
+            etag TEXT,
+            PRIMARY KEY (identifier, filename, part_number)
+        )
+    ''')
+
+
+def _migrate_v2(c: sqlite3.Cursor):
+    """Stat data for change detection."""
+    for column in STAT_FIELDS:
+        _add_column(c, 'upload_log', column, 'INTEGER')
+
+
+def _migrate_v3(c: sqlite3.Cursor):
+    """Upload history, per-attempt log and indexes for reports and dedup."""
+    _add_column(c, 'upload_log', 'uploaded_at', 'REAL')
+    _add_column(c, 'upload_log', 'attempts', 'INTEGER')
+    _add_column(c, 'upload_log', 'last_error', 'TEXT')
+    _add_column(c, 'upload_log', 'bytes_per_sec', 'REAL')
+    _add_column(c, 'upload_log', 'duration', 'REAL')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS upload_attempts (
+            id INTEGER PRIMARY KEY,
+            identifier TEXT,
+            filename TEXT,
+            attempt INTEGER,
+            started_at REAL,
+            duration REAL,
+            bytes INTEGER,
+            bytes_per_sec REAL,
+            status TEXT,
+            error TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_upload_log_uploaded ON upload_log (identifier, uploaded)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_upload_log_md5 ON upload_log (md5_hash)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_upload_attempts_file ON upload_attempts (identifier, filename)')
+
+
+def _migrate_v4(c: sqlite3.Cursor):
+    """Directory snapshots of local trees for incremental rescans."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_dirs (
+            root TEXT,
+            path TEXT,
+            parent TEXT,
+            is_symlink INTEGER,
+            dev INTEGER,
+            inode INTEGER,
+            mtime_ns INTEGER,
+            entry_count INTEGER,
+            scanned_at_ns INTEGER,
+            PRIMARY KEY (root, path)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_files (
+            root TEXT,
+            dir TEXT,
+            name TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            ctime_ns INTEGER,
+            dev INTEGER,
+            inode INTEGER,
+            PRIMARY KEY (root, dir, name)
+        )
+    ''')
+
+
+def _migrate_v5(c: sqlite3.Cursor):
+    """Cached IA file listings, keyed by the item's last-updated time."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ia_listings (
+            identifier TEXT PRIMARY KEY,
+            last_updated INTEGER,
+            fetched_at REAL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ia_listing_files (
+            identifier TEXT,
+            filename TEXT,
+            size INTEGER,
+            md5 TEXT,
+            PRIMARY KEY (identifier, filename)
+        )
+    ''')
+
+
+def _migrate_v6(c: sqlite3.Cursor):
+    """When each file was last re-hashed and checked against IA by a deep verify."""
+    _add_column(c, 'upload_log', 'deep_verified_at', 'REAL')
+
+
+def _migrate_v7(c: sqlite3.Cursor):
+    """Archive each packed small file was uploaded in."""
+    _add_column(c, 'upload_log', 'archive', 'TEXT')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_upload_log_archive ON upload_log (identifier, archive)')
+
+
+# Schema migrations in order; PRAGMA user_version holds the last one applied
+UPLOAD_LOG_MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+]
+UPLOAD_LOG_SCHEMA_VERSION = UPLOAD_LOG_MIGRATIONS[-1][0]
+
+
+def create_upload_log_db():
+    """Create the upload log database, or migrate it to the current schema."""
+    store = get_upload_log_store()
+    with store.lock:
+        store.flush()
+        c = store.conn.cursor()
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        if version > UPLOAD_LOG_SCHEMA_VERSION:
+            print(f"⚠️  Upload log schema v{version} is newer than this script (v{UPLOAD_LOG_SCHEMA_VERSION})")
+            return
+        for target, migrate in UPLOAD_LOG_MIGRATIONS:
+            if target <= version:
+                continue
+            # Each step is atomic, so an interrupted migration is simply re-run
+            c.execute('BEGIN')
+            try:
+                migrate(c)
+                c.execute(f'PRAGMA user_version = {target}')
+                c.execute('COMMIT')
+            except BaseException:
+                c.execute('ROLLBACK')
+                raise
+
+
+# Upload history columns change only when the row comes from an upload attempt
+_KEEP_HISTORY_SQL = ', '.join(
+    f'{field} = CASE WHEN excluded.attempts IS NOT NULL THEN excluded.{field} ELSE upload_log.{field} END'
+    for field in HISTORY_FIELDS
+)
 
 
 def update_upload_log(identifier: str, files_info: List[Dict[str, Any]]):
-    """Update upload log with file information."""
-    conn = sqlite3.connect(UPLOAD_LOG_DB)
-    c = conn.cursor()
+    """Update upload log with file information (safe to call from workers)."""
     data = [
-        (identifier, f['relative_path'], f['size'], f['uploaded'], f.get('md5_hash'))
+        (identifier, f['relative_path'], f['size'], f['uploaded'], f.get('md5_hash'),
+         *(f.get(field) for field in STAT_FIELDS),
+         *(f.get(field) for field in HISTORY_FIELDS))
         for f in files_info
     ]
-    c.executemany('''
-        INSERT OR REPLACE INTO upload_log (identifier, filename, size, uploaded, md5_hash)
-        VALUES (?, ?, ?, ?, ?)
-    ''', data)
-    conn.commit()
-    conn.close()
+    get_upload_log_store().write(f'''
+        INSERT INTO upload_log
+            (identifier, filename, size, uploaded, md5_hash, mtime_ns, ctime_ns, dev, inode,
+             uploaded_at, attempts, last_error, bytes_per_sec, duration, archive)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (identifier, filename) DO UPDATE SET
+            size = excluded.size,
+            uploaded = excluded.uploaded,
+            md5_hash = excluded.md5_hash,
+            mtime_ns = excluded.mtime_ns,
+            ctime_ns = excluded.ctime_ns,
+            dev = excluded.dev,
+            inode = excluded.inode,
+            {_KEEP_HISTORY_SQL}
+    ''', data, many=True)
+
+
+def record_deep_verified(identifier: str, filenames: List[str]):
+    """Stamp files whose local content was re-hashed and matched IA."""
+    now = time.time()
+    get_upload_log_store().write(
+        'UPDATE upload_log SET deep_verified_at = ? WHERE identifier = ? AND filename = ?',
+        [(now, identifier, filename) for filename in filenames], many=True
+    )
 
 
-def load_upload_log(identifier: str) -> Dict[str, Dict[str, Any]]:
-    """Load upload log for a specific identifier."""
-    conn = sqlite3.connect(UPLOAD_LOG_DB)
-    c = conn.cursor()
-    c.execute(
-        'SELECT filename, size, uploaded, md5_hash FROM upload_log WHERE identifier = ?',
+def deep_verify_key(filename: str, deep_verified_at: Optional[float]) -> Tuple:
+    """Order in which a partial deep verify takes files: never verified first, then longest ago."""
+    return (deep_verified_at is not None, deep_verified_at or 0.0, filename)
+
+
+def deep_verify_cutoff(identifier: str, percent: float) -> Optional[Tuple]:
+    """
+    deep_verify_key() of the last of the `percent` of uploaded files that are
+    due for a deep verify; every file with a key up to it is. None if none is.
+    """
+    store = get_upload_log_store()
+    (count,), = store.query('SELECT COUNT(*) FROM upload_log WHERE identifier = ? AND uploaded = 1',
+                            (identifier,))
+    due = -(-count * percent // 100)
+    if not due:
+        return None
+    (filename, deep_verified_at), = store.query('''
+        SELECT filename, deep_verified_at FROM upload_log WHERE identifier = ? AND uploaded = 1
+        ORDER BY deep_verified_at IS NOT NULL, deep_verified_at, filename
+        LIMIT 1 OFFSET ?
+    ''', (identifier, int(due) - 1))
+    return deep_verify_key(filename, deep_verified_at)
+
+
+def record_upload_attempt(identifier: str, file_info: Dict[str, Any], attempt: int,
+                          started_at: float, status: Any = None, error: Optional[str] = None):
+    """
+    Append one upload attempt to the history table and update the
+    attempt summary in file_info (written to upload_log with the file).
+    """
+    duration = time.time() - started_at
+    succeeded = error is None
+    nbytes = file_info['size'] if succeeded else None
+    bytes_per_sec = nbytes / duration if succeeded and duration > 0 else None
+    file_info['attempts'] = attempt
+    file_info['last_error'] = error
+    if succeeded:
+        file_info['uploaded_at'] = time.time()
+        file_info['duration'] = duration
+        file_info['bytes_per_sec'] = bytes_per_sec
+    get_upload_log_store().write('''
+        INSERT INTO upload_attempts
+            (identifier, filename, attempt, started_at, duration, bytes, bytes_per_sec, status, error)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (identifier, file_info['relative_path'], attempt, started_at, duration,
+          nbytes, bytes_per_sec, None if status is None else str(status), error))
+
+
+def query_failed_uploads(identifier: str) -> List[Tuple]:
+    """(filename, attempts, last_error) for files whose last upload failed."""
+    return get_upload_log_store().query(
+        'SELECT filename, attempts, last_error FROM upload_log '
+        'WHERE identifier = ? AND uploaded = 0 ORDER BY filename',
         (identifier,)
     )
-    rows = c.fetchall()
-    conn.close()
+
+
+def query_slow_uploads(identifier: str, limit: int = 20) -> List[Tuple]:
+    """(filename, size, bytes_per_sec, duration) for the slowest uploads."""
+    return get_upload_log_store().query(
+        'SELECT filename, size, bytes_per_sec, duration FROM upload_log '
+        'WHERE identifier = ? AND uploaded = 1 AND bytes_per_sec IS NOT NULL '
+        'ORDER BY bytes_per_sec LIMIT ?',
+        (identifier, limit)
+    )
+
+
+def query_duplicate_uploads(identifier: str) -> List[Tuple[str, List[Tuple]]]:
+    """(md5, [(identifier, filename), ...]) for files of this item stored more than once."""
+    rows = get_upload_log_store().query('''
+        SELECT md5_hash, identifier, filename FROM upload_log
+        WHERE uploaded = 1 AND md5_hash IN (
+            SELECT md5_hash FROM upload_log
+            WHERE uploaded = 1 AND md5_hash IN (
+                SELECT md5_hash FROM upload_log WHERE identifier = ? AND md5_hash IS NOT NULL
+            )
+            GROUP BY md5_hash HAVING COUNT(*) > 1
+        )
+        ORDER BY md5_hash, identifier, filename
+    ''', (identifier,))
+    return [
+        (md5_hash, [(copy_identifier, filename) for _, copy_identifier, filename in copies])
+        for md5_hash, copies in itertools.groupby(rows, key=lambda row: row[0])
+    ]
+
+
+# Keep local stat data only while IA still reports the same size and MD5
+_KEEP_STAT_SQL = ', '.join(
+    f'{field} = CASE WHEN upload_log.size IS excluded.size '
+    f'AND upload_log.md5_hash IS excluded.md5_hash THEN upload_log.{field} END'
+    for field in STAT_FIELDS
+)
+
+
+def sync_upload_log(identifier: str, files_info: List[Dict[str, Any]]):
+    """
+    Merge the IA file listing into the upload log.
+    Local stat data is kept only while IA still reports the same size and MD5,
+    so a file replaced on IA is re-checked against the local copy.
+    """
+    data = [
+        (identifier, f['relative_path'], f['size'], f['uploaded'], f.get('md5_hash'))
+        for f in files_info
+    ]
+    get_upload_log_store().write(f'''
+        INSERT INTO upload_log (identifier, filename, size, uploaded, md5_hash)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (identifier, filename) DO UPDATE SET
+            size = excluded.size,
+            uploaded = excluded.uploaded,
+            md5_hash = excluded.md5_hash,
+            {_KEEP_STAT_SQL}
+    ''', data, many=True)
+
+
+_LOAD_UPLOAD_LOG_SQL = (
+    'SELECT filename, size, uploaded, md5_hash, mtime_ns, ctime_ns, dev, inode, deep_verified_at '
+    'FROM upload_log WHERE identifier = ?'
+)
+
+# SQLite's default limit on bound parameters is 999
+_LOOKUP_CHUNK = 500
+
+
+def _log_entries(rows) -> Dict[str, Dict[str, Any]]:
     return {
-        row[0]: {'size': row[1], 'uploaded': bool(row[2]), 'md5_hash': row[3]}
+        row[0]: {'size': row[1], 'uploaded': bool(row[2]), 'md5_hash': row[3],
+                 **dict(zip(STAT_FIELDS, row[4:8])), 'deep_verified_at': row[8]}
         for row in rows
     }
 
 
+def load_upload_log(identifier: str) -> Dict[str, Dict[str, Any]]:
+    """Load upload log for a specific identifier."""
+    return _log_entries(get_upload_log_store().query(_LOAD_UPLOAD_LOG_SQL, (identifier,)))
+
+
+def load_upload_log_entries(identifier: str, filenames: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Load the upload log entries of just these files (e.g. one scanned directory)."""
+    entries = {}
+    store = get_upload_log_store()
+    for i in range(0, len(filenames), _LOOKUP_CHUNK):
+        chunk = filenames[i:i + _LOOKUP_CHUNK]
+        sql = f"{_LOAD_UPLOAD_LOG_SQL} AND filename IN ({','.join('?' * len(chunk))})"
+        entries.update(_log_entries(store.query(sql, (identifier, *chunk))))
+    return entries
+
+
+def has_upload_log(identifier: str) -> bool:
+    """True if the upload log has any entry for an identifier."""
+    return bool(get_upload_log_store().query(
+        'SELECT 1 FROM upload_log WHERE identifier = ? LIMIT 1', (identifier,)
+    ))
+
+
+def load_packed_files(identifier: str) -> List[Tuple]:
+    """(filename, size, md5, archive, archive size, archive md5) of files uploaded inside archives."""
+    return get_upload_log_store().query('''
+        SELECT m.filename, m.size, m.md5_hash, m.archive, a.size, a.md5_hash
+        FROM upload_log m
+        JOIN upload_log a ON a.identifier = m.identifier AND a.filename = m.archive
+        WHERE m.identifier = ? AND m.archive IS NOT NULL AND m.uploaded = 1
+    ''', (identifier,))
+
+
+def clear_upload_log(identifier: str):
+    """Delete all upload log entries for an identifier."""
+    get_upload_log_store().write('DELETE FROM upload_log WHERE identifier = ?', (identifier,), durable=True)
+
+
+def load_multipart_state(identifier: str, filename: str) -> Optional[Dict[str, Any]]:
+    """Return the saved multipart upload for a file with its finished parts, if any."""
+    store = get_upload_log_store()
+    with store.lock:
+        rows = store.query(
+            'SELECT upload_id, size, mtime_ns, part_size FROM multipart_uploads WHERE identifier = ? AND filename = ?',
+            (identifier, filename)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        parts = dict(store.query(
+            'SELECT part_number, etag FROM multipart_parts WHERE identifier = ? AND filename = ? AND upload_id = ?',
+            (identifier, filename, row[0])
+        ))
+    return {'upload_id': row[0], 'size': row[1], 'mtime_ns': row[2], 'part_size': row[3], 'parts': parts}
+
+
+def save_multipart_upload(identifier: str, filename: str, upload_id: str,
+                          size: int, mtime_ns: int, part_size: int):
+    """Record a newly initiated multipart upload, dropping any older one for the file."""
+    store = get_upload_log_store()
+    with store.lock:
+        store.write('DELETE FROM multipart_parts WHERE identifier = ? AND filename = ?', (identifier, filename))
+        store.write('''
+            INSERT OR REPLACE INTO multipart_uploads (identifier, filename, upload_id, size, mtime_ns, part_size)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (identifier, filename, upload_id, size, mtime_ns, part_size), durable=True)
+
+
+def record_multipart_part(identifier: str, filename: str, upload_id: str, part_number: int, etag: str):
+    """Record a finished part so a restarted upload can skip it."""
+    # Committed right away: a part is worth far more than one fsync
+    get_upload_log_store().write('''
+        INSERT OR REPLACE INTO multipart_parts (identifier, filename, upload_id, part_number, etag)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (identifier, filename, upload_id, part_number, etag), durable=True)
+
+
+def clear_multipart_state(identifier: str, filename: Optional[str] = None):
+    """Forget multipart state for one file, or for the whole identifier."""
+    where = 'identifier = ?' + (' AND filename = ?' if filename is not None else '')
+    params = (identifier, filename) if filename is not None else (identifier,)
+    store = get_upload_log_store()
+    with store.lock:
+        store.write(f'DELETE FROM multipart_parts WHERE {where}', params)
+        store.write(f'DELETE FROM multipart_uploads WHERE {where}', params, durable=True)
+
+
+def load_cached_listing(identifier: str) -> Optional[Tuple[int, Dict[str, Dict[str, Any]]]]:
+    """Return (last_updated, {filename: {'size', 'md5'}}) of the cached IA listing, if any."""
+    store = get_upload_log_store()
+    with store.lock:
+        rows = store.query('SELECT last_updated FROM ia_listings WHERE identifier = ?', (identifier,))
+        if not rows:
+            return None
+        files = store.query('SELECT filename, size, md5 FROM ia_listing_files WHERE identifier = ?', (identifier,))
+    return rows[0][0], {name: {'size': size, 'md5': md5} for name, size, md5 in files}
+
+
+def save_cached_listing(identifier: str, last_updated: int, files: Dict[str, Dict[str, Any]]):
+    """Replace the cached IA listing of an identifier."""
+    store = get_upload_log_store()
+    with store.lock:
+        store.write('DELETE FROM ia_listing_files WHERE identifier = ?', (identifier,))
+        store.write(
+            'INSERT INTO ia_listing_files (identifier, filename, size, md5) VALUES (?, ?, ?, ?)',
+            [(identifier, name, info['size'], info['md5']) for name, info in files.items()], many=True
+        )
+        store.write('''
+            INSERT INTO ia_listings (identifier, last_updated, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT (identifier) DO UPDATE SET
+                last_updated = excluded.last_updated, fetched_at = excluded.fetched_at
+        ''', (identifier, last_updated, time.time()), durable=True)
+
+
+def load_scan_dirs(root: str) -> List[Tuple]:
+    """(path, parent, is_symlink, dev, inode, mtime_ns, entry_count, scanned_at_ns) per saved directory."""
+    return get_upload_log_store().query(
+        'SELECT path, parent, is_symlink, dev, inode, mtime_ns, entry_count, scanned_at_ns '
+        'FROM scan_dirs WHERE root = ?',
+        (root,)
+    )
+
+
+def load_scan_files(root: str, path: str) -> List[Tuple]:
+    """(name, size, mtime_ns, ctime_ns, dev, inode) of the files saved for one directory."""
+    return get_upload_log_store().query(
+        'SELECT name, size, mtime_ns, ctime_ns, dev, inode FROM scan_files WHERE root = ? AND dir = ?',
+        (root, path)
+    )
+
+
+def save_scan_dir(root: str, path: str, parent: Optional[str], st: os.stat_result, scanned_at_ns: int,
+                  files: List[Tuple], subdirs: List[Tuple], removed: List[str]):
+    """
+    Replace the snapshot of one directory: its files, a row per subdirectory
+    (filled in when that subdirectory is listed) and the directory itself,
+    written last so a partial write never looks complete. `removed`
+    subdirectories are dropped with everything below them.
+    """
+    store = get_upload_log_store()
+    with store.lock:
+        for child in removed:
+            # Every path below 'a/b/' sorts between 'a/b/' and 'a/b0'
+            below = (root, child, child[:-1] + '0')
+            store.write('DELETE FROM scan_dirs WHERE root = ? AND path >= ? AND path < ?', below)
+            store.write('DELETE FROM scan_files WHERE root = ? AND dir >= ? AND dir < ?', below)
+        store.write('DELETE FROM scan_files WHERE root = ? AND dir = ?', (root, path))
+        store.write(
+            'INSERT INTO scan_files (root, dir, name, size, mtime_ns, ctime_ns, dev, inode) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(root, path, *f) for f in files], many=True
+        )
+        store.write('''
+            INSERT INTO scan_dirs (root, path, parent, is_symlink, dev, inode) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (root, path) DO UPDATE SET
+                is_symlink = excluded.is_symlink, dev = excluded.dev, inode = excluded.inode
+        ''', [(root, child, path, is_symlink, dev, inode) for child, is_symlink, dev, inode in subdirs], many=True)
+        store.write('''
+            INSERT INTO scan_dirs (root, path, parent, is_symlink, dev, inode, mtime_ns, entry_count, scanned_at_ns)
+            VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?)
+            ON CONFLICT (root, path) DO UPDATE SET
+                dev = excluded.dev, inode = excluded.inode, mtime_ns = excluded.mtime_ns,
+                entry_count = excluded.entry_count, scanned_at_ns = excluded.scanned_at_ns
+        ''', (root, path, parent, st.st_dev, st.st_ino, st.st_mtime_ns, len(files) + len(subdirs), scanned_at_ns))
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # File Operations
 # ─────────────────────────────────────────────────────────────────────────────
@@ -313,9 +1127,9 @@ def validate_identifier(identifier: str) -> Tuple[bool, str, Optional[str]]:
         suggested = 'id_' + suggested
     
     if re.match(pattern, suggested):
-        return False, f"Identifier contains invalid characters", suggested
+        return False, "Identifier contains invalid characters", suggested
     
-    return False, f"Identifier format is invalid (use only letters, numbers, underscores, dots, hyphens)", suggested
+    return False, "Identifier format is invalid (use only letters, numbers, underscores, dots, hyphens)", suggested
 
 
 def validate_path(path: str) -> Tuple[bool, str, Optional[Path]]:
@@ -380,7 +1194,7 @@ def validate_directory_interactive(directory: Optional[str]) -> Tuple[bool, Opti
         if parent.exists():
             similar = [d.name for d in parent.iterdir() if d.is_dir() and d.name.startswith(p.name)]
             if similar:
-                print(f"   💡 Did you mean one of these?")
+                print("   💡 Did you mean one of these?")
                 for s in similar[:5]:
                     print(f"      • {parent / s}")
     
@@ -390,146 +1204,821 @@ def validate_directory_interactive(directory: Optional[str]) -> Tuple[bool, Opti
 def calc_md5(filepath: Path) -> Optional[str]:
     """Calculate MD5 hash of a file."""
     try:
-        h = hashlib.md5()
-        with filepath.open('rb') as f:
-            for chunk in iter(lambda: f.read(8192), b''):
-                h.update(chunk)
-        return h.hexdigest()
+        return _md5_file(filepath)[0]
     except Exception as e:
         print(f"⚠️  Error calculating MD5 for {filepath}: {e}")
         return None
 
 
-def get_local_files(directory: Path) -> Dict[str, Dict[str, Any]]:
-    """
-    Recursively scan directory and return file information.
-    Uses followlinks=True to follow symbolic links.
-    """
-    local_files = {}
-    visited_inodes = set()
+class LocalFile(NamedTuple):
+    """Compact scan record for one local file."""
+    path: str
+    size: int
+    mtime_ns: int
+    ctime_ns: int
+    dev: int
+    inode: int
 
-    try:
-        for root, dirs, files in os.walk(directory, followlinks=True):
-            if quit_flag:
-                break
+    @classmethod
+    def from_stat(cls, path: str, st: os.stat_result) -> 'LocalFile':
+        return cls(path, st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_dev, st.st_ino)
 
-            # Symlink loop protection
-            try:
-                inode = os.stat(root).st_ino
-                if inode in visited_inodes:
-                    dirs[:] = []
-                    continue
-                visited_inodes.add(inode)
-            except OSError:
-                pass
 
-            for filename in files:
+def _entry_stat(entry: os.DirEntry) -> os.stat_result:
+    """Stat a scandir entry (following symlinks), reusing the cached result."""
+    st = entry.stat()
+    if os.name == 'nt' and not st.st_ino:
+        # DirEntry.stat() leaves st_ino/st_dev zero on Windows
+        st = os.stat(entry.path)
+    return st
+
+
+def _scan_one_directory(dirpath: str, prefix: str):
+    """
+    List one directory with os.scandir.
+    Returns (files, subdirs, ok): files are (relative_path, LocalFile) pairs,
+    subdirs are (path, prefix, (dev, inode), is_symlink) tuples.
+    """
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
                 if quit_flag:
                     break
-                filepath = Path(root) / filename
-                relative_path = filepath.relative_to(directory).as_posix()
                 try:
-                    size = filepath.stat().st_size
-                    local_files[relative_path] = {
-                        'path': filepath,
-                        'size': size
-                    }
+                    if entry.is_dir():
+                        st = _entry_stat(entry)
+                        subdirs.append((entry.path, prefix + entry.name + '/',
+                                        (st.st_dev, st.st_ino), entry.is_symlink()))
+                    elif entry.is_file():
+                        st = _entry_stat(entry)
+                        files.append((prefix + entry.name, LocalFile.from_stat(entry.path, st)))
                 except OSError:
                     continue
-    except PermissionError as e:
-        print(f"⚠️  Permission denied accessing {directory}: {e}")
+    except OSError:
+        return files, subdirs, False
+    return files, subdirs, True
+
+
+class DirectorySnapshot:
+    """
+    Saved listing of a local tree, kept in the upload log database.
+
+    For every directory it stores the mtime, entry count, files and
+    subdirectories. A directory whose mtime and identity are unchanged is
+    not listed again; its saved records are reused. Adding, removing or
+    renaming an entry updates a directory's mtime, but rewriting a file in
+    place does not, so every reused file is still stat()ed: one that
+    changed gets its directory listed (and saved) again. `full_rescan`
+    lists everything regardless.
+    """
+    def __init__(self, root: Path, full_rescan: bool = False):
+        self.root = str(root)
+        self.full_rescan = full_rescan
+        # path -> (parent, is_symlink, dev, inode, mtime_ns, entry_count, scanned_at_ns)
+        self.dirs = {row[0]: row[1:] for row in load_scan_dirs(self.root)}
+        self.children: Dict[str, List[str]] = {}
+        for path, saved in self.dirs.items():
+            self.children.setdefault(saved[0], []).append(path)
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def reuse(self, dirpath: str, prefix: str, st: os.stat_result):
+        """Return (files, subdirs) saved for an unchanged directory and files, else None."""
+        saved = self.dirs.get(prefix)
+        if self.full_rescan or saved is None:
+            return None
+        _, _, dev, inode, mtime_ns, entry_count, scanned_at_ns = saved
+        if (mtime_ns != st.st_mtime_ns or (dev, inode) != (st.st_dev, st.st_ino)
+                or st.st_mtime_ns + SNAPSHOT_RACY_WINDOW_NS >= scanned_at_ns):
+            return None
+
+        files = []
+        for name, *fields in load_scan_files(self.root, prefix):
+            path = os.path.join(dirpath, name)
+            local_file = LocalFile(path, *fields)
+            try:
+                # Appending to or rewriting a file leaves its directory's mtime alone
+                if LocalFile.from_stat(path, os.stat(path)) != local_file:
+                    return None
+            except OSError:
+                return None
+            files.append((prefix + name, local_file))
+        subdirs = []
+        for child in self.children.get(prefix, []):
+            _, is_symlink, child_dev, child_inode = self.dirs[child][:4]
+            subdirs.append((os.path.join(dirpath, child[len(prefix):-1]), child,
+                            (child_dev, child_inode), bool(is_symlink)))
+        if len(files) + len(subdirs) != entry_count:
+            # Incomplete snapshot (e.g. interrupted while saving): list it again
+            return None
+        with self.lock:
+            self.reused += 1
+        return files, subdirs
+
+    def save(self, prefix: str, st: os.stat_result, scanned_at_ns: int,
+             files: List[Tuple[str, LocalFile]], subdirs: List[Tuple]):
+        """Store a fresh listing of one directory."""
+        parent = prefix[:prefix.rstrip('/').rfind('/') + 1] if prefix else None
+        current = {child for _, child, _, _ in subdirs}
+        removed = [child for child in self.children.get(prefix, []) if child not in current]
+        save_scan_dir(
+            self.root, prefix, parent, st, scanned_at_ns,
+            [(relative_path[len(prefix):], *local_file[1:]) for relative_path, local_file in files],
+            [(child, is_symlink, *key) for _, child, key, is_symlink in subdirs],
+            removed
+        )
+
 
-    return local_files
+def _scan_directory_incremental(snapshot: DirectorySnapshot, dirpath: str, prefix: str):
+    """Like _scan_one_directory, but reuses the snapshot of an unchanged directory."""
+    scanned_at_ns = time.time_ns()
+    try:
+        st = os.stat(dirpath)
+    except OSError:
+        return [], [], False
+    reused = snapshot.reuse(dirpath, prefix, st)
+    if reused is not None:
+        return (*reused, True)
+    files, subdirs, ok = _scan_one_directory(dirpath, prefix)
+    if ok and not quit_flag:
+        snapshot.save(prefix, st, scanned_at_ns, files, subdirs)
+    return files, subdirs, ok
+
+
+def iter_local_files(directory: Path, workers: int = DEFAULT_SCAN_WORKERS,
+                     snapshot: Optional[DirectorySnapshot] = None):
+    """
+    Recursively scan directory, yielding one list of (relative_path, LocalFile)
+    pairs per directory as soon as it has been listed.
+
+    Subdirectories are listed in parallel threads with os.scandir; at most
+    2 x `workers` listings are in flight, so memory stays flat however slowly
+    the consumer drains the batches. Symbolic links are followed, but
+    symlinked directories are only entered once the real tree is done (in
+    sorted order), so a directory reachable both ways always gets the same
+    relative paths. Each (dev, inode) is visited once. With a `snapshot`,
+    unchanged directories are taken from it instead of being listed.
+    """
+    try:
+        root_stat = os.stat(directory)
+    except OSError as e:
+        tqdm.write(f"⚠️  Cannot access {directory}: {e}")
+        return
 
+    visited_inodes = {(root_stat.st_dev, root_stat.st_ino)}
+    backlog = [(str(directory), '')]   # Directories waiting for a worker (LIFO keeps it short)
+    deferred = []                      # Symlinked directories, entered after the real tree
+    scanned_dirs = 0
+    scanned_files = 0
+    unreadable = 0
+    started = time.monotonic()
+
+    def scan(dirpath: str, prefix: str):
+        if snapshot is None:
+            return _scan_one_directory(dirpath, prefix)
+        return _scan_directory_incremental(snapshot, dirpath, prefix)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scan")
+    pending = set()
+    try:
+        while (backlog or pending or deferred) and not quit_flag:
+            while backlog and len(pending) < 2 * max(1, workers):
+                pending.add(executor.submit(scan, *backlog.pop()))
+
+            if not pending:
+                deferred.sort(key=lambda d: d[1], reverse=True)
+                for path, prefix, key, _ in deferred:
+                    if key not in visited_inodes:
+                        visited_inodes.add(key)
+                        backlog.append((path, prefix))
+                deferred = []
+                continue
 
-def fetch_ia_files(identifier: str) -> Dict[str, Dict[str, Any]]:
-    """Fetch file list from Internet Archive."""
-    item = get_item(identifier)
-    ia_files = {}
-    for file in item.files:
-        if quit_flag:
-            break
-        name = file.get('name')
-        size = int(file.get('size', 0)) if file.get('size') else None
-        md5 = file.get('md5')
-        ia_files[name] = {'size': size, 'md5': md5}
-    return ia_files
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs, ok = future.result()
+                scanned_dirs += 1
+                scanned_files += len(files)
+                if not ok:
+                    unreadable += 1
+                for subdir in subdirs:
+                    path, prefix, key, is_symlink = subdir
+                    if is_symlink:
+                        deferred.append(subdir)
+                    elif key not in visited_inodes:
+                        visited_inodes.add(key)
+                        backlog.append((path, prefix))
+                if files:
+                    yield files
+    except (KeyboardInterrupt, GeneratorExit):
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+    if scanned_dirs == 1 and unreadable:
+        tqdm.write(f"⚠️  Permission denied accessing {directory}")
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    reused = f", {snapshot.reused} unchanged since last scan" if snapshot is not None else ""
+    tqdm.write(f"   ⚡ Scanned {scanned_dirs} directories{reused}, {scanned_files} files in {elapsed:.1f}s "
+               f"- {scanned_files / elapsed:.0f} files/s ({workers} threads)")
+    if unreadable and scanned_dirs > 1:
+        tqdm.write(f"   ⚠️  {unreadable} directories could not be read")
+
+
+def get_local_files(directory: Path, workers: int = DEFAULT_SCAN_WORKERS,
+                    snapshot: Optional[DirectorySnapshot] = None) -> Dict[str, LocalFile]:
+    """Scan the whole tree and return {relative_path: LocalFile}, sorted by path."""
+    local_files = {}
+    for batch in iter_local_files(directory, workers, snapshot):
+        local_files.update(batch)
+    return dict(sorted(local_files.items()))
+
+
+def stat_unchanged(log_entry: Dict[str, Any], file_info: LocalFile) -> bool:
+    """True if the logged stat tuple matches the file, so it can't have changed."""
+    return all(
+        log_entry.get(field) is not None and log_entry.get(field) == getattr(file_info, field)
+        for field in STAT_FIELDS
+    ) and log_entry.get('size') == file_info.size
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Interactive UI - Directory Picker
+# Shared HTTP Session
 # ─────────────────────────────────────────────────────────────────────────────
-def format_size(size: int) -> str:
-    """Format file size in human-readable format."""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size < 1024.0:
-            return f"{size:.1f} {unit}"
-        size /= 1024.0
-    return f"{size:.1f} PB"
+_shared_session = None
+_shared_session_lock = threading.RLock()
+_shared_ssl_context: Optional[ssl.SSLContext] = None
+# Requests and connections of closed pools (resized session, finished async pools)
+_closed_pool_stats = {'requests': 0, 'connections': 0}
 
 
-def directory_browser(start_path: Optional[str] = None) -> Optional[str]:
+def get_shared_session(pool_size: Optional[int] = None):
     """
-    Interactive directory browser using questionary.
-    Returns the selected directory path or None if cancelled.
+    The ArchiveSession used by every upload, listing and metadata call of
+    the process, so connections (and their TLS handshakes) are reused.
+
+    requests keeps only 10 idle connections per host and drops the rest,
+    which with more upload workers means a new handshake per file;
+    `pool_size` grows the keep-alive pool to at least that many (see
+    _upload_adapter()).
     """
-    current_path = Path(start_path).expanduser().resolve() if start_path else Path.home()
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = get_session()
+            _shared_session.pool_size = 0
+        if pool_size and pool_size > _shared_session.pool_size:
+            for prefix, adapter in list(_shared_session.adapters.items()):
+                # Keep internetarchive's retry policy for archive.org metadata calls
+                _shared_session.mount(prefix, _upload_adapter(pool_size, adapter.max_retries))
+                _count_closed_pools(*_adapter_stats(adapter))
+                adapter.close()
+            _shared_session.pool_size = pool_size
+        return _shared_session
+
+
+def _upload_adapter(pool_size: int, max_retries):
+    """
+    An HTTPAdapter keeping up to `pool_size` connections per host that reads
+    request bodies upload_block_size bytes at a time. urllib3 2 asks for
+    16 KiB per read by default; 1.x has no such setting and keeps 8 KiB.
+    """
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=pool_size, max_retries=max_retries)
+    if int(importlib.import_module('urllib3').__version__.split('.')[0]) >= 2:
+        adapter.init_poolmanager(HTTP_POOL_HOSTS, pool_size, blocksize=upload_block_size)
+    return adapter
 
-    try:
-        while not quit_flag:
-            # Get directory contents
-            entries = []
-            parent = current_path.parent
 
-            # Add parent directory option if not at root
-            if current_path != current_path.parent:
-                entries.append(('..', parent, '📁', 'Parent directory'))
+def shared_ssl_context() -> ssl.SSLContext:
+    """One client SSLContext for all async pools, so CA certificates are loaded once."""
+    global _shared_ssl_context
+    with _shared_session_lock:
+        if _shared_ssl_context is None:
+            _shared_ssl_context = ssl.create_default_context()
+        return _shared_ssl_context
 
-            # Add subdirectories
-            dirs = []
-            files = []
-            try:
-                for item in current_path.iterdir():
-                    try:
-                        if item.is_dir():
-                            dirs.append(item)
-                        elif item.is_file():
-                            files.append(item)
-                    except (PermissionError, OSError):
-                        continue
-            except PermissionError:
-                print(f"⚠️  Permission denied: {current_path}")
-                # Go to parent
-                current_path = parent
-                continue
 
-            # Sort directories and files
-            dirs.sort(key=lambda x: x.name.lower())
-            files.sort(key=lambda x: x.name.lower())
+def _adapter_stats(adapter) -> Tuple[int, int]:
+    requests_sent = connections = 0
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is not None:
+            requests_sent += pool.num_requests
+            connections += pool.num_connections
+    return requests_sent, connections
 
-            # Add directories
-            for d in dirs:
-                entries.append((d.name, d, '📁', 'Directory'))
 
-            # Add files (for info, but not selectable for upload root)
-            for f in files[:5]:  # Show first 5 files as preview
-                size = format_size(f.stat().st_size)
-                entries.append((f.name, f, '📄', f'File ({size})'))
+def _count_closed_pools(requests_sent: int, connections: int):
+    with _shared_session_lock:
+        _closed_pool_stats['requests'] += requests_sent
+        _closed_pool_stats['connections'] += connections
 
-            if len(files) > 5:
-                entries.append(('...', None, '📄', f'... and {len(files) - 5} more files'))
 
-            # Build choice list
-            choices = []
-            for name, path, icon, desc in entries:
-                choices.append(questionary.Choice(
-                    title=f"{icon}  {name}",
-                    value=str(path) if path else None,
-                    description=desc
-                ))
+def http_connection_stats() -> Tuple[int, int]:
+    """(requests, new connections) so far over the shared session and all async pools."""
+    requests_sent, connections = _closed_pool_stats['requests'], _closed_pool_stats['connections']
+    if _shared_session is not None:
+        for adapter in set(_shared_session.adapters.values()):
+            sent, opened = _adapter_stats(adapter)
+            requests_sent += sent
+            connections += opened
+    return requests_sent, connections
 
-            # Add action choices
-            choices.append(questionary.Choice(
+
+# ─────────────────────────────────────────────────────────────────────────────
+# IA Item Listing
+# ─────────────────────────────────────────────────────────────────────────────
+class IAListing:
+    """
+    The file listing of one IA item, shared by everything in a run.
+
+    The full metadata is fetched at most once per run and cached in the
+    upload log DB together with the item's `item_last_updated` time; later
+    runs only ask IA for that time and reuse the cache while it matches.
+    Files uploaded this run are merged in with the size and MD5 that IA
+    confirmed on upload, so verifying them needs no refetch. Files packed
+    into an archive are listed with their own size and MD5 from the upload
+    log while IA still has that archive as it was uploaded.
+    """
+
+    def __init__(self, identifier: str, session=None):
+        self.identifier = identifier
+        self.session = session
+        self.lock = threading.Lock()
+        self.last_updated: Optional[int] = None
+        self.fetches = 0               # Full metadata requests made
+        self._files: Optional[Dict[str, Dict[str, Any]]] = None
+        self._uploaded: Dict[str, Dict[str, Any]] = {}
+        self._metadata: Optional[Dict[str, Any]] = None
+        self._item = None
+
+    def _session(self):
+        if self.session is None:
+            self.session = get_shared_session()
+        return self.session
+
+    def _fetch_last_updated(self) -> Optional[int]:
+        """Ask IA when the item last changed; None if it doesn't exist yet."""
+        session = self._session()
+        url = f'{session.protocol}//{session.host}/metadata/{self.identifier}/item_last_updated'
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        return response.json().get('result')
+
+    def _fetch_metadata(self) -> Dict[str, Any]:
+        self.fetches += 1
+        return self._session().get_metadata(self.identifier) or {}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        last_updated = self._fetch_last_updated()
+        if last_updated is None:
+            return {}   # New item, nothing uploaded yet
+        if last_updated == self.last_updated and self._files is not None:
+            return self._files
+        cached = load_cached_listing(self.identifier)
+        if cached is not None and cached[0] == last_updated:
+            self.last_updated, files = cached
+            tqdm.write(f"📋 Using cached IA listing ({len(files)} files, item unchanged)")
+            return files
+
+        metadata = self._fetch_metadata()
+        files = {}
+        for file in metadata.get('files', []):
+            size = int(file['size']) if file.get('size') else None
+            files[file.get('name')] = {'size': size, 'md5': file.get('md5')}
+        self._metadata = metadata
+        self.last_updated = metadata.get('item_last_updated', last_updated)
+        save_cached_listing(self.identifier, self.last_updated, files)
+        tqdm.write(f"📋 Fetched IA listing ({len(files)} files)")
+        return files
+
+    def _with_packed(self, files: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        files = dict(files)
+        for filename, size, md5, archive, archive_size, archive_md5 in load_packed_files(self.identifier):
+            ia_archive = files.get(archive)
+            if ia_archive and ia_archive['size'] == archive_size and ia_archive['md5'] == archive_md5:
+                files.setdefault(filename, {'size': size, 'md5': md5})
+        return files
+
+    def files(self) -> Dict[str, Dict[str, Any]]:
+        """{filename: {'size', 'md5'}}, fetched on first use."""
+        with self.lock:
+            if self._files is None:
+                self._files = {**self._with_packed(self._load()), **self._uploaded}
+            return self._files
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """Check IA again, fetching the listing only if the item changed since."""
+        with self.lock:
+            self._files = {**self._with_packed(self._load()), **self._uploaded}
+            return self._files
+
+    def record_upload(self, filename: str, size: int, md5: str):
+        """Merge a file IA accepted with this size and MD5."""
+        with self.lock:
+            self._uploaded[filename] = {'size': size, 'md5': md5}
+            if self._files is not None:
+                self._files[filename] = self._uploaded[filename]
+
+    def uploaded(self) -> Dict[str, Dict[str, Any]]:
+        """Just the files merged in by record_upload(); needs no request."""
+        with self.lock:
+            return dict(self._uploaded)
+
+    def forget_uploads(self, filenames: Iterable[str]):
+        """Drop verified files from those merged in by record_upload(), so they don't pile up."""
+        with self.lock:
+            for filename in filenames:
+                self._uploaded.pop(filename, None)
+
+    def item(self):
+        """An Item for uploading; built from the fetched metadata, so it costs no extra request."""
+        with self.lock:
+            if self._item is None:
+                self._item = self._session().get_item(
+                    self.identifier, item_metadata=self._metadata or {'metadata': {'identifier': self.identifier}}
+                )
+            return self._item
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Uncached File Reads
+# ─────────────────────────────────────────────────────────────────────────────
+def _fadvise(fd: int, offset: int, length: int, advice: str):
+    """Give the kernel a posix_fadvise() hint; filesystems that don't take it are ignored."""
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice))
+    except OSError:
+        pass
+
+
+class UncachedReader(io.RawIOBase):
+    """
+    Raw reader for one sequential pass over a file that leaves the page
+    cache as it found it, so hashing and uploading terabytes doesn't evict
+    what other services on the machine keep cached.
+
+    'drop' asks for aggressive read-ahead (POSIX_FADV_SEQUENTIAL) and evicts
+    what has been read (POSIX_FADV_DONTNEED) every PAGE_CACHE_DROP_INTERVAL
+    and on close. Pages of the file another process had cached go too.
+    'direct' reads with O_DIRECT through an aligned buffer, so the data never
+    enters the cache; filesystems that refuse O_DIRECT (tmpfs, some network
+    mounts) get 'drop' instead.
+    """
+    def __init__(self, path, mode: str = 'drop'):
+        super().__init__()
+        self.name = str(path)
+        self.direct = False
+        fd = None
+        if mode == 'direct' and hasattr(os, 'O_DIRECT'):
+            try:
+                fd = os.open(path, os.O_RDONLY | os.O_DIRECT)
+                self.direct = True
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+        if fd is None:
+            fd = os.open(path, os.O_RDONLY)
+        self.fd = fd
+        self.size = os.fstat(fd).st_size
+        self.position = 0
+        self.dropped = 0   # Pages before this offset have been evicted
+        if self.direct:
+            # Anonymous maps are page-aligned, as O_DIRECT needs
+            length = -(-max(self.size, 1) // DIRECT_IO_ALIGNMENT) * DIRECT_IO_ALIGNMENT
+            self.block = mmap.mmap(-1, min(length, DIRECT_IO_BUFFER_SIZE))
+            self.view = memoryview(self.block)
+            self.pending = self.view[:0]
+        else:
+            _fadvise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if self.direct:
+            self.pending = self.view[:0]
+        else:
+            self._drop()
+            self.dropped = offset
+            os.lseek(self.fd, offset, os.SEEK_SET)
+        self.position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        if not self.direct:
+            n = os.readv(self.fd, [buffer])
+            self.position += n
+            if self.position - self.dropped >= PAGE_CACHE_DROP_INTERVAL:
+                self._drop()
+            return n
+        if not self.pending:
+            # O_DIRECT reads whole aligned blocks; the head before `position` is skipped
+            start = self.position - self.position % DIRECT_IO_ALIGNMENT
+            os.lseek(self.fd, start, os.SEEK_SET)
+            n = os.readv(self.fd, [self.block])
+            self.pending = self.view[self.position - start:max(n, self.position - start)]
+            if not self.pending:
+                return 0
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        self.position += n
+        return n
+
+    def _drop(self):
+        if self.position > self.dropped:
+            _fadvise(self.fd, self.dropped, self.position - self.dropped, 'POSIX_FADV_DONTNEED')
+            self.dropped = self.position
+
+    def close(self):
+        if not self.closed:
+            if self.direct:
+                self.pending = None
+                self.view.release()
+                self.block.close()
+            else:
+                # Only what this reader read: other readers of the file (e.g. other parts) keep theirs
+                self._drop()
+            os.close(self.fd)
+        super().close()
+
+
+def open_for_read(path) -> BinaryIO:
+    """
+    Open a file for one sequential pass (hashing or uploading) as --page-cache
+    asks: an ordinary file object, or one over an UncachedReader.
+    """
+    if page_cache_mode == 'keep' or not hasattr(os, 'posix_fadvise'):
+        return open(path, 'rb')
+    return io.BufferedReader(UncachedReader(path, page_cache_mode))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Hashing Engine
+# ─────────────────────────────────────────────────────────────────────────────
+# One reusable read buffer per hashing thread
+_hash_buffers = threading.local()
+
+
+def _md5_file(filepath: Path, progress=None) -> Tuple[str, int]:
+    """
+    Hash one file and return (hexdigest, bytes_hashed).
+    Large files are hashed through mmap, smaller ones with readinto()
+    into a per-thread buffer, so no chunk is copied into a new object.
+    Unless --page-cache is 'keep', every file is read with readinto()
+    through open_for_read(), since mapped pages stay cached.
+    """
+    h = hashlib.md5()
+    with open_for_read(filepath) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= HASH_MMAP_THRESHOLD and page_cache_mode == 'keep':
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, HASH_BUFFER_SIZE):
+                        if quit_flag:
+                            raise KeyboardInterrupt("Hashing interrupted by user.")
+                        chunk = view[offset:offset + HASH_BUFFER_SIZE]
+                        h.update(chunk)
+                        if progress is not None:
+                            progress.update(len(chunk))
+                        chunk.release()
+                finally:
+                    view.release()
+            return h.hexdigest(), size
+
+        buffer = getattr(_hash_buffers, 'buffer', None)
+        if buffer is None:
+            buffer = _hash_buffers.buffer = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buffer)
+        total = 0
+        while True:
+            if quit_flag:
+                raise KeyboardInterrupt("Hashing interrupted by user.")
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(view[:n])
+            total += n
+            if progress is not None:
+                progress.update(n)
+        return h.hexdigest(), total
+
+
+def hash_files(files: List[Tuple[str, Path]], workers: int = DEFAULT_HASH_WORKERS,
+               desc: str = "🔢 Hashing") -> Dict[str, Optional[str]]:
+    """
+    Hash many files in parallel.
+
+    `files` is a list of (key, path) pairs; returns {key: md5 or None on error}.
+    Prints the hashing throughput when done.
+    """
+    results: Dict[str, Optional[str]] = {}
+    if not files:
+        return results
+
+    total_bytes = 0
+    for _, path in files:
+        try:
+            total_bytes += os.stat(path).st_size
+        except OSError:
+            pass
+
+    progress = tqdm(total=total_bytes, desc=desc, unit='B', unit_scale=True, unit_divisor=1024,
+                    disable=resolve_progress_mode() != 'bar')
+    hashed_bytes = 0
+    started = time.monotonic()
+
+    def job(key: str, path: Path):
+        try:
+            return key, _md5_file(path, progress)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            tqdm.write(f"⚠️  Error calculating MD5 for {path}: {e}")
+            return key, (None, 0)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hash")
+    try:
+        pending = {executor.submit(job, key, path) for key, path in files}
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, (digest, nbytes) = future.result()
+                results[key] = digest
+                hashed_bytes += nbytes
+    except KeyboardInterrupt:
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        progress.close()
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"   🔢 Hashed {len(results)} files ({format_size(hashed_bytes)}) in {elapsed:.1f}s "
+          f"- {format_size(hashed_bytes / elapsed)}/s")
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Interactive UI - Directory Picker
+# ─────────────────────────────────────────────────────────────────────────────
+def format_size(size: int) -> str:
+    """Format file size in human-readable format."""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} PB"
+
+
+def parse_size(text: str) -> int:
+    """Parse a size such as '512M', '1.5G' or '1048576' into bytes (binary units)."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(?:i?B)?\s*', text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {text!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMGTP'.index(unit.upper() or ' '))
+
+
+def parse_bandwidth(text: str, base: Optional[int] = None) -> Optional[int]:
+    """
+    Parse a bandwidth such as '5M', '20%' (of `base`, the --max-bandwidth),
+    'full' (the base) or 'off' into bytes per second; None means no cap.
+    """
+    text = text.strip().lower()
+    if text in ('off', 'none', 'unlimited'):
+        return None
+    if text == 'full':
+        return base
+    if text.endswith('%'):
+        percent = float(text[:-1])
+        if base is None:
+            raise ValueError(f"a percentage ({text}) needs --max-bandwidth")
+        if percent <= 0:
+            raise ValueError(f"Invalid bandwidth: {text!r}")
+        return max(1, int(base * percent / 100))
+    rate = parse_size(text)
+    if rate <= 0:
+        raise ValueError(f"Invalid bandwidth: {text!r} (use 'off' for no cap)")
+    return rate
+
+
+def parse_bandwidth_window(text: str) -> Dict[str, Any]:
+    """
+    Parse a schedule window '[DAYS ]HH:MM-HH:MM=RATE', e.g. 'mon-fri
+    09:00-18:00=20%'. DAYS is a comma-separated list of days or day ranges;
+    the window may run past midnight. RATE is kept as text until
+    --max-bandwidth is known.
+    """
+    match = re.fullmatch(r'\s*(?:([a-z,-]+)\s+)?(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})\s*=\s*(\S+)\s*',
+                         text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid schedule window: {text!r}")
+    days_text, start_h, start_m, end_h, end_m, rate = match.groups()
+    start = int(start_h) * 60 + int(start_m)
+    end = int(end_h) * 60 + int(end_m)
+    if start > 24 * 60 or end > 24 * 60 or int(start_m) > 59 or int(end_m) > 59 or start == end:
+        raise ValueError(f"Invalid schedule window: {text!r}")
+    days = set()
+    for part in (days_text or '').lower().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        if first not in WEEKDAYS or (last and last not in WEEKDAYS):
+            raise ValueError(f"Invalid days in schedule window: {text!r}")
+        day = WEEKDAYS.index(first)
+        while True:
+            days.add(day)
+            if not last or day == WEEKDAYS.index(last):
+                break
+            day = (day + 1) % 7
+    return {'days': days, 'start': start, 'end': end, 'rate': rate, 'text': text.strip()}
+
+
+def directory_browser(start_path: Optional[str] = None) -> Optional[str]:
+    """
+    Interactive directory browser using questionary.
+    Returns the selected directory path or None if cancelled.
+    """
+    current_path = Path(start_path).expanduser().resolve() if start_path else Path.home()
+
+    try:
+        while not quit_flag:
+            # Get directory contents
+            entries = []
+            parent = current_path.parent
+
+            # Add parent directory option if not at root
+            if current_path != current_path.parent:
+                entries.append(('..', parent, '📁', 'Parent directory'))
+
+            # Add subdirectories
+            dirs = []
+            files = []
+            try:
+                for item in current_path.iterdir():
+                    try:
+                        if item.is_dir():
+                            dirs.append(item)
+                        elif item.is_file():
+                            files.append(item)
+                    except (PermissionError, OSError):
+                        continue
+            except PermissionError:
+                print(f"⚠️  Permission denied: {current_path}")
+                # Go to parent
+                current_path = parent
+                continue
+
+            # Sort directories and files
+            dirs.sort(key=lambda x: x.name.lower())
+            files.sort(key=lambda x: x.name.lower())
+
+            # Add directories
+            for d in dirs:
+                entries.append((d.name, d, '📁', 'Directory'))
+
+            # Add files (for info, but not selectable for upload root)
+            for f in files[:5]:  # Show first 5 files as preview
+                size = format_size(f.stat().st_size)
+                entries.append((f.name, f, '📄', f'File ({size})'))
+
+            if len(files) > 5:
+                entries.append(('...', None, '📄', f'... and {len(files) - 5} more files'))
+
+            # Build choice list
+            choices = []
+            for name, path, icon, desc in entries:
+                choices.append(questionary.Choice(
+                    title=f"{icon}  {name}",
+                    value=str(path) if path else None,
+                    description=desc
+                ))
+
+            # Add action choices
+            choices.append(questionary.Choice(
                 title="✅  SELECT THIS DIRECTORY",
                 value="__SELECT__",
                 description="Use this directory for upload"
@@ -774,195 +2263,2344 @@ def get_custom_identifier_and_path() -> Tuple[Optional[str], Optional[str]]:
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Progress Wrapper for Upload
+# Small-File Packing
 # ─────────────────────────────────────────────────────────────────────────────
-class TqdmFileWithCounter:
-    """
-    Wraps a file object and updates a tqdm progress bar as data is read.
-    """
-    def __init__(self, filename: Path, desc: str, index: int, total_files: int):
-        self.file = open(filename, 'rb')
-        self.index = index
-        self.total_files = total_files
-        counter = f"({index}/{total_files}) "
-        desc = f"{counter}{desc}"
-        self.tqdm = tqdm(
-            total=filename.stat().st_size,
-            desc=desc,
-            unit='B',
-            unit_scale=True,
-            unit_divisor=1024
+_ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_ZIP_DATA_DESCRIPTOR = struct.Struct('<IIII')
+_ZIP_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_ZIP_END_RECORD = struct.Struct('<IHHHHIIH')
+_ZIP_FLAGS = 0x0808          # Sizes and CRC follow the data; names are UTF-8
+_ZIP_VERSION = 20
+_ZIP_MADE_BY = (3 << 8) | _ZIP_VERSION   # Unix, so external_attr holds the mode
+_MEMBER_MODE = 0o644
+
+_pack_counter = itertools.count(1)
+_pack_run = time.strftime('%Y%m%dT%H%M%S')
+
+
+class PackError(Exception):
+    """A member changed or vanished between scan and upload; the same archive can't succeed."""
+    transient = False
+
+
+def _dos_datetime(mtime_ns: int) -> Tuple[int, int]:
+    """(time, date) in MS-DOS format as stored in zip headers (1980-2107, 2 s steps)."""
+    t = time.localtime(mtime_ns // 10 ** 9)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    if t.tm_year > 2107:
+        return (23 << 11) | (59 << 5) | 29, (127 << 9) | (12 << 5) | 31
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _tar_header(relative_path: str, local_file: LocalFile) -> bytes:
+    info = tarfile.TarInfo(relative_path)
+    info.size = local_file.size
+    info.mtime = local_file.mtime_ns // 10 ** 9
+    info.mode = _MEMBER_MODE
+    # PAX headers carry names that are long or not ASCII
+    return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+
+def next_pack_name(fmt: str) -> str:
+    """Remote name for a new archive, unique within this run."""
+    return f"{PACK_DIR}/{_pack_run}-{next(_pack_counter):05d}.{fmt}"
+
+
+class PackArchive:
+    """
+    Small files uploaded together as one uncompressed zip or tar archive.
+
+    The archive is never written to disk: open() returns a stream that
+    builds it while the body is sent. Its exact size is known up front from
+    the scanned member sizes, so it goes out as a plain PUT with a
+    Content-Length. The MD5 of each member is taken on the way through and
+    kept in `md5s` for the upload log.
+    """
+    def __init__(self, name: str, fmt: str, members: List[Tuple[str, LocalFile]]):
+        self.name = name
+        self.format = fmt
+        self.members = members
+        self.md5s: Dict[str, str] = {}
+        self.size = self.trailer_size(fmt) + sum(
+            self.entry_size(fmt, relative_path, local_file) for relative_path, local_file in members
         )
 
+    @staticmethod
+    def entry_size(fmt: str, relative_path: str, local_file: LocalFile) -> int:
+        """Bytes one member adds to an archive, headers and padding included."""
+        if fmt == 'zip':
+            name_length = len(relative_path.encode('utf-8'))
+            return (_ZIP_LOCAL_HEADER.size + _ZIP_DATA_DESCRIPTOR.size + _ZIP_CENTRAL_HEADER.size
+                    + 2 * name_length + local_file.size)
+        return len(_tar_header(relative_path, local_file)) + local_file.size + (-local_file.size % tarfile.BLOCKSIZE)
+
+    @staticmethod
+    def trailer_size(fmt: str) -> int:
+        """Bytes that close an archive: zip's end record, or tar's two zero blocks."""
+        return _ZIP_END_RECORD.size if fmt == 'zip' else 2 * tarfile.BLOCKSIZE
+
+    def _member_chunks(self, relative_path: str, local_file: LocalFile):
+        """Yield a member's bytes, checking they are the size that was scanned; returns their CRC-32."""
+        md5 = hashlib.md5()
+        crc = 0
+        remaining = local_file.size
+        try:
+            with open_for_read(local_file.path) as f:
+                while remaining:
+                    chunk = f.read(min(PACK_READ_SIZE, remaining))
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    remaining -= len(chunk)
+                    yield chunk
+                if remaining or f.read(1):
+                    raise PackError(f"{relative_path} changed size since it was scanned")
+        except OSError as e:
+            raise PackError(f"{relative_path}: {e}") from e
+        self.md5s[relative_path] = md5.hexdigest()
+        return crc
+
+    def chunks(self) -> Iterator[bytes]:
+        """Generate the archive from the member files."""
+        central = []
+        offset = 0
+        for relative_path, local_file in self.members:
+            if self.format == 'tar':
+                yield _tar_header(relative_path, local_file)
+                yield from self._member_chunks(relative_path, local_file)
+                yield bytes(-local_file.size % tarfile.BLOCKSIZE)
+                continue
+
+            name = relative_path.encode('utf-8')
+            dos_time, dos_date = _dos_datetime(local_file.mtime_ns)
+            yield _ZIP_LOCAL_HEADER.pack(0x04034b50, _ZIP_VERSION, _ZIP_FLAGS, 0, dos_time, dos_date,
+                                         0, 0, 0, len(name), 0) + name
+            crc = yield from self._member_chunks(relative_path, local_file)
+            yield _ZIP_DATA_DESCRIPTOR.pack(0x08074b50, crc, local_file.size, local_file.size)
+            central.append(_ZIP_CENTRAL_HEADER.pack(
+                0x02014b50, _ZIP_MADE_BY, _ZIP_VERSION, _ZIP_FLAGS, 0, dos_time, dos_date,
+                crc, local_file.size, local_file.size, len(name), 0, 0, 0, 0,
+                (stat.S_IFREG | _MEMBER_MODE) << 16, offset) + name)
+            offset += _ZIP_LOCAL_HEADER.size + len(name) + local_file.size + _ZIP_DATA_DESCRIPTOR.size
+
+        if self.format == 'tar':
+            yield bytes(2 * tarfile.BLOCKSIZE)
+            return
+        directory = b''.join(central)
+        yield directory
+        yield _ZIP_END_RECORD.pack(0x06054b50, 0, 0, len(central), len(central), len(directory), offset, 0)
+
+    def open(self) -> 'PackStream':
+        return PackStream(self)
+
+    def member_entries(self, archive_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Upload log records of the members once `archive_info` (the archive's file_info) is uploaded."""
+        return [{
+            'relative_path': relative_path,
+            'size': local_file.size,
+            'uploaded': True,
+            'md5_hash': self.md5s.get(relative_path),
+            **{field: getattr(local_file, field) for field in STAT_FIELDS},
+            'uploaded_at': archive_info.get('uploaded_at'),
+            'attempts': archive_info.get('attempts'),
+            'archive': self.name,
+        } for relative_path, local_file in self.members]
+
+
+class PackStream(io.RawIOBase):
+    """
+    Read-only file object over a PackArchive, generated as it is read.
+    Seeking is limited to what HTTP clients do: rewind to the start (which
+    rebuilds the archive) or jump to the end to learn the size.
+    """
+    def __init__(self, archive: PackArchive):
+        super().__init__()
+        self.archive = archive
+        self.name = archive.name
+        self._start()
+
+    def _start(self):
+        self._chunks = self.archive.chunks()
+        self._pending = memoryview(b'')
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.archive.size
+        if offset == 0:
+            self._chunks.close()
+            self._start()
+        elif offset == self.archive.size:
+            self._chunks.close()
+            self._pending = memoryview(b'')
+            self._position = offset
+        elif offset != self._position:
+            raise io.UnsupportedOperation("archive streams only seek to the start or the end")
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self._position += n
+        return n
+
+    def close(self):
+        self._chunks.close()
+        super().close()
+
+
+def open_upload_body(file_info: Dict[str, Any]) -> BinaryIO:
+    """The body of an upload: the local file, or the stream of a packed archive."""
+    pack = file_info.get('pack')
+    return pack.open() if pack is not None else open_for_read(file_info['path'])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload Progress
+# ─────────────────────────────────────────────────────────────────────────────
+def resolve_progress_mode(mode: Optional[str] = None) -> str:
+    """'bar' or 'lines' for 'auto' (a bar only if stderr is a terminal); other modes as given."""
+    mode = mode or progress_mode
+    if mode == 'auto':
+        return 'bar' if sys.stderr.isatty() else 'lines'
+    return mode
+
+
+class UploadTransfer:
+    """One file or archive being sent; its bytes count towards an UploadProgress."""
+    def __init__(self, progress: 'UploadProgress', name: str, size: int):
+        self.progress = progress
+        self.name = name
+        self.size = size
+        self.sent = 0
+
+    def update(self, n: int):
+        """Count `n` more bytes sent; negative takes back a body that has to be sent again."""
+        with self.progress.lock:
+            self.sent += n
+            self.progress.sent += n
+
+    def close(self, keep: bool = True):
+        """Stop listing the transfer; unless `keep`, its bytes no longer count as sent."""
+        with self.progress.lock:
+            self.progress.active.discard(self)
+            if not keep:
+                self.progress.sent -= self.sent
+                self.sent = 0
+
+
+class UploadProgress:
+    """
+    One progress display for a whole run, however many files are uploaded
+    at once: bytes sent of bytes queued, files done, rate, ETA and the
+    largest active transfers.
+
+    Uploads only bump counters under a lock; a background thread redraws
+    every PROGRESS_INTERVAL. On a terminal that is a tqdm bar with a line
+    per top transfer. Otherwise (mode 'lines') a plain key=value line is
+    written to stderr every PROGRESS_LOG_INTERVAL, for logs.
+    """
+    def __init__(self, desc: str = "📦 Uploading", leave: bool = True, mode: Optional[str] = None):
+        self.desc = desc
+        self.leave = leave
+        self.mode = resolve_progress_mode(mode)
+        self.lock = threading.Lock()
+        self.total_files = 0
+        self.done_files = 0
+        self.total_bytes = 0
+        self.sent = 0
+        self.active = set()
+        self.status = ''   # Extra text after the counts, e.g. pipeline queue depths
+        self.started = time.monotonic()
+        self.last_line = (self.started, 0)   # Time and bytes sent at the last status line
+        self.bar = None
+        self.transfer_lines = []
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="progress", daemon=True)
+        if self.mode != 'off':
+            self.thread.start()
+
+    def add(self, files: int = 1, nbytes: int = 0):
+        """Count files queued for upload; they make up the totals."""
+        with self.lock:
+            self.total_files += files
+            self.total_bytes += nbytes
+
+    def file_done(self):
+        """Count a file as finished, uploaded or not."""
+        with self.lock:
+            self.done_files += 1
+
+    def transfer(self, name: str, size: int) -> UploadTransfer:
+        """Start showing a file as being sent."""
+        transfer = UploadTransfer(self, name, size)
+        with self.lock:
+            self.active.add(transfer)
+        return transfer
+
+    def _run(self):
+        interval = PROGRESS_INTERVAL if self.mode == 'bar' else PROGRESS_LOG_INTERVAL
+        while not self.stop.wait(interval):
+            self._render()
+
+    def _snapshot(self) -> Tuple[int, int, int, int, int, List[Tuple[str, int, int]]]:
+        with self.lock:
+            # Transfers with the most left to send are the ones the ETA waits on
+            top = sorted(self.active, key=lambda t: t.size - t.sent, reverse=True)[:PROGRESS_TOP_TRANSFERS]
+            return (self.sent, self.total_bytes, self.done_files, self.total_files, len(self.active),
+                    [(t.name, t.sent, t.size) for t in top])
+
+    def _render(self, final: bool = False):
+        sent, total_bytes, done, total_files, active, top = self._snapshot()
+        if self.mode == 'lines':
+            now = time.monotonic()
+            then, sent_then = (self.started, 0) if final else self.last_line
+            self.last_line = (now, sent)
+            rate = max(0, sent - sent_then) / max(now - then, 1e-6)
+            eta = f"{(total_bytes - sent) / rate:.0f}" if rate > 0 and total_bytes >= sent else "-"
+            print(f"{'progress-done' if final else 'progress'} elapsed={now - self.started:.0f} "
+                  f"files_done={done} files_total={total_files} bytes_sent={sent} bytes_total={total_bytes} "
+                  f"rate_bps={rate:.0f} eta_s={eta} active={active}", file=sys.stderr, flush=True)
+            return
+
+        if self.bar is None:
+            self.bar = tqdm(total=total_bytes, desc=self.desc, unit='B', unit_scale=True,
+                            unit_divisor=1024, leave=self.leave, mininterval=0, miniters=0)
+        self.bar.total = total_bytes
+        self.bar.set_postfix_str(f"{done}/{total_files} files, {active} active"
+                                 + (f" | {self.status}" if self.status else ""), refresh=False)
+        self.bar.update(sent - self.bar.n)   # tqdm works out rate and ETA from the updates
+        while len(self.transfer_lines) < len(top):
+            self.transfer_lines.append(tqdm(bar_format='{desc}', leave=False))
+        for i, line in enumerate(self.transfer_lines):
+            text = ''
+            if i < len(top):
+                name, name_sent, size = top[i]
+                name = name if len(name) <= 48 else '…' + name[-47:]
+                text = f"   ⬆️  {name}  {format_size(name_sent)} / {format_size(size)}"
+            line.set_description_str(text)
+
+    def close(self):
+        """Stop redrawing and show the final counts."""
+        self.stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.mode == 'off':
+            return
+        self._render(final=True)
+        for line in self.transfer_lines:
+            line.close()
+        if self.bar is not None:
+            self.bar.close()
+
+
+class ProgressFile:
+    """
+    Wraps an open binary file (a local file or a packed archive stream) and
+    counts the bytes read into an UploadTransfer, after `limiter` lets them go.
+
+    The bytes are also fed into a running MD5 as they go out, so a file
+    uploaded in this run never has to be read again for verification.
+
+    read() fills one reused buffer of `block_size` bytes with readinto() and
+    returns a memoryview of it, valid until the next read(): the HTTP stack
+    sends each block before asking for the next, so nothing is allocated or
+    copied per block. Reads are capped at `block_size`.
+    """
+    def __init__(self, file: BinaryIO, transfer: UploadTransfer,
+                 limiter: Optional['BandwidthLimiter'] = None, block_size: Optional[int] = None):
+        self.file = file
+        self.transfer = transfer
+        self.limiter = limiter or bandwidth_limiter
+        self.size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        self.md5 = hashlib.md5()
+        self.hashed = 0
+        self.buffer = memoryview(bytearray(min(block_size or upload_block_size, max(self.size, 1))))
+
     def read(self, size=-1):
         if quit_flag:
             raise KeyboardInterrupt("Upload interrupted by user.")
-        data = self.file.read(size)
+        if size is None or size < 0:
+            data = self.file.read()
+        else:
+            data = self.buffer[:self.file.readinto(self.buffer[:size])]
         if data:
-            self.tqdm.update(len(data))
+            self.limiter.throttle(len(data))
+            if self.md5 is not None:
+                self.md5.update(data)
+                self.hashed += len(data)
+            self.transfer.update(len(data))
         return data
 
+    def seek(self, offset, whence=os.SEEK_SET):
+        position = self.file.seek(offset, whence)
+        if position == 0:
+            # Body is (re)sent from the start: restart hash and progress
+            self.md5 = hashlib.md5()
+            self.hashed = 0
+            if self.transfer.sent:
+                self.transfer.update(-self.transfer.sent)
+        else:
+            # Reads are no longer sequential from byte 0; hash is unusable until rewound
+            self.md5 = None
+        return position
+
+    def md5_hexdigest(self) -> Optional[str]:
+        """MD5 of the body if the whole file was streamed through read(), else None."""
+        if self.md5 is None or self.hashed != self.size:
+            return None
+        return self.md5.hexdigest()
+
     def __getattr__(self, attr):
         return getattr(self.file, attr)
 
     def close(self):
         self.file.close()
-        self.tqdm.close()
 
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Main Upload Logic
+# Rate Control & Retries
 # ─────────────────────────────────────────────────────────────────────────────
-def process_upload(identifier: str, local_directory: str, force_upload: bool = False, metadata: Optional[Dict[str, Any]] = None):
-    """Main upload and verification process."""
-    global quit_flag
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), RATE_MAX_PAUSE)
 
-    # Validate directory path
-    is_valid, error_msg, local_dir = validate_path(local_directory)
-    if not is_valid:
-        print(f"❌ {error_msg}")
-        return False
-    
-    # Additional readability check
-    if not os.access(local_dir, os.R_OK):
-        print(f"❌ Directory is not readable: {local_dir}")
-        return False
 
-    if quit_flag:
-        print("⚠️  Exiting due to user request.")
-        return False
+def is_throttle_response(status: Optional[int], text: str) -> bool:
+    """True if IA-S3 rejected a request because we are sending too fast."""
+    if '<Code>SlowDown</Code>' in text:
+        return True
+    # IA also answers 503 to uploads it flags as spam; slowing down won't help those
+    return status in THROTTLE_STATUSES and 'appears to be spam' not in text
 
-    # Initialize database
-    create_upload_log_db()
 
-    # Handle force upload - clear existing log for this identifier
-    if force_upload:
-        print("\n🔄 Force upload mode - clearing existing upload log...")
-        conn = sqlite3.connect(UPLOAD_LOG_DB)
-        c = conn.cursor()
-        c.execute('DELETE FROM upload_log WHERE identifier = ?', (identifier,))
-        conn.commit()
-        conn.close()
-        upload_log = {}
-        print("✅ Upload log cleared. All files will be re-uploaded.")
-    
-    # Sync with IA to get accurate file list (default: Yes)
-    if not quit_flag:
-        sync_with_ia = questionary.confirm(
-            "📡 Sync with Internet Archive to check existing files?",
-            default=True,  # Always default to Yes
-            qmark="🔄"
-        ).ask()
+class RateController:
+    """
+    AIMD limit on uploads in flight, shared by all workers of a run.
 
-        if sync_with_ia and not quit_flag:
-            try:
-                ia_files = fetch_ia_files(identifier)
-                existing_files_info = []
-                for filename, info in ia_files.items():
-                    if quit_flag:
-                        break
-                    existing_files_info.append({
-                        'relative_path': filename,
-                        'size': info['size'] or 0,
-                        'uploaded': True,
-                        'md5_hash': info.get('md5')
-                    })
-                
-                if existing_files_info:
-                    update_upload_log(identifier, existing_files_info)
-                    upload_log = load_upload_log(identifier)
-                    print(f"✅ Synced {len(existing_files_info)} files from IA")
-                else:
-                    print("ℹ️  No files found on IA for this identifier (new upload)")
-            except Exception as e:
-                print(f"⚠️  Could not fetch files from IA: {e}")
-                print("   Continuing with local database only...")
-                upload_log = load_upload_log(identifier)
+    Each accepted request raises the limit by 1/limit, about one more upload
+    per round trip of the whole window; a SlowDown/503 halves it and pauses
+    new uploads for the Retry-After time. With `check_limit`, IA-S3's
+    ?check_limit=1 endpoint is asked (at most every few seconds) before new
+    uploads start, so bodies aren't sent only to be rejected.
+    """
+    def __init__(self, max_limit: int, endpoint: str = IA_S3_ENDPOINT, identifier: Optional[str] = None,
+                 access_key: Optional[str] = None, check_limit: bool = False):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.lowest = self.max_limit
+        self.in_flight = 0
+        self.throttled = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.endpoint = endpoint.rstrip('/')
+        self.identifier = identifier
+        self.access_key = access_key
+        self.check_limit = check_limit
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[float]:
+        """Take an upload slot; returns None on success, else seconds to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.limit):
+                return 0.05
+            self.in_flight += 1
+            return None
+
+    def _check_due(self) -> bool:
+        return self.check_limit and time.monotonic() - self.checked_at >= RATE_CHECK_INTERVAL
+
+    def check(self):
+        """Ask IA-S3 whether our access key is over its limit and pause if it is."""
+        with self.lock:
+            if not self._check_due():
+                return
+            self.checked_at = time.monotonic()
+        url = (f"{self.endpoint}/?check_limit=1&accesskey={quote(self.access_key or '')}"
+               f"&bucket={quote(self.identifier or '')}")
+        try:
+            # Over the shared session's keep-alive pool, not a new connection per check
+            response = get_shared_session().get(url, timeout=12)
+            response.raise_for_status()
+            over_limit = response.json().get('over_limit')
+        except Exception as e:
+            # An unreachable check must not stall the upload; the PUTs still get 503s
+            tqdm.write(f"   ⚠️  IA-S3 limit check failed: {e}")
+            return
+        if over_limit:
+            self.on_throttle(None)
+
+    def acquire(self):
+        """Block a worker thread until an upload slot is free."""
+        while True:
+            if self._check_due():
+                self.check()
+            wait = self.try_acquire()
+            if wait is None:
+                return
+            if quit_flag:
+                raise KeyboardInterrupt("Upload interrupted by user.")
+            time.sleep(min(wait, 0.5))
+
+    async def acquire_async(self, loop):
+        """Wait on the event loop until an upload slot is free."""
+        while True:
+            if self._check_due():
+                await loop.run_in_executor(None, self.check)
+            wait = self.try_acquire()
+            if wait is None:
+                return
+            if quit_flag:
+                raise KeyboardInterrupt("Upload interrupted by user.")
+            await asyncio.sleep(min(wait, 0.5))
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def on_success(self):
+        with self.lock:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_throttle(self, retry_after: Optional[float]) -> float:
+        """Back off after a SlowDown; returns the seconds to wait before retrying."""
+        pause = RATE_DEFAULT_PAUSE if retry_after is None else retry_after
+        with self.lock:
+            now = time.monotonic()
+            self.throttled += 1
+            self.paused_until = max(self.paused_until, now + pause)
+            if now - self.last_decrease >= RATE_DECREASE_COOLDOWN:
+                self.last_decrease = now
+                self.limit = max(1.0, self.limit / 2)
+                self.lowest = min(self.lowest, int(self.limit))
+            return max(pause, self.paused_until - now)
+
+    def summary(self) -> str:
+        return (f"{self.throttled} SlowDown responses, limit now {int(self.limit)}/{self.max_limit} "
+                f"in flight (lowest {self.lowest})")
+
+
+def in_bandwidth_window(window: Dict[str, Any], now: time.struct_time) -> bool:
+    """True if local time `now` falls in a schedule window from parse_bandwidth_window()."""
+    minute = now.tm_hour * 60 + now.tm_min
+    day = now.tm_wday
+    if window['start'] < window['end']:
+        inside = window['start'] <= minute < window['end']
+    else:
+        inside = minute >= window['start'] or minute < window['end']
+        if minute < window['end']:
+            day = (day - 1) % 7   # Past midnight: the window began yesterday
+    return inside and (not window['days'] or day in window['days'])
+
+
+class BandwidthLimiter:
+    """
+    Token bucket capping the bytes per second sent by uploads.
+
+    Each chunk takes its tokens before it is sent. Once the bucket is empty
+    the caller is told how long to wait, in the order chunks asked, so
+    concurrent uploads share the cap evenly. Without a rate nothing waits.
+    A limiter with a `parent` (one batch job's own cap) also takes tokens
+    from the parent, so a chunk waits for whichever cap is tighter.
+
+    The rate is re-evaluated every BANDWIDTH_CHECK_INTERVAL: the control
+    file's value while it exists, else the first schedule window containing
+    the current time, else the base rate.
+    """
+    def __init__(self, rate: Optional[float] = None, parent: Optional['BandwidthLimiter'] = None):
+        self.base_rate = rate or None
+        self.rate = self.base_rate
+        self.parent = parent
+        self.schedule: List[Dict[str, Any]] = []
+        self.control_file: Optional[Path] = None
+        self.control_key: Optional[Tuple[int, int]] = None   # (mtime_ns, size) of the file last read
+        self.override: Optional[Tuple[Optional[int], str]] = None   # (rate, text) from the control file
+        self.next_check = 0.0
+        self.epoch = 0   # Bumped on every rate change, so waits planned at the old rate end
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate: Optional[float]):
+        """Change the base cap in bytes per second; None or 0 removes it."""
+        self.configure(rate, self.schedule, self.control_file)
+
+    def configure(self, rate: Optional[float], schedule: Iterable[Dict[str, Any]] = (),
+                  control_file: Optional[Path] = None):
+        """Set the base cap, the time-of-day schedule and the control file to follow."""
+        with self.lock:
+            self.base_rate = rate or None
+            self.schedule = list(schedule)
+            self.control_file = control_file
+            self.control_key = None
+            self.override = None
+            self._refresh(time.monotonic())
+
+    def request_refresh(self):
+        """Re-read the control file and schedule before the next chunk (safe from a signal handler)."""
+        self.next_check = 0.0
+
+    def _read_control_file(self):
+        """Pick up a new, changed or removed control file."""
+        try:
+            st = self.control_file.stat()
+        except OSError:
+            self.control_key = self.override = None
+            return
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self.control_key:
+            return
+        self.control_key = key
+        self.override = None
+        try:
+            text = self.control_file.read_text(encoding='utf-8').strip()
+            if text:
+                self.override = (parse_bandwidth(text, self.base_rate), text)
+        except (OSError, ValueError) as e:
+            tqdm.write(f"⚠️  Ignoring bandwidth control file '{self.control_file}': {e}")
+
+    def _refresh(self, now: float):
+        """Work out the current rate and switch to it if it changed (lock held)."""
+        self.next_check = now + BANDWIDTH_CHECK_INTERVAL
+        if self.control_file is not None:
+            self._read_control_file()
+        rate, reason = self.base_rate, "--max-bandwidth"
+        if self.override is not None:
+            rate, reason = self.override[0], f"'{self.override[1]}' in {self.control_file}"
         else:
-            # User skipped sync
-            upload_log = load_upload_log(identifier)
-            if not upload_log:
-                print("\n⚠️  No upload history found. Files will be compared by size only.")
+            local = time.localtime()
+            for window in self.schedule:
+                if in_bandwidth_window(window, local):
+                    rate, reason = window['rate'], f"schedule {window['text']}"
+                    break
+        if rate == self.rate:
+            return
+        self.rate = rate
+        self.epoch += 1
+        self.tokens = 0.0
+        self.updated = now
+        if rate:
+            tqdm.write(f"🚦 Upload bandwidth capped at {format_size(rate)}/s ({reason})")
+        else:
+            tqdm.write(f"🚦 Upload bandwidth no longer capped ({reason})")
+
+    def epochs(self) -> Tuple[int, ...]:
+        """Rate change counters of this limiter and its parents."""
+        return (self.epoch,) + (self.parent.epochs() if self.parent is not None else ())
+
+    def reserve(self, nbytes: int) -> float:
+        """Take tokens for `nbytes`; returns the seconds to wait before sending them."""
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.next_check:
+                self._refresh(now)
+            wait = 0.0
+            if self.rate:
+                self.tokens = min(self.rate * BANDWIDTH_BURST_SECONDS,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= nbytes
+                wait = max(0.0, -self.tokens / self.rate)
+        if self.parent is not None:
+            wait = max(wait, self.parent.reserve(nbytes))
+        return wait
+
+    def throttle(self, nbytes: int):
+        """Block the calling thread until `nbytes` may be sent."""
+        epochs = self.epochs()
+        wait = self.reserve(nbytes)
+        deadline = time.monotonic() + wait
+        while wait > 0 and self.epochs() == epochs:
+            if quit_flag:
+                raise KeyboardInterrupt("Upload interrupted by user.")
+            time.sleep(min(wait, 0.5))
+            wait = deadline - time.monotonic()
+
+    async def throttle_async(self, nbytes: int):
+        """Wait on the event loop until `nbytes` may be sent."""
+        epochs = self.epochs()
+        wait = self.reserve(nbytes)
+        deadline = time.monotonic() + wait
+        while wait > 0 and self.epochs() == epochs:
+            await asyncio.sleep(min(wait, 0.5))
+            wait = deadline - time.monotonic()
+
+
+# Shared by every upload of the process, whichever engine or identifier
+bandwidth_limiter = BandwidthLimiter()
+
+
+def is_transient_failure(status: Optional[int] = None, error: Optional[BaseException] = None) -> bool:
+    """True if another attempt may succeed: no response, 408, 429 or 5xx."""
+    if error is not None:
+        transient = getattr(error, 'transient', None)
+        if transient is not None:
+            return transient
+        if isinstance(error, (FileNotFoundError, IsADirectoryError, PermissionError)):
+            return False   # Local file problem; a retry reads the same file
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+    if status is None:
+        return True        # Connection errors and timeouts
+    return status in TRANSIENT_STATUSES or status >= 500
+
+
+def retry_backoff(attempt: int) -> float:
+    """Exponential backoff after `attempt` failures, with jitter so retries don't arrive together."""
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def plan_retry(file_info: Dict[str, Any], attempt: int, reason: str, transient: bool,
+               delay: Optional[float] = None) -> Optional[float]:
+    """
+    Decide what follows a failed attempt and report it. Sets and returns
+    file_info['retry_in'], the seconds to wait before the next attempt
+    (at least `delay`, e.g. a Retry-After), or None if the file has failed
+    for good: permanent error or no attempts left.
+    """
+    relative_path = file_info['relative_path']
+    file_info['retry_in'] = None
+    if not transient:
+        tqdm.write(f"   ❌ {relative_path}: {reason} - not retrying")
+    elif attempt >= UPLOAD_MAX_ATTEMPTS:
+        tqdm.write(f"   ❌ {relative_path}: {reason} - giving up after {attempt} attempts")
+    else:
+        file_info['retry_in'] = max(delay or 0.0, retry_backoff(attempt))
+        tqdm.write(f"   ⚠️  {relative_path}: {reason} - attempt {attempt}/{UPLOAD_MAX_ATTEMPTS}, "
+                   f"retrying in {file_info['retry_in']:.0f}s")
+    if file_info['retry_in'] is None:
+        file_info['uploaded'] = False
+    return file_info['retry_in']
 
-    # Scan local files
-    print("\n📂 Scanning local files...")
-    local_files = get_local_files(local_dir)
 
-    if not local_files:
-        print(f"❌ No files found in '{local_dir}'.")
-        return False
+class RetryQueue:
+    """Failed files waiting out their backoff, soonest first (thread-safe)."""
+    def __init__(self):
+        self.heap: List[Tuple[float, int, Any]] = []
+        self.counter = itertools.count()   # Keeps equal times in FIFO order
+        self.lock = threading.Lock()
 
-    # Calculate total size
-    total_size = sum(f['size'] for f in local_files.values())
-    print(f"   Found {len(local_files)} files ({format_size(total_size)})")
+    def __len__(self) -> int:
+        return len(self.heap)
 
-    # Determine which files need uploading
-    files_to_upload = []
-    already_uploaded = []
+    def push(self, delay: float, item: Any):
+        with self.lock:
+            heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), item))
 
-    for relative_path, file_info in local_files.items():
-        if quit_flag:
-            break
+    def pop_ready(self) -> Optional[Any]:
+        """The next item whose backoff is over, or None."""
+        with self.lock:
+            if self.heap and self.heap[0][0] <= time.monotonic():
+                return heapq.heappop(self.heap)[2]
+            return None
 
-        filepath = file_info['path']
-        size = file_info['size']
-        log_entry = upload_log.get(relative_path)
-
-        needs_upload = False
-        reason = ""
-
-        if log_entry:
-            if not log_entry['uploaded']:
-                needs_upload = True
-                reason = "previous upload failed"
-            elif log_entry['size'] != size:
-                needs_upload = True
-                reason = f"size changed ({log_entry['size']} → {size})"
-            else:
-                already_uploaded.append(relative_path)
-                continue
-        else:
-            needs_upload = True
-            reason = "not yet uploaded"
-
-        if needs_upload:
-            files_to_upload.append({
-                'relative_path': relative_path,
-                'path': filepath,
-                'size': size,
-                'uploaded': False,
-                'reason': reason
-            })
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until the next item is ready; None if the queue is empty."""
+        with self.lock:
+            return max(0.0, self.heap[0][0] - time.monotonic()) if self.heap else None
 
-    if quit_flag:
-        print("⚠️  Exiting due to user request.")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload Worker Pool
+# ─────────────────────────────────────────────────────────────────────────────
+def upload_single_file(item, file_info: Dict[str, Any], upload_metadata: Dict[str, Any],
+                       progress: Optional[UploadProgress] = None,
+                       multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                       s3_endpoint: str = IA_S3_ENDPOINT,
+                       controller: Optional[RateController] = None,
+                       limiter: Optional[BandwidthLimiter] = None,
+                       multipart_uploads: Optional['BlockingMultipartUploads'] = None) -> bool:
+    """
+    Make one upload attempt for a file.
+    Runs inside a pool worker, so all output goes through tqdm.write().
+    While the body is sent the file is an active transfer of `progress`.
+    Files at or above `multipart_threshold` go up as resumable multipart parts
+    (packed archives never do) through `multipart_uploads`, or a one-off
+    loop and connection pool without it. The MD5 computed while streaming is stored in file_info['md5_hash'];
+    a pre-computed file_info['expected_md5'] is sent as Content-MD5.
+    SlowDown responses are reported to `controller`, which sets the wait;
+    the body is sent as fast as `limiter` (default: the process-wide cap) allows.
+    After a failure file_info['retry_in'] is the backoff before the next
+    attempt, or None once the file has failed for good.
+    """
+    relative_path = file_info['relative_path']
+    multipart = file_info['size'] >= multipart_threshold and 'pack' not in file_info
+    headers = {}
+    if not multipart and file_info.get('expected_md5'):
+        headers['Content-MD5'] = file_info['expected_md5']
+
+    attempt = file_info.get('attempts', 0) + 1
+    if attempt > 1:
+        tqdm.write(f"📤 Retrying '{relative_path}' (attempt {attempt}/{UPLOAD_MAX_ATTEMPTS})")
+
+    if progress is None:
+        progress = UploadProgress(mode='off')
+    transfer = progress.transfer(relative_path, file_info['size'])
+    wrapped_file = None
+    success = False
+    started_at = time.time()
+    try:
+        if multipart:
+            if multipart_uploads is None:
+                uploads = BlockingMultipartUploads(item.identifier, upload_metadata, endpoint=s3_endpoint,
+                                                   controller=controller, limiter=limiter)
+                try:
+                    status, body = uploads.upload(file_info, transfer)
+                finally:
+                    uploads.close()
+            else:
+                status, body = multipart_uploads.upload(file_info, transfer)
+            text = body.decode('utf-8', 'replace')
+            mismatch = False
+        else:
+            wrapped_file = ProgressFile(open_upload_body(file_info), transfer, limiter=limiter)
+
+            # No internal retries: failures go back to the pool's retry queue
+            r = item.upload(
+                files={relative_path: wrapped_file},
+                verbose=False,
+                retries=0,
+                checksum=False,
+                metadata=upload_metadata,
+                headers=headers
+            )
+            # Response objects are falsy for HTTP errors, so test for None explicitly
+            response = r[0] if r else None
+            status = response.status_code if response is not None else None
+            text = response.text if response is not None else ''
+            etag = response.headers.get('ETag', '').strip('"') if response is not None else ''
+            # IA-S3's ETag is the MD5 of the body it stored
+            mismatch = status in (200, 201) and len(etag) == 32 and etag != wrapped_file.md5_hexdigest()
+
+        if status in (200, 201) and not mismatch:
+            file_info['uploaded'] = True
+            if not multipart:
+                file_info['md5_hash'] = wrapped_file.md5_hexdigest()
+            if controller is not None:
+                controller.on_success()
+            record_upload_attempt(item.identifier, file_info, attempt, started_at, status)
+            success = True
+            return True
+        elif status == 403 and 'already exists' in text.lower():
+            file_info['uploaded'] = True
+            record_upload_attempt(item.identifier, file_info, attempt, started_at, status)
+            tqdm.write(f"   ℹ️  {relative_path}: file already exists on IA")
+            success = True
+            return True
+
+        reason = "checksum mismatch" if mismatch else f"HTTP {status or 'N/A'}"
+        record_upload_attempt(item.identifier, file_info, attempt, started_at, status, reason)
+        plan_retry(file_info, attempt, reason, mismatch or is_transient_failure(status))
         return False
 
-    # Show summary
-    print("\n" + "=" * 60)
-    print(f"📊 Upload Summary")
-    print("=" * 60)
-    print(f"   📁 Local files:     {len(local_files)}")
-    print(f"   ✅ Already on IA:   {len(already_uploaded)}")
-    print(f"   📤 To upload:       {len(files_to_upload)}")
-    
-    if already_uploaded and len(files_to_upload) > 0:
-        print(f"\n   Files already on IA (skipping):")
-        for f in already_uploaded[:5]:
-            print(f"      • {f}")
-        if len(already_uploaded) > 5:
-            print(f"      ... and {len(already_uploaded) - 5} more")
-
-    if not files_to_upload:
-        print("\n✅ All files are already uploaded!")
-        return True
+    except KeyboardInterrupt:
+        raise
+    except Exception as e:
+        record_upload_attempt(item.identifier, file_info, attempt, started_at, error=str(e) or type(e).__name__)
+        # HTTP errors from item.upload() carry the response
+        response = getattr(e, 'response', None)
+        delay = getattr(e, 'delay', None)
+        if response is not None and is_throttle_response(response.status_code, response.text):
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            delay = controller.on_throttle(retry_after) if controller is not None else retry_after
+            reason = f"rate limit hit (HTTP {response.status_code})"
+        else:
+            reason = f"error: {e}"
+        plan_retry(file_info, attempt, reason, is_transient_failure(error=e), delay)
+        return False
+    finally:
+        if wrapped_file is not None:
+            wrapped_file.close()
+        transfer.close(keep=success)
+
+
+def run_upload_pool(identifier: str, item, files_to_upload: Iterable[Dict[str, Any]],
+                    upload_metadata: Dict[str, Any], concurrency: int = DEFAULT_UPLOAD_CONCURRENCY,
+                    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                    s3_endpoint: str = IA_S3_ENDPOINT, progress: Optional[UploadProgress] = None,
+                    on_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    controller: Optional[RateController] = None,
+                    limiter: Optional[BandwidthLimiter] = None) -> int:
+    """
+    Upload files using a bounded pool of worker threads.
+
+    `files_to_upload` may be a list or any iterable (e.g. a pipeline queue);
+    it is drained lazily, so only `concurrency` files are in flight at once,
+    fewer while `controller` is backing off. Each worker makes one attempt;
+    a file that may succeed later goes to a retry queue and is picked up
+    again once its backoff is over. When a file is done its result goes to
+    the upload log, it is counted in `progress` and `on_done(file_info)` is
+    called. Without a `progress` the pool shows its own and counts the
+    files it takes into its totals. Returns the number of successful uploads.
+    """
+    if isinstance(files_to_upload, list):
+        concurrency = min(concurrency, len(files_to_upload))
+    concurrency = max(1, concurrency)
+    if controller is None:
+        controller = RateController(concurrency, s3_endpoint, identifier)
+
+    own_progress = progress is None
+    if own_progress:
+        progress = UploadProgress()
+    # Large files share one connection pool instead of opening their own
+    multipart_uploads = BlockingMultipartUploads(identifier, upload_metadata, endpoint=s3_endpoint,
+                                                 max_files=concurrency, controller=controller, limiter=limiter)
+
+    def worker(file_info: Dict[str, Any]) -> bool:
+        if quit_flag:
+            return False
+        controller.acquire()
+        try:
+            success = upload_single_file(item, file_info, upload_metadata, progress=progress,
+                                         multipart_threshold=multipart_threshold,
+                                         s3_endpoint=s3_endpoint, controller=controller,
+                                         limiter=limiter, multipart_uploads=multipart_uploads)
+        finally:
+            controller.release()
+        if not success and file_info.get('retry_in') is not None:
+            retries.push(file_info['retry_in'], file_info)
+            return False
+        # Update log after each file
+        update_upload_log(identifier, [file_info])
+        progress.file_done()
+        if on_done is not None:
+            on_done(file_info)
+        return success
+
+    succeeded = 0
+    source = iter(files_to_upload)
+    exhausted = False
+    pending = set()
+    retries = RetryQueue()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload")
+    # Taking the next file may block on a pipeline queue, so it gets its own
+    # thread and the loop keeps starting retries meanwhile
+    feeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-feed")
+    next_file = None
+    try:
+        while True:
+            # Files whose backoff is over go ahead of new ones
+            while len(pending) < concurrency and not quit_flag:
+                retry = retries.pop_ready()
+                if retry is None:
+                    break
+                pending.add(executor.submit(worker, retry))
+            if (next_file is None and not exhausted and len(pending) < concurrency
+                    and len(retries) < RETRY_QUEUE_SIZE and not quit_flag):
+                next_file = feeder.submit(next, source, None)
+            if next_file is not None and next_file.done():
+                file_info = next_file.result()
+                next_file = None
+                if file_info is None:
+                    exhausted = True
+                else:
+                    if own_progress:
+                        progress.add(1, file_info['size'])
+                    pending.add(executor.submit(worker, file_info))
+                continue
+            if not pending and (quit_flag or (exhausted and not len(retries))):
+                break
+
+            ready_in = retries.next_ready_in()
+            timeout = 0.5 if ready_in is None else min(0.5, ready_in)
+            waiting = pending | {next_file} if next_file is not None else pending
+            if not waiting:
+                time.sleep(timeout)
+                continue
+            # Short timeout keeps the main thread responsive to Ctrl+C
+            done, _ = wait(waiting, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done & pending:
+                pending.discard(future)
+                try:
+                    if future.result():
+                        succeeded += 1
+                except KeyboardInterrupt:
+                    pass
+    except KeyboardInterrupt:
+        tqdm.write("\n⚠️  Upload interrupted by user.")
+        for future in pending:
+            future.cancel()
+        raise
+    finally:
+        # Also on a failing source or worker, so no thread outlives the pool
+        feeder.shutdown(wait=False)
+        executor.shutdown(wait=True)
+        multipart_uploads.close()
+        if own_progress:
+            progress.close()
 
-    print(f"\n📤 {len(files_to_upload)} files to upload")
+    return succeeded
 
-    # Get the item
-    item = get_item(identifier)
 
-    # Prepare metadata for upload
+# ─────────────────────────────────────────────────────────────────────────────
+# Async S3 Upload Engine
+# ─────────────────────────────────────────────────────────────────────────────
+def get_s3_credentials() -> Tuple[Optional[str], Optional[str]]:
+    """Return (access_key, secret_key) from the ia configuration."""
+    session = get_shared_session()
+    return session.access_key, session.secret_key
+
+
+def build_s3_headers(credentials: Tuple[Optional[str], Optional[str]],
+                     upload_metadata: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Build the IA-S3 headers shared by every PUT of a run.
+    Mirrors the headers item.upload() sends, but prepared only once; no
+    x-archive-queue-derive header, so IA queues a derive as it does for
+    item.upload() by default.
+    """
+    headers = {
+        'x-archive-auto-make-bucket': '1',
+    }
+    access_key, secret_key = credentials
+    if access_key and secret_key:
+        headers['authorization'] = f'LOW {access_key}:{secret_key}'
+    for key, value in upload_metadata.items():
+        if not value:
+            continue
+        value = str(value)
+        if not value.isascii() or '\n' in value or '\r' in value:
+            value = f'uri({quote(value)})'
+        headers[f'x-archive-meta00-{key}'.replace('_', '--')] = value
+    return headers
+
+
+class FileSlice(NamedTuple):
+    """A byte range of an open file, sent with sendfile() instead of being read."""
+    file: BinaryIO
+    offset: int
+    count: int
+
+
+class AsyncHTTPConnectionPool:
+    """
+    Minimal keep-alive HTTP/1.1 client for a single host.
+    Connections are reused across requests; at most `max_connections` are open.
+    Must be created inside a running event loop.
+    """
+    def __init__(self, endpoint: str, max_connections: int):
+        parsed = urlsplit(endpoint)
+        self.host = parsed.hostname
+        self.host_header = parsed.netloc
+        self.base_path = parsed.path.rstrip('/')
+        if parsed.scheme == 'https':
+            self.port = parsed.port or 443
+            self.ssl_context = shared_ssl_context()
+        else:
+            self.port = parsed.port or 80
+            self.ssl_context = None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        # drain() returns only once everything written is in the socket, so a
+        # body chunk may be a view of a buffer that is refilled right after
+        writer.transport.set_write_buffer_limits(high=0)
+        self.connections_opened += 1
+        return reader, writer
+
+    async def _read_response(self, reader: 'asyncio.StreamReader', method: str) -> Tuple[int, Dict[str, str], bytes, bool]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before response")
+        version, status, _ = (status_line.decode('latin-1').rstrip('\r\n') + '  ').split(' ', 2)
+        status = int(status)
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        reusable = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        else:
+            body = await reader.read()
+            reusable = False
+        return status, headers, body, reusable
+
+    async def request(self, method: str, path: str, headers: Dict[str, str],
+                      body_factory=None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Send a request and return (status, headers, body).
+        `body_factory` returns an async iterator of byte chunks (or FileSlices,
+        over plain HTTP); it is called again if a reused keep-alive connection
+        turns out to be stale.
+        """
+        await self._semaphore.acquire()
+        try:
+            while True:
+                if self._idle:
+                    reader, writer = self._idle.pop()
+                    reused = True
+                else:
+                    reader, writer = await self._open()
+                    reused = False
+
+                head = [f"{method} {self.base_path}{path} HTTP/1.1", f"Host: {self.host_header}"]
+                head.extend(f"{k}: {v}" for k, v in headers.items())
+                try:
+                    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                    if body_factory is not None:
+                        async for chunk in body_factory():
+                            if isinstance(chunk, FileSlice):
+                                await asyncio.get_running_loop().sendfile(
+                                    writer.transport, chunk.file, chunk.offset, chunk.count)
+                                continue
+                            writer.write(chunk)
+                            await writer.drain()
+                    await writer.drain()
+                    self.requests_sent += 1
+                    status, resp_headers, body, reusable = await self._read_response(reader, method)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    if reused:
+                        # Server dropped an idle keep-alive connection; retry on a fresh one
+                        continue
+                    raise ConnectionError(f"{method} {path} failed: {e}") from e
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if reusable:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, resp_headers, body
+        finally:
+            self._semaphore.release()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+        _count_closed_pools(self.requests_sent, self.connections_opened)
+        self.requests_sent = self.connections_opened = 0
+
+
+class AsyncUploadEngine:
+    """
+    Upload many files concurrently with asyncio.
+
+    Hundreds of PUTs can be in flight on one event loop; file reads run on a
+    small thread pool so the loop never blocks on disk. Results are recorded
+    in the same upload_log table as the threaded 'ia' engine.
+    """
+    def __init__(self, identifier: str, upload_metadata: Dict[str, Any],
+                 endpoint: str = IA_S3_ENDPOINT,
+                 concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 io_threads: int = DEFAULT_ASYNC_IO_THREADS,
+                 credentials: Optional[Tuple[Optional[str], Optional[str]]] = None,
+                 multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                 controller: Optional[RateController] = None,
+                 limiter: Optional[BandwidthLimiter] = None):
+        self.identifier = identifier
+        self.endpoint = endpoint
+        self.limiter = limiter or bandwidth_limiter
+        self.concurrency = max(1, concurrency)
+        self.io_threads = max(1, io_threads)
+        if credentials is None:
+            credentials = get_s3_credentials()
+        self.base_headers = build_s3_headers(credentials, upload_metadata)
+        self.multipart_threshold = multipart_threshold
+        self.controller = controller or RateController(self.concurrency, endpoint, identifier, credentials[0])
+        self.multipart = MultipartUploader(identifier, self.base_headers, controller=self.controller,
+                                           limiter=self.limiter)
+        # The kernel can copy files straight to a plain-HTTP socket; TLS (and O_DIRECT) need the bytes
+        self.sendfile = (use_sendfile and hasattr(os, 'sendfile') and urlsplit(endpoint).scheme == 'http'
+                         and page_cache_mode != 'direct')
+
+    @staticmethod
+    def _read_chunk(f, buffer: memoryview, md5) -> memoryview:
+        """Read the next chunk into `buffer` and add it to the running MD5 (on an I/O thread)."""
+        chunk = buffer[:f.readinto(buffer)]
+        md5.update(chunk)
+        return chunk
+
+    async def _file_body(self, loop, io_executor, file_info: Dict[str, Any], progress, md5):
+        """
+        Yield body chunks read and hashed on the I/O thread pool, all views of
+        one reused buffer. Without `md5` the file is sent in FileSlices with
+        sendfile() and not hashed.
+        """
+        with open_upload_body(file_info) as f:
+            if md5 is None:
+                offset, size = 0, os.fstat(f.fileno()).st_size
+                while offset < size:
+                    if quit_flag:
+                        raise KeyboardInterrupt("Upload interrupted by user.")
+                    count = min(upload_block_size, size - offset)
+                    await self.limiter.throttle_async(count)
+                    progress.update(count)
+                    yield FileSlice(f, offset, count)
+                    if page_cache_mode != 'keep':
+                        _fadvise(f.fileno(), offset, count, 'POSIX_FADV_DONTNEED')
+                    offset += count
+                return
+            buffer = memoryview(bytearray(min(upload_block_size, max(file_info['size'], 1))))
+            while True:
+                if quit_flag:
+                    raise KeyboardInterrupt("Upload interrupted by user.")
+                chunk = await loop.run_in_executor(io_executor, self._read_chunk, f, buffer, md5)
+                if not chunk:
+                    break
+                await self.limiter.throttle_async(len(chunk))
+                progress.update(len(chunk))
+                yield chunk
+
+    async def _upload_one(self, pool: AsyncHTTPConnectionPool, loop, io_executor,
+                          file_info: Dict[str, Any], progress) -> bool:
+        """One attempt; like upload_single_file(), failures leave file_info['retry_in'] set."""
+        relative_path = file_info['relative_path']
+        filepath = file_info['path']
+        path = f"/{self.identifier}/{quote(relative_path.lstrip('/').encode('utf-8'))}"
+        attempt = file_info.get('attempts', 0) + 1
+        started_at = time.time()
+        try:
+            size = file_info['pack'].size if 'pack' in file_info else filepath.stat().st_size
+        except OSError as e:
+            record_upload_attempt(self.identifier, file_info, attempt, started_at, error=str(e))
+            plan_retry(file_info, attempt, f"error: {e}", is_transient_failure(error=e))
+            return False
+        multipart = size >= self.multipart_threshold and 'pack' not in file_info
+        sendfile = self.sendfile and 'pack' not in file_info
+        expected_md5 = file_info.get('expected_md5')
+
+        if quit_flag:
+            raise KeyboardInterrupt("Upload interrupted by user.")
+        headers = dict(self.base_headers)
+        headers['Content-Length'] = str(size)
+        headers['x-archive-size-hint'] = str(size)
+        if expected_md5 and not multipart:
+            headers['Content-MD5'] = expected_md5
+        md5 = None if sendfile else hashlib.md5()
+        sent = 0
+
+        def rewind():
+            # Take back progress of a body that has to be sent again
+            nonlocal sent
+            progress.update(-sent)
+            sent = 0
+
+        def body_factory():
+            nonlocal md5
+            rewind()
+            md5 = None if sendfile else hashlib.md5()
+
+            async def counted():
+                nonlocal sent
+                async for chunk in self._file_body(loop, io_executor, file_info, progress, md5):
+                    sent += chunk.count if sendfile else len(chunk)
+                    yield chunk
+            return counted()
+
+        resp_headers = {}
+        try:
+            if multipart:
+                status, body = await self.multipart.upload(pool, loop, io_executor, path, file_info, progress)
+            else:
+                status, resp_headers, body = await pool.request('PUT', path, headers, body_factory)
+        except KeyboardInterrupt:
+            raise
+        except Exception as e:
+            rewind()
+            record_upload_attempt(self.identifier, file_info, attempt, started_at, error=str(e) or type(e).__name__)
+            plan_retry(file_info, attempt, f"error: {e}", is_transient_failure(error=e), getattr(e, 'delay', None))
+            return False
+
+        etag = resp_headers.get('etag', '').strip('"')
+        if status in (200, 201) and md5 is not None and not multipart and len(etag) == 32 and etag != md5.hexdigest():
+            # IA-S3's ETag is the MD5 of the body it stored
+            rewind()
+            record_upload_attempt(self.identifier, file_info, attempt, started_at, status, "checksum mismatch")
+            plan_retry(file_info, attempt, "checksum mismatch", True)
+            return False
+        elif status in (200, 201):
+            file_info['uploaded'] = True
+            if not multipart and sent == size:
+                # sendfile() bodies aren't hashed; a Content-MD5 sent with them was checked by IA
+                file_info['md5_hash'] = md5.hexdigest() if md5 is not None else expected_md5
+            self.controller.on_success()
+            record_upload_attempt(self.identifier, file_info, attempt, started_at, status)
+            return True
+        elif status == 403 and b'already exists' in body.lower():
+            file_info['uploaded'] = True
+            record_upload_attempt(self.identifier, file_info, attempt, started_at, status)
+            tqdm.write(f"   ℹ️  {relative_path}: file already exists on IA")
+            return True
+
+        rewind()
+        record_upload_attempt(self.identifier, file_info, attempt, started_at, status, f"HTTP {status}")
+        delay = None
+        reason = f"HTTP {status}"
+        if is_throttle_response(status, body.decode('utf-8', 'replace')):
+            delay = self.controller.on_throttle(parse_retry_after(resp_headers.get('retry-after')))
+            reason = f"rate limit hit (HTTP {status})"
+        plan_retry(file_info, attempt, reason, is_transient_failure(status), delay)
+        return False
+
+    async def _run(self, files_to_upload: Iterable[Dict[str, Any]], progress: Optional[UploadProgress] = None,
+                   on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        loop = asyncio.get_running_loop()
+        io_executor = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="upload-io")
+        # Taking the next file may block on a pipeline queue, so it gets its own thread
+        feeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-feed")
+        pool = AsyncHTTPConnectionPool(self.endpoint, self.concurrency)
+        controller = self.controller
+        own_progress = progress is None
+        if own_progress:
+            progress = UploadProgress()
+        succeeded = 0
+        backing_off = 0
+        tasks = set()
+        errors = []
+
+        async def task(file_info: Dict[str, Any]):
+            nonlocal succeeded, backing_off
+            while True:
+                success = False
+                transfer = progress.transfer(file_info['relative_path'], file_info['size'])
+                try:
+                    success = await self._upload_one(pool, loop, io_executor, file_info, transfer)
+                finally:
+                    transfer.close(keep=success)
+                    controller.release()
+                if success or file_info.get('retry_in') is None:
+                    break
+                # Back off without holding a slot, so other files keep uploading
+                backing_off += 1
+                try:
+                    await asyncio.sleep(file_info['retry_in'])
+                finally:
+                    backing_off -= 1
+                await controller.acquire_async(loop)
+            await loop.run_in_executor(io_executor, update_upload_log, self.identifier, [file_info])
+            if on_done is not None:
+                await loop.run_in_executor(io_executor, on_done, file_info)
+            succeeded += success
+            progress.file_done()
+
+        def finished(t: asyncio.Task):
+            tasks.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                errors.append(t.exception())
+
+        source = iter(files_to_upload)
+        try:
+            # At most `concurrency` files are taken from the source at once,
+            # fewer while the rate controller is backing off
+            while not quit_flag and not errors:
+                while backing_off >= RETRY_QUEUE_SIZE and not quit_flag:
+                    await asyncio.sleep(0.1)
+                await controller.acquire_async(loop)
+                file_info = await loop.run_in_executor(feeder, next, source, None)
+                if file_info is None:
+                    controller.release()
+                    break
+                if own_progress:
+                    progress.add(1, file_info['size'])
+                t = asyncio.ensure_future(task(file_info))
+                tasks.add(t)
+                t.add_done_callback(finished)
+            await asyncio.gather(*tasks)
+            if errors:
+                raise errors[0]
+        finally:
+            pool.close()
+            if own_progress:
+                progress.close()
+            feeder.shutdown(wait=False)
+            io_executor.shutdown(wait=True)
+        return succeeded
+
+    def upload(self, files_to_upload: Iterable[Dict[str, Any]], progress: Optional[UploadProgress] = None,
+               on_done: Optional[Callable[[Dict[str, Any]], None]] = None) -> int:
+        """
+        Upload files and return the number of successful uploads.
+        `files_to_upload` may be any iterable; it is drained lazily. Bytes and
+        finished files are counted in `progress` (without one the engine
+        shows its own) and `on_done(file_info)` is called for each file.
+        """
+        return asyncio.run(self._run(files_to_upload, progress, on_done))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Multipart Uploads
+# ─────────────────────────────────────────────────────────────────────────────
+class MultipartUploadError(Exception):
+    """
+    Raised when a multipart upload step is rejected by IA-S3. `transient`
+    overrides the status-based retry decision; `delay` is a throttle wait.
+    """
+    def __init__(self, message: str, status: Optional[int] = None,
+                 transient: Optional[bool] = None, delay: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.transient = transient
+        self.delay = delay
+
+
+def _xml_text(body: bytes, tag: str) -> Optional[str]:
+    """Return the text of the first element named `tag` (namespace-agnostic)."""
+    try:
+        root = ElementTree.fromstring(body)
+    except ElementTree.ParseError:
+        return None
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1] == tag:
+            return element.text
+    return None
+
+
+def _md5_parts(filepath: Path, size: int, part_size: int, on_part: Callable[[int, str], None],
+               stop: threading.Event) -> Optional[str]:
+    """
+    Read the file once, in order, through one reused buffer (runs on the I/O
+    thread pool). Each part's MD5 goes to `on_part(part_number, md5)` as
+    soon as it is read; returns the whole file's MD5, or None once `stop` is set.
+    """
+    buffer = memoryview(bytearray(min(upload_block_size, part_size)))
+    whole = hashlib.md5()
+    with open_for_read(filepath) as f:
+        for part_number, offset in enumerate(range(0, size, part_size), 1):
+            part = hashlib.md5()
+            remaining = min(part_size, size - offset)
+            while remaining:
+                if stop.is_set():
+                    return None
+                n = f.readinto(buffer[:min(remaining, len(buffer))])
+                if not n:
+                    raise MultipartUploadError(f"file shrank while part {part_number} was hashed",
+                                               transient=True)
+                part.update(buffer[:n])
+                whole.update(buffer[:n])
+                remaining -= n
+            on_part(part_number, part.hexdigest())
+    return whole.hexdigest()
+
+
+def _read_block(f, buffer: memoryview) -> memoryview:
+    """Read the next block into `buffer` (on an I/O thread)."""
+    return buffer[:f.readinto(buffer)]
+
+
+class MultipartUploader:
+    """
+    Upload one large file as S3 multipart parts, several parts in parallel.
+
+    Finished part numbers and ETags are stored in the upload log, so an
+    interrupted or restarted upload continues from the parts it already
+    sent instead of byte 0.
+    """
+    def __init__(self, identifier: str, base_headers: Dict[str, str],
+                 parallel_parts: int = MULTIPART_PARALLEL_PARTS,
+                 controller: Optional[RateController] = None,
+                 limiter: Optional[BandwidthLimiter] = None):
+        self.identifier = identifier
+        self.controller = controller
+        self.limiter = limiter or bandwidth_limiter
+        self.base_headers = base_headers
+        # Parts only need credentials; item metadata goes with initiate/complete
+        self.part_headers = {k: v for k, v in base_headers.items() if k == 'authorization'}
+        self.parallel_parts = max(1, parallel_parts)
+
+    @staticmethod
+    def part_size_for(size: int) -> int:
+        """Smallest MiB-aligned part size that keeps the upload within the S3 part limit."""
+        needed = -(-size // MULTIPART_MAX_PARTS)
+        part_size = max(MULTIPART_PART_SIZE, needed)
+        mib = 1024 * 1024
+        return -(-part_size // mib) * mib
+
+    async def _initiate(self, pool: AsyncHTTPConnectionPool, path: str, size: int) -> str:
+        headers = dict(self.base_headers)
+        headers['x-archive-size-hint'] = str(size)
+        headers['Content-Length'] = '0'
+        status, _, body = await pool.request('POST', f"{path}?uploads", headers)
+        upload_id = _xml_text(body, 'UploadId') if status == 200 else None
+        if not upload_id:
+            raise MultipartUploadError(f"initiate failed (HTTP {status})", status)
+        return upload_id
+
+    async def _upload_part(self, pool: AsyncHTTPConnectionPool, loop, io_executor, path: str,
+                           upload_id: str, filepath: Path, part_number: int, offset: int,
+                           length: int, content_md5: str, progress) -> str:
+        """
+        Send one part once. A failed part fails this attempt of the file;
+        the retry resumes after the parts that did finish.
+
+        The part is never held in memory: it is streamed through one reused
+        buffer of upload_block_size bytes, with the Content-MD5 that
+        _md5_parts() computed for it.
+        """
+        buffer = memoryview(bytearray(min(upload_block_size, max(length, 1))))
+        headers = dict(self.part_headers)
+        headers['Content-Length'] = str(length)
+        # IA-S3 accepts the hex digest, as sent by the internetarchive library
+        headers['Content-MD5'] = content_md5
+        url = f"{path}?partNumber={part_number}&uploadId={quote(upload_id)}"
+        if quit_flag:
+            raise KeyboardInterrupt("Upload interrupted by user.")
+        sent = 0
+
+        def rewind():
+            nonlocal sent
+            progress.update(-sent)
+            sent = 0
+
+        def body_factory():
+            rewind()
+
+            async def chunks():
+                nonlocal sent
+                with open_for_read(filepath) as f:
+                    f.seek(offset)
+                    remaining = length
+                    while remaining:
+                        if quit_flag:
+                            raise KeyboardInterrupt("Upload interrupted by user.")
+                        chunk = await loop.run_in_executor(io_executor, _read_block, f,
+                                                           buffer[:min(remaining, len(buffer))])
+                        if not chunk:
+                            # The next attempt sees the new size and starts a fresh upload
+                            raise MultipartUploadError(f"file shrank while part {part_number} was sent",
+                                                       transient=True)
+                        await self.limiter.throttle_async(len(chunk))
+                        sent += len(chunk)
+                        remaining -= len(chunk)
+                        progress.update(len(chunk))
+                        yield chunk
+            return chunks()
+
+        try:
+            status, headers_in, body = await pool.request('PUT', url, headers, body_factory)
+        except BaseException:
+            rewind()
+            raise
+        etag = headers_in.get('etag')
+        if status == 200 and etag:
+            if self.controller is not None:
+                self.controller.on_success()
+            return etag
+        rewind()
+        if status == 404 and _xml_text(body, 'Code') == 'NoSuchUpload':
+            # The retry starts a new upload, so this one is worth retrying
+            raise MultipartUploadError("upload id expired on server", status, transient=True)
+        delay = None
+        if is_throttle_response(status, body.decode('utf-8', 'replace')) and self.controller is not None:
+            delay = self.controller.on_throttle(parse_retry_after(headers_in.get('retry-after')))
+        raise MultipartUploadError(f"part {part_number} failed (HTTP {status})", status, delay=delay)
+
+    async def _complete(self, pool: AsyncHTTPConnectionPool, path: str, upload_id: str,
+                        etags: Dict[int, str]) -> Tuple[int, bytes]:
+        parts_xml = ''.join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{etags[n]}</ETag></Part>"
+            for n in sorted(etags)
+        )
+        payload = f"<CompleteMultipartUpload>{parts_xml}</CompleteMultipartUpload>".encode('utf-8')
+        headers = dict(self.base_headers)
+        headers['Content-Length'] = str(len(payload))
+
+        async def body():
+            yield payload
+        status, _, response = await pool.request('POST', f"{path}?uploadId={quote(upload_id)}", headers, body)
+        # S3 may report errors inside a 200 response
+        if status == 200 and _xml_text(response, 'Code'):
+            status = 500
+        return status, response
+
+    async def upload(self, pool: AsyncHTTPConnectionPool, loop, io_executor, path: str,
+                     file_info: Dict[str, Any], progress) -> Tuple[int, bytes]:
+        """
+        Upload (or resume) a file; returns the complete request's (status, body).
+        One sequential pass hashes the file while parts are sent: every part
+        waits only for its own Content-MD5, and on success the whole file's
+        MD5 is stored in file_info['md5_hash'].
+        """
+        relative_path = file_info['relative_path']
+        filepath = file_info['path']
+        st = filepath.stat()
+        size = st.st_size
+
+        state = await loop.run_in_executor(io_executor, load_multipart_state, self.identifier, relative_path)
+        if state and (state['size'], state['mtime_ns']) == (size, st.st_mtime_ns):
+            upload_id = state['upload_id']
+            part_size = state['part_size']
+            etags = dict(state['parts'])
+            tqdm.write(f"   ⏯️  {relative_path}: resuming multipart upload ({len(etags)} parts done)")
+        else:
+            part_size = self.part_size_for(size)
+            upload_id = await self._initiate(pool, path, size)
+            await loop.run_in_executor(io_executor, save_multipart_upload, self.identifier,
+                                       relative_path, upload_id, size, st.st_mtime_ns, part_size)
+            etags = {}
+
+        part_count = max(1, -(-size // part_size))
+        # Bytes this call added to the progress bar, taken back if it fails
+        credited = sum(min(part_size, size - (n - 1) * part_size) for n in etags)
+        progress.update(credited)
+        semaphore = asyncio.Semaphore(self.parallel_parts)
+        failures: List[Exception] = []
+        missing = [n for n in range(1, part_count + 1) if n not in etags]
+        # Content-MD5 of each part still to send, filled in by the hashing pass
+        part_md5s = {n: loop.create_future() for n in missing}
+        stop_hashing = threading.Event()
+
+        def part_hashed(part_number: int, md5: str):
+            future = part_md5s.get(part_number)
+            if future is not None and not future.done():
+                future.set_result(md5)
+
+        def hashing_done(future):
+            # A failed or stopped pass leaves parts without a Content-MD5
+            error = None if future.cancelled() else future.exception()
+            for part_future in part_md5s.values():
+                if not part_future.done():
+                    part_future.set_exception(error or MultipartUploadError("hashing stopped", transient=True))
+
+        hashing = loop.run_in_executor(
+            io_executor, _md5_parts, filepath, size, part_size,
+            lambda n, md5: loop.call_soon_threadsafe(part_hashed, n, md5), stop_hashing)
+        hashing.add_done_callback(hashing_done)
+
+        async def send(part_number: int):
+            nonlocal credited
+            try:
+                content_md5 = await part_md5s[part_number]
+            except Exception as e:
+                failures.append(e)
+                return
+            async with semaphore:
+                if failures:
+                    return   # This attempt has failed; parts still in flight finish and are kept
+                offset = (part_number - 1) * part_size
+                length = min(part_size, size - offset)
+                try:
+                    etag = await self._upload_part(pool, loop, io_executor, path, upload_id, filepath,
+                                                   part_number, offset, length, content_md5, progress)
+                except Exception as e:
+                    failures.append(e)
+                    return
+            credited += length
+            etags[part_number] = etag
+            await loop.run_in_executor(io_executor, record_multipart_part, self.identifier,
+                                       relative_path, upload_id, part_number, etag)
+
+        tasks = [asyncio.ensure_future(send(n)) for n in missing]
+        try:
+            await asyncio.gather(*tasks)
+            if failures:
+                raise failures[0]
+            md5_hash = await hashing
+        except BaseException as e:
+            stop_hashing.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, hashing, return_exceptions=True)
+            for part_future in part_md5s.values():
+                if part_future.done() and not part_future.cancelled():
+                    part_future.exception()   # Retrieved, so asyncio doesn't log it
+            progress.update(-credited)
+            if isinstance(e, MultipartUploadError) and e.status == 404:
+                # Server forgot the upload; start over on the next attempt
+                await loop.run_in_executor(io_executor, clear_multipart_state, self.identifier, relative_path)
+            raise
+
+        status, body = await self._complete(pool, path, upload_id, etags)
+        if status == 200:
+            # Every part IA stored matched its Content-MD5, so this is the MD5 of what IA has
+            file_info['md5_hash'] = md5_hash
+            await loop.run_in_executor(io_executor, clear_multipart_state, self.identifier, relative_path)
+        else:
+            progress.update(-credited)
+        return status, body
+
+
+class BlockingMultipartUploads:
+    """
+    Multipart uploads for the worker threads of the 'ia' engine.
+
+    One event loop thread, keep-alive connection pool and part I/O thread
+    pool serve every large file of a run_upload_pool() call, so connections
+    are reused from file to file. They are started by the first large file;
+    `max_files` is how many workers may upload one at the same time.
+    """
+    def __init__(self, identifier: str, upload_metadata: Dict[str, Any], endpoint: str = IA_S3_ENDPOINT,
+                 max_files: int = 1, controller: Optional[RateController] = None,
+                 limiter: Optional[BandwidthLimiter] = None):
+        self.identifier = identifier
+        self.upload_metadata = upload_metadata
+        self.endpoint = endpoint
+        self.max_files = max(1, max_files)
+        self.controller = controller
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread: Optional[threading.Thread] = None
+        self.uploader: Optional[MultipartUploader] = None
+        self.pool: Optional[AsyncHTTPConnectionPool] = None
+        self.io_executor: Optional[ThreadPoolExecutor] = None
+
+    def _start(self):
+        base_headers = build_s3_headers(get_s3_credentials(), self.upload_metadata)
+        self.uploader = MultipartUploader(self.identifier, base_headers, controller=self.controller,
+                                          limiter=self.limiter)
+        connections = self.uploader.parallel_parts * self.max_files
+        self.io_executor = ThreadPoolExecutor(max_workers=connections, thread_name_prefix="part-io")
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="multipart-loop", daemon=True)
+        self.thread.start()
+
+        async def open_pool():
+            return AsyncHTTPConnectionPool(self.endpoint, connections)
+
+        self.pool = asyncio.run_coroutine_threadsafe(open_pool(), self.loop).result()
+
+    def upload(self, file_info: Dict[str, Any], progress=None) -> Tuple[int, bytes]:
+        """Run one multipart upload attempt on the shared loop; blocks the calling worker."""
+        with self.lock:
+            if self.loop is None:
+                self._start()
+        path = f"/{self.identifier}/{quote(file_info['relative_path'].lstrip('/').encode('utf-8'))}"
+        return asyncio.run_coroutine_threadsafe(
+            self.uploader.upload(self.pool, self.loop, self.io_executor, path, file_info, progress), self.loop
+        ).result()
+
+    def close(self):
+        """Close the connections and stop the loop thread, if they were started."""
+        with self.lock:
+            if self.loop is None:
+                return
+
+            async def close_pool():
+                self.pool.close()
+                await asyncio.sleep(0)   # Let the transports finish closing
+
+            asyncio.run_coroutine_threadsafe(close_pool(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.io_executor.shutdown(wait=True)
+            self.loop = None
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload Pipeline
+# ─────────────────────────────────────────────────────────────────────────────
+_STAGE_DONE = object()   # Sentinel that closes a pipeline queue
+
+
+class UploadPipeline:
+    """
+    Scan, hash, upload and verify as concurrent stages joined by bounded queues.
+
+    The scan stage plans each directory against its upload log entries as
+    soon as it is listed; the hash stage hashes files whose content must be
+    compared (or sent as Content-MD5); the upload engine drains the upload
+    queue; the verify stage checks every file against the IA listing. The
+    first upload starts seconds after launch. Files IA confirmed by MD5 on
+    upload (multipart parts each by their Content-MD5) are verified and
+    forgotten every VERIFY_BATCH_SIZE files, so only files that failed or
+    were already on IA are held until the final check and memory doesn't
+    grow with the tree. Queue depths are shown with the progress.
+
+    With `pack_format`, files smaller than `pack_threshold` are gathered into
+    archives of up to `pack_size` bytes, each uploaded as one object; the
+    upload log records which archive every file went up in.
+    """
+    def __init__(self, identifier: str, local_dir: Path, upload_metadata: Dict[str, Any],
+                 engine: str = 'ia', concurrency: int = DEFAULT_UPLOAD_CONCURRENCY,
+                 s3_endpoint: str = IA_S3_ENDPOINT,
+                 multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD,
+                 content_md5: bool = False,
+                 listing: Optional[IAListing] = None,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 hash_workers: int = DEFAULT_HASH_WORKERS,
+                 full_rescan: bool = False,
+                 batches: Optional[Iterable[List[Tuple[str, LocalFile]]]] = None,
+                 deep_verify: Optional[float] = None,
+                 check_limit: bool = False,
+                 pack_format: Optional[str] = None,
+                 pack_threshold: int = DEFAULT_PACK_THRESHOLD,
+                 pack_size: int = DEFAULT_PACK_SIZE,
+                 controller: Optional[RateController] = None,
+                 limiter: Optional[BandwidthLimiter] = None,
+                 progress: Optional[UploadProgress] = None,
+                 verify: bool = True,
+                 quiet: bool = False):
+        self.identifier = identifier
+        self.local_dir = local_dir
+        self.upload_metadata = upload_metadata
+        self.engine = engine
+        self.concurrency = concurrency
+        self.s3_endpoint = s3_endpoint
+        self.multipart_threshold = multipart_threshold
+        self.content_md5 = content_md5
+        self.listing = listing or IAListing(identifier)
+        self.queue_size = max(1, queue_size)
+        self.hash_workers = max(1, hash_workers)
+        self.full_rescan = full_rescan
+        self.batches = batches  # Files to process instead of scanning local_dir
+        self.deep_verify = deep_verify  # % of unchanged files to re-hash and check; None: only this run's
+        self.deep_cutoff: Optional[Tuple] = None   # deep_verify_key() of the last file due, set by run()
+        self.verify = verify            # False: nothing is checked against IA
+        self.check_limit = check_limit
+        self.controller = controller   # Shared by several pipelines in batch mode; else made by run()
+        self.limiter = limiter         # A batch job's own bandwidth cap; None: the process-wide one
+        self.progress = progress       # Shared by several pipelines in batch mode; else made by run()
+        self.own_progress = progress is None
+        self.pack_format = pack_format
+        self.pack_threshold = pack_threshold
+        self.pack_size = min(pack_size, PACK_MAX_SIZE)
+        self.pack_members: List[Tuple[str, LocalFile]] = []   # Archive being filled
+        self.pack_bytes = 0
+        self.quiet = quiet
+
+        self.queues = {
+            'hash': queue.Queue(maxsize=self.queue_size),
+            'upload': queue.Queue(maxsize=self.queue_size),
+            'verify': queue.Queue(maxsize=self.queue_size),
+        }
+        self.peak_depths = dict.fromkeys(self.queues, 0)
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(
+            ('scanned', 'scanned_bytes', 'unchanged', 'queued', 'uploaded', 'uploaded_bytes', 'failed',
+             'hashed', 'hashed_bytes', 'verified', 'deep_verified', 'packed', 'archives'), 0)
+        self.mismatched: List[str] = []
+        # (relative_path, size, md5, file_info to hash or None, deep) for files
+        # uploaded this run; the listing fetched at startup can't show them yet
+        self.fresh: List[Tuple] = []
+        self.fresh_limit = VERIFY_BATCH_SIZE   # Length of `fresh` that triggers _verify_confirmed()
+        self.errors: List[BaseException] = []
+        self.hash_threads: List[threading.Thread] = []
+
+    # ── Queue helpers ────────────────────────────────────────────────────────
+    def _count(self, key: str, n: int = 1):
+        with self.lock:
+            self.stats[key] += n
+
+    def _put(self, name: str, item) -> bool:
+        """Blocking put that gives up once the run is interrupted or has failed."""
+        while not quit_flag and not self.errors:
+            try:
+                self.queues[name].put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, name: str):
+        """Blocking get; returns _STAGE_DONE once the run is interrupted or has failed."""
+        while True:
+            try:
+                return self.queues[name].get(timeout=0.5)
+            except queue.Empty:
+                if quit_flag or self.errors:
+                    return _STAGE_DONE
+
+    def depths(self) -> str:
+        """Current queue depths, e.g. 'hash 0 | upload 412 | verify 3'."""
+        return ' | '.join(f"{name} {q.qsize()}" for name, q in self.queues.items())
+
+    def _stage(self, name: str, target) -> threading.Thread:
+        def run():
+            try:
+                target()
+            except KeyboardInterrupt:
+                pass
+            except Exception as e:
+                self.errors.append(e)
+                tqdm.write(f"❌ {name} stage failed: {e}")
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _monitor(self, stop: threading.Event):
+        while not stop.wait(0.5):
+            for name, q in self.queues.items():
+                self.peak_depths[name] = max(self.peak_depths[name], q.qsize())
+            if self.own_progress:
+                self.progress.status = f"scanned {self.stats['scanned']} | {self.depths()}"
+
+    # ── Stages ───────────────────────────────────────────────────────────────
+    @staticmethod
+    def _log_entry(relative_path: str, local_file: LocalFile, md5: Optional[str]) -> Dict[str, Any]:
+        return {
+            'relative_path': relative_path,
+            'size': local_file.size,
+            'uploaded': True,
+            'md5_hash': md5,
+            **{field: getattr(local_file, field) for field in STAT_FIELDS}
+        }
+
+    def _enqueue(self, file_info: Dict[str, Any]):
+        self._count('queued')
+        self.progress.add(1, file_info['size'])
+        self._put('upload', file_info)
+
+    def _queue_upload(self, relative_path: str, local_file: LocalFile, reason: str,
+                      expected_md5: Optional[str] = None, hashed: bool = False):
+        entry_size = None
+        if self.pack_format is not None and local_file.size < self.pack_threshold:
+            entry_size = PackArchive.entry_size(self.pack_format, relative_path, local_file)
+            if entry_size + PackArchive.trailer_size(self.pack_format) > self.pack_size:
+                entry_size = None   # Too big for even an archive of its own: sent as is
+        packed = entry_size is not None
+        if self.content_md5 and not hashed and not packed and local_file.size < self.multipart_threshold:
+            # Content-MD5 must precede the body, so the hash stage goes first
+            self._put('hash', ('content', relative_path, local_file, reason))
+            return
+        if packed:
+            self._add_to_pack(relative_path, local_file, entry_size)
+            return
+        file_info = {
+            'relative_path': relative_path,
+            'path': Path(local_file.path),
+            'size': local_file.size,
+            'uploaded': False,
+            'reason': reason,
+            **{field: getattr(local_file, field) for field in STAT_FIELDS}
+        }
+        if expected_md5 and self.content_md5:
+            file_info['expected_md5'] = expected_md5
+        self._enqueue(file_info)
+
+    def _add_to_pack(self, relative_path: str, local_file: LocalFile, entry_size: int):
+        """Add a small file (adding `entry_size` bytes) to the open archive; the archive is queued once it is full."""
+        full = None
+        with self.lock:
+            if self.pack_members and (self.pack_bytes + entry_size > self.pack_size
+                                      or len(self.pack_members) >= PACK_MAX_MEMBERS):
+                full, self.pack_members = self.pack_members, []
+            if not self.pack_members:
+                self.pack_bytes = PackArchive.trailer_size(self.pack_format)
+            self.pack_members.append((relative_path, local_file))
+            self.pack_bytes += entry_size
+        if full:
+            self._queue_pack(full)
+
+    def _flush_pack(self):
+        with self.lock:
+            members, self.pack_members = self.pack_members, []
+        if members:
+            self._queue_pack(members)
+
+    def _queue_pack(self, members: List[Tuple[str, LocalFile]]):
+        archive = PackArchive(next_pack_name(self.pack_format), self.pack_format, members)
+        self._enqueue({
+            'relative_path': archive.name,
+            'path': None,
+            'size': archive.size,
+            'uploaded': False,
+            'reason': f"archive of {len(members)} small files",
+            'pack': archive,
+        })
+
+    def _unchanged(self, relative_path: str, local_file: LocalFile, log_entry: Dict[str, Any], refresh: bool):
+        md5 = log_entry.get('md5_hash')
+        if (self.deep_cutoff is not None
+                and deep_verify_key(relative_path, log_entry.get('deep_verified_at')) <= self.deep_cutoff):
+            # Re-read the file rather than trust the logged hash; the hash stage logs it
+            self._put('hash', ('deep', relative_path, local_file, None))
+            return
+        if refresh:
+            update_upload_log(self.identifier, [self._log_entry(relative_path, local_file, md5)])
+        self._count('unchanged')
+
+    def _plan(self, relative_path: str, local_file: LocalFile, log_entry: Optional[Dict[str, Any]]):
+        size = local_file.size
+        if not log_entry:
+            self._queue_upload(relative_path, local_file, "not yet uploaded")
+        elif not log_entry['uploaded']:
+            self._queue_upload(relative_path, local_file, "previous upload failed")
+        elif log_entry['size'] != size:
+            self._queue_upload(relative_path, local_file, f"size changed ({log_entry['size']} → {size})")
+        elif stat_unchanged(log_entry, local_file):
+            self._unchanged(relative_path, local_file, log_entry, refresh=False)
+        elif log_entry.get('mtime_ns') is None:
+            # No stat recorded yet (older log or fresh IA sync): trust the size
+            # match and remember the stat for the next run
+            self._unchanged(relative_path, local_file, log_entry, refresh=True)
+        else:
+            # Same size, but stat changed: compare content by MD5
+            self._put('hash', ('changed', relative_path, local_file, log_entry.get('md5_hash')))
+
+    def _scan_stage(self):
+        if self.batches is None:
+            snapshot = DirectorySnapshot(self.local_dir, full_rescan=self.full_rescan)
+            scanner = iter_local_files(self.local_dir, snapshot=snapshot)
+        else:
+            scanner = iter(self.batches)
+        try:
+            for batch in scanner:
+                if quit_flag or self.errors:
+                    break
+                with self.lock:
+                    self.stats['scanned'] += len(batch)
+                    self.stats['scanned_bytes'] += sum(local_file.size for _, local_file in batch)
+                entries = load_upload_log_entries(self.identifier, [p for p, _ in batch])
+                for relative_path, local_file in batch:
+                    self._plan(relative_path, local_file, entries.get(relative_path))
+        finally:
+            if hasattr(scanner, 'close'):
+                scanner.close()
+            for _ in self.hash_threads:
+                self._put('hash', _STAGE_DONE)
+            for thread in self.hash_threads:
+                thread.join()
+            self._flush_pack()
+            self._put('upload', _STAGE_DONE)
+
+    def _hash_stage(self):
+        while True:
+            job = self._get('hash')
+            if job is _STAGE_DONE:
+                return
+            purpose, relative_path, local_file, extra = job
+            try:
+                digest, nbytes = _md5_file(local_file.path)
+            except OSError as e:
+                tqdm.write(f"⚠️  Error calculating MD5 for {local_file.path}: {e}")
+                digest, nbytes = None, 0
+            with self.lock:
+                self.stats['hashed'] += 1
+                self.stats['hashed_bytes'] += nbytes
+
+            if purpose == 'content':
+                self._queue_upload(relative_path, local_file, extra, expected_md5=digest, hashed=True)
+            elif purpose == 'changed' and not (digest and extra and digest == extra):
+                # Without a logged MD5 there is nothing to compare with, so the file goes up again
+                reason = "content changed" if extra else "stat changed and no MD5 logged"
+                self._queue_upload(relative_path, local_file, reason, expected_md5=digest, hashed=True)
+            else:
+                if digest:
+                    update_upload_log(self.identifier, [self._log_entry(relative_path, local_file, digest)])
+                self._count('unchanged')
+                self._put('verify', (relative_path, local_file.size, digest, None, purpose == 'deep'))
+
+    def _on_uploaded(self, file_info: Dict[str, Any]):
+        """Called by the upload engine for every finished file."""
+        self._count('uploaded' if file_info['uploaded'] else 'failed')
+        if file_info['uploaded']:
+            self._count('uploaded_bytes', file_info['size'])
+        if file_info['uploaded'] and file_info.get('md5_hash') and self.verify:
+            self.listing.record_upload(file_info['relative_path'], file_info['size'], file_info['md5_hash'])
+        self._put('verify', (file_info['relative_path'], file_info['size'],
+                             file_info.get('md5_hash'), file_info, False))
+        if 'pack' in file_info and file_info['uploaded']:
+            # Members are logged and verified one by one, each with its own MD5
+            members = file_info['pack'].member_entries(file_info)
+            update_upload_log(self.identifier, members)
+            with self.lock:
+                self.stats['packed'] += len(members)
+                self.stats['archives'] += 1
+            for member in members:
+                if file_info.get('md5_hash') and self.verify:
+                    self.listing.record_upload(member['relative_path'], member['size'], member['md5_hash'])
+                self._put('verify', (member['relative_path'], member['size'], member['md5_hash'], member, False))
+
+    def _upload_source(self):
+        while True:
+            file_info = self._get('upload')
+            if file_info is _STAGE_DONE:
+                return
+            yield file_info
+
+    def _check(self, relative_path: str, size: int, md5: Optional[str], listing: Dict[str, Dict[str, Any]],
+               deep: bool = False):
+        ia_file = listing.get(relative_path)
+        if ia_file is None:
+            problem = "MISSING"
+        elif ia_file['size'] == size and ia_file['md5'] == md5:
+            self._count('verified')
+            if deep:
+                self._count('deep_verified')
+                record_deep_verified(self.identifier, [relative_path])
+            return
+        else:
+            problem = "MISMATCH"
+        tqdm.write(f"   ❌ {relative_path}: {problem}")
+        with self.lock:
+            self.mismatched.append(relative_path)
+
+    def _verify_stage(self):
+        listing = None
+        fetched = False
+        while True:
+            item = self._get('verify')
+            if item is _STAGE_DONE:
+                return
+            if not self.verify:
+                continue
+            relative_path, size, md5, file_info, deep = item
+            if file_info is None and not fetched:
+                # Fetched on first use, so runs with nothing to check stay offline
+                fetched = True
+                try:
+                    listing = self.listing.files()
+                except Exception as e:
+                    tqdm.write(f"⚠️  Could not fetch files from IA for verification: {e}")
+            if file_info is not None or listing is None:
+                needs_hash = (file_info is not None and file_info['uploaded'] and not md5
+                              and 'pack' not in file_info)
+                self.fresh.append((relative_path, size, md5, file_info if needs_hash else None, deep))
+                if len(self.fresh) >= self.fresh_limit:
+                    self._verify_confirmed()
+            else:
+                self._check(relative_path, size, md5, listing, deep)
+
+    def _verify_confirmed(self):
+        """
+        Check the fresh files IA confirmed by MD5 on upload against what it
+        confirmed, then drop them; the rest wait for _verify_fresh().
+        """
+        uploaded = self.listing.uploaded()
+        pending = []
+        confirmed = []
+        for entry in self.fresh:
+            relative_path, _, _, file_info, _ = entry
+            (confirmed if file_info is None and relative_path in uploaded else pending).append(entry)
+        for relative_path, size, md5, _, deep in confirmed:
+            self._check(relative_path, size, md5, uploaded, deep)
+        self.listing.forget_uploads(relative_path for relative_path, *_ in confirmed)
+        self.fresh = pending
+        self.fresh_limit = len(pending) + VERIFY_BATCH_SIZE
+
+    def _verify_fresh(self):
+        """
+        Check files uploaded this run. Those IA confirmed by MD5 on upload are
+        already merged into the listing; only files that were already on IA
+        make it check IA again.
+        """
+        if not self.fresh or quit_flag:
+            return
+        unconfirmed = any(file_info for _, _, _, file_info, _ in self.fresh)
+        uploaded = self.listing.uploaded()
+        print(f"\n🔍 Verifying {len(self.fresh)} uploaded files on IA...")
+        try:
+            if unconfirmed:
+                listing = self.listing.refresh()
+            elif all(relative_path in uploaded for relative_path, *_ in self.fresh):
+                listing = uploaded
+            else:
+                listing = self.listing.files()
+        except Exception as e:
+            print(f"⚠️  Could not fetch files from IA: {e}")
+            return
+
+        # Files already on IA weren't sent, so they weren't hashed while streaming
+        to_hash = [(relative_path, file_info['path']) for relative_path, _, _, file_info, _ in self.fresh if file_info]
+        digests = hash_files(to_hash)
+        hashed_info = []
+        for relative_path, _, _, file_info, _ in self.fresh:
+            if file_info and digests.get(relative_path):
+                file_info['md5_hash'] = digests[relative_path]
+                hashed_info.append(file_info)
+        if hashed_info:
+            update_upload_log(self.identifier, hashed_info)
+
+        for relative_path, size, md5, file_info, deep in self.fresh:
+            if quit_flag:
+                break
+            self._check(relative_path, size, digests.get(relative_path, md5), listing, deep)
+        # A watched tree reuses the listing run after run
+        self.listing.forget_uploads(relative_path for relative_path, *_ in self.fresh)
+
+    # ── Run ──────────────────────────────────────────────────────────────────
+    def run(self) -> bool:
+        """Run all stages to completion; returns False if nothing was found or a stage failed."""
+        if not self.quiet:
+            print(f"\n🚀 Scanning, hashing, uploading and verifying concurrently "
+                  f"({self.concurrency} parallel, '{self.engine}' engine, queues of {self.queue_size})")
+        started = time.monotonic()
+        if self.own_progress:
+            self.progress = UploadProgress(leave=not self.quiet)
+        stop = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(stop,), name="pipeline-monitor", daemon=True)
+        monitor.start()
+        try:
+            if self.deep_verify is not None:
+                self.deep_cutoff = deep_verify_cutoff(self.identifier, self.deep_verify)
+            self.hash_threads = [self._stage('hash', self._hash_stage) for _ in range(self.hash_workers)]
+            threads = [self._stage('scan', self._scan_stage), self._stage('verify', self._verify_stage)]
+
+            if self.engine == 'ia':
+                # One keep-alive connection per upload worker
+                get_shared_session(self.concurrency + HTTP_POOL_EXTRA)
+            if self.controller is None:
+                access_key = get_s3_credentials()[0] if self.check_limit else None
+                self.controller = RateController(self.concurrency, self.s3_endpoint, self.identifier,
+                                                 access_key, check_limit=self.check_limit)
+            if self.engine == 'async':
+                AsyncUploadEngine(self.identifier, self.upload_metadata, endpoint=self.s3_endpoint,
+                                  concurrency=self.concurrency,
+                                  multipart_threshold=self.multipart_threshold,
+                                  controller=self.controller, limiter=self.limiter).upload(
+                    self._upload_source(), progress=self.progress, on_done=self._on_uploaded)
+            else:
+                item = self.listing.item()
+                run_upload_pool(self.identifier, item, self._upload_source(), self.upload_metadata,
+                                self.concurrency, multipart_threshold=self.multipart_threshold,
+                                s3_endpoint=self.s3_endpoint, progress=self.progress,
+                                on_done=self._on_uploaded, controller=self.controller,
+                                limiter=self.limiter)
+
+            # The upload queue closes only after scan and hash stages are done,
+            # so nothing else can reach the verify queue now
+            self._put('verify', _STAGE_DONE)
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except BaseException as e:
+            # Let the other stages bail out instead of blocking on their queues
+            self.errors.append(e)
+            raise
+        finally:
+            stop.set()
+            monitor.join()
+            if self.own_progress:
+                self.progress.close()
+            get_upload_log_store().flush()
+
+        if self.errors or quit_flag:
+            return False
+
+        self._verify_fresh()
+        self._print_summary(time.monotonic() - started)
+        return self.stats['scanned'] > 0
+
+    def outcome(self) -> str:
+        """
+        How the run went: 'ok', 'empty' (no files), 'failed' (uploads failed
+        and no file is on IA), 'partial' (some uploads failed), 'mismatch'
+        (verification found differences), 'error' or 'interrupted'.
+        """
+        stats = self.stats
+        if quit_flag:
+            return 'interrupted'
+        if self.errors:
+            return 'error'
+        if stats['failed']:
+            return 'partial' if stats['uploaded'] or stats['unchanged'] else 'failed'
+        if self.mismatched:
+            return 'mismatch'
+        return 'ok' if stats['scanned'] else 'empty'
+
+    def result(self) -> Dict[str, Any]:
+        """Outcome and counts of the run, as reported by batch mode and --output json."""
+        stats = self.stats
+        return {'status': self.outcome(), 'files': stats['scanned'], 'unchanged': stats['unchanged'],
+                'uploaded': stats['uploaded'], 'uploaded_bytes': stats['uploaded_bytes'],
+                'failed': stats['failed'], 'mismatched': len(self.mismatched),
+                'error': str(self.errors[0]) if self.errors else ''}
+
+    def _print_summary(self, elapsed: float):
+        stats = self.stats
+        if self.quiet:
+            return   # The caller reports (watch cycles, batch mode)
+        if not stats['scanned']:
+            print(f"❌ No files found in '{self.local_dir}'.")
+            return
+
+        print("\n" + "=" * 60)
+        print("📊 Upload Summary")
+        print("=" * 60)
+        print(f"   📁 Local files:     {stats['scanned']} ({format_size(stats['scanned_bytes'])})")
+        print(f"   ✅ Already on IA:   {stats['unchanged']}")
+        print(f"   📤 Uploaded:        {stats['uploaded']}")
+        if stats['failed']:
+            print(f"   ❌ Failed:          {stats['failed']}")
+        if stats['archives']:
+            print(f"   🗜️  Packed:          {stats['packed']} small files into {stats['archives']} archives")
+        if stats['hashed']:
+            print(f"   🔢 Hashed:          {stats['hashed']} files ({format_size(stats['hashed_bytes'])})")
+        if self.verify:
+            print(f"   🔍 Verified:        {stats['verified']}"
+                  + (f" ({stats['deep_verified']} deep)" if self.deep_verify is not None else ""))
+        print("   🚦 Peak queues:     " + ', '.join(
+            f"{name} {depth}/{self.queue_size}" for name, depth in self.peak_depths.items()))
+        if self.controller is not None and self.controller.throttled:
+            print(f"   🐌 Rate control:    {self.controller.summary()}")
+        requests_sent, connections = http_connection_stats()
+        if requests_sent:
+            reused = max(0, requests_sent - connections) / requests_sent
+            print(f"   🔌 Connections:     {requests_sent} requests over {connections} connections ({reused:.0%} reused)")
+        print(f"   ⏱️  Finished in {elapsed:.1f}s")
+        if not stats['queued']:
+            print("\n✅ All files are already uploaded!")
+
+        print("\n" + "=" * 60)
+        if not self.verify:
+            print("⏭️  Verification skipped (--no-verify)")
+        elif self.mismatched:
+            print(f"⚠️  Verification complete - {len(self.mismatched)} file(s) have issues:")
+            for f in self.mismatched[:10]:
+                print(f"   • {f}")
+            if len(self.mismatched) > 10:
+                print(f"   ... and {len(self.mismatched) - 10} more")
+        else:
+            print("✅ Verification complete - all files match!")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Main Upload Logic
+# ─────────────────────────────────────────────────────────────────────────────
+def prepare_upload_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert saved metadata to the fields sent with each upload."""
     upload_metadata = {}
     if metadata:
         # Convert metadata to IA format
@@ -980,165 +4618,754 @@ def process_upload(identifier: str, local_directory: str, force_upload: bool = F
             upload_metadata['language'] = metadata['language']
         if metadata.get('mediatype'):
             upload_metadata['mediatype'] = metadata['mediatype']
-    
-    if upload_metadata:
-        print(f"📝 Using metadata: {len(upload_metadata)} fields")
+    return upload_metadata
 
-    for index, file_info in enumerate(files_to_upload, start=1):
-        if quit_flag:
-            break
 
-        relative_path = file_info['relative_path']
-        filepath = file_info['path']
+def sync_from_ia(identifier: str, listing: IAListing, quiet: bool = False) -> bool:
+    """
+    Merge the item's IA file listing into the upload log; False if IA
+    couldn't be reached. `quiet` leaves reporting to the caller.
+    """
+    try:
+        ia_files = listing.files()
+        existing_files_info = []
+        for filename, info in ia_files.items():
+            if quit_flag:
+                break
+            existing_files_info.append({
+                'relative_path': filename,
+                'size': info['size'] or 0,
+                'uploaded': True,
+                'md5_hash': info.get('md5')
+            })
 
-        print(f"\n📤 [{index}/{len(files_to_upload)}] Uploading '{relative_path}'...")
+        if existing_files_info:
+            sync_upload_log(identifier, existing_files_info)
+        if not quiet:
+            if existing_files_info:
+                print(f"✅ Synced {len(existing_files_info)} files from IA")
+            else:
+                print("ℹ️  No files found on IA for this identifier (new upload)")
+        return True
+    except Exception as e:
+        if not quiet:
+            print(f"⚠️  Could not fetch files from IA: {e}")
+            print("   Continuing with local database only...")
+        return False
 
-        # Upload with retry logic
-        max_retries = 3
-        retry_delay = 5  # seconds between retries
-        upload_success = False
 
-        for attempt in range(1, max_retries + 1):
-            try:
-                # Add delay between uploads to respect rate limits
-                if index > 1:
-                    time.sleep(1)
-
-                wrapped_file = TqdmFileWithCounter(
-                    filepath,
-                    desc=f"Uploading {relative_path}",
-                    index=index,
-                    total_files=len(files_to_upload)
-                )
+def process_upload(identifier: str, local_directory: str, force_upload: bool = False, metadata: Optional[Dict[str, Any]] = None,
+                   concurrency: Optional[int] = None, engine: str = 'ia', s3_endpoint: str = IA_S3_ENDPOINT,
+                   multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD, content_md5: bool = False,
+                   queue_size: int = PIPELINE_QUEUE_SIZE, full_rescan: bool = False,
+                   listing: Optional[IAListing] = None, deep_verify: Optional[float] = None,
+                   check_limit: bool = False, pack_format: Optional[str] = None,
+                   pack_threshold: int = DEFAULT_PACK_THRESHOLD, pack_size: int = DEFAULT_PACK_SIZE,
+                   sync: Optional[bool] = None, verify: bool = True) -> Dict[str, Any]:
+    """
+    Main upload and verification process. Files uploaded or changed in this
+    run are verified (unless `verify` is False); `deep_verify` re-hashes
+    that percentage of the others. With `pack_format` ('zip' or 'tar'), small
+    files go up inside archives. `sync` says whether to merge the IA listing
+    into the upload log first; None asks. Returns the run's result
+    (see UploadPipeline.result()).
+    """
+    if concurrency is None:
+        concurrency = DEFAULT_ASYNC_CONCURRENCY if engine == 'async' else DEFAULT_UPLOAD_CONCURRENCY
 
-                r = item.upload(
-                    files={relative_path: wrapped_file},
-                    verbose=False,
-                    retries=5,
-                    checksum=False,
-                    metadata=upload_metadata
-                )
+    # Validate directory path
+    is_valid, error_msg, local_dir = validate_path(local_directory)
+    if not is_valid:
+        print(f"❌ {error_msg}")
+        return {'status': 'invalid', 'error': error_msg}
+    
+    # Additional readability check
+    if not os.access(local_dir, os.R_OK):
+        print(f"❌ Directory is not readable: {local_dir}")
+        return {'status': 'invalid', 'error': f"Directory is not readable: {local_dir}"}
 
-                if r and r[0] and r[0].status_code in [200, 201]:
-                    file_info['uploaded'] = True
-                    print(f"   ✅ Upload successful")
-                    upload_success = True
-                    break
-                elif r and r[0] and r[0].status_code == 403 and 'already exists' in r[0].text.lower():
-                    file_info['uploaded'] = True
-                    print(f"   ℹ️  File already exists on IA")
-                    upload_success = True
-                    break
-                else:
-                    status = r[0].status_code if r and r[0] else 'N/A'
-                    print(f"   ⚠️  Attempt {attempt}/{max_retries} failed (HTTP {status})")
-                    if attempt < max_retries:
-                        print(f"   ⏳ Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                    else:
-                        print(f"   ❌ Failed after {max_retries} attempts")
-                        file_info['uploaded'] = False
+    if quit_flag:
+        print("⚠️  Exiting due to user request.")
+        return {'status': 'interrupted'}
 
-            except KeyboardInterrupt:
-                print("\n⚠️  Upload interrupted by user.")
-                if 'wrapped_file' in locals():
-                    wrapped_file.close()
-                raise
-            except Exception as e:
-                error_msg = str(e)
-                if 'rate' in error_msg.lower() or 'overload' in error_msg.lower() or 'SlowDown' in error_msg.lower():
-                    print(f"   ⚠️  Rate limit hit - attempt {attempt}/{max_retries}")
-                    if attempt < max_retries:
-                        print(f"   ⏳ Waiting {retry_delay} seconds before retry...")
-                        time.sleep(retry_delay)
-                    else:
-                        print(f"   ❌ Skipping file after {max_retries} attempts")
-                        file_info['uploaded'] = False
-                else:
-                    print(f"   ❌ Error: {e}")
-                    if attempt < max_retries:
-                        print(f"   ⏳ Retrying in {retry_delay} seconds...")
-                        time.sleep(retry_delay)
-                    else:
-                        print(f"   ❌ Skipping file after {max_retries} attempts")
-                        file_info['uploaded'] = False
-            finally:
-                if 'wrapped_file' in locals():
-                    wrapped_file.close()
+    # Initialize database
+    create_upload_log_db()
 
-        # Update log after each file
-        update_upload_log(identifier, [file_info])
+    # Handle force upload - clear existing log for this identifier
+    if force_upload:
+        print("\n🔄 Force upload mode - clearing existing upload log...")
+        clear_upload_log(identifier)
+        clear_multipart_state(identifier)
+        print("✅ Upload log cleared. All files will be re-uploaded.")
+    
+    # Sync with IA to get accurate file list (default: Yes)
+    if listing is None:
+        listing = IAListing(identifier)   # Shared with verification
+    if not quit_flag:
+        sync_with_ia = sync
+        if sync_with_ia is None:
+            sync_with_ia = questionary.confirm(
+                "📡 Sync with Internet Archive to check existing files?",
+                default=True,  # Always default to Yes
+                qmark="🔄"
+            ).ask()
+
+        if sync_with_ia and not quit_flag:
+            sync_from_ia(identifier, listing)
+        else:
+            # User skipped sync
+            if not has_upload_log(identifier):
+                print("\n⚠️  No upload history found. Files will be compared by size only.")
+
+    # Prepare metadata for upload
+    upload_metadata = prepare_upload_metadata(metadata)
+    if upload_metadata:
+        print(f"📝 Using metadata: {len(upload_metadata)} fields")
+
+    pipeline = UploadPipeline(identifier, local_dir, upload_metadata, engine=engine,
+                              concurrency=concurrency, s3_endpoint=s3_endpoint,
+                              multipart_threshold=multipart_threshold, content_md5=content_md5,
+                              listing=listing, queue_size=queue_size, full_rescan=full_rescan,
+                              deep_verify=deep_verify, check_limit=check_limit,
+                              pack_format=pack_format, pack_threshold=pack_threshold, pack_size=pack_size,
+                              verify=verify)
+    pipeline.run()
 
     if quit_flag:
         print("\n⚠️  Exiting due to user request.")
-        return False
 
-    # Verification
-    print("\n🔍 Verifying files on IA...")
-    item = get_item(identifier)
-    ia_files = {}
-    for file in item.files:
-        if quit_flag:
-            break
-        name = file.get('name')
-        size = int(file.get('size', 0)) if file.get('size') else None
-        md5 = file.get('md5')
-        ia_files[name] = {'size': size, 'md5': md5}
+    return pipeline.result()
 
-    mismatched = []
-    total_files = len(local_files)
 
-    for index, (relative_path, file_info) in enumerate(local_files.items(), start=1):
-        if quit_flag:
-            break
+# ─────────────────────────────────────────────────────────────────────────────
+# Watch Mode
+# ─────────────────────────────────────────────────────────────────────────────
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_INOTIFY_EVENT = struct.Struct('iIII')   # wd, mask, cookie, len (+ name)
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify(7) watch of a directory tree, called through libc.
+    Raises OSError where inotify isn't available (not Linux, or out of watches).
+    """
+    def __init__(self, root: Path):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.root = str(root)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self.watches: Dict[int, Tuple[str, Tuple[int, int]]] = {}   # wd -> (prefix, (dev, inode))
+        self.watched = set()
+        self.overflowed = False
+
+    def add(self, dirpath: str, prefix: str) -> bool:
+        """Watch one directory; False if it is gone or already watched."""
+        try:
+            st = os.stat(dirpath)
+        except OSError:
+            return False
+        key = (st.st_dev, st.st_ino)
+        if key in self.watched:
+            return False
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), INOTIFY_WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (raise fs.inotify.max_user_watches)")
+            return False
+        self.watches[wd] = (prefix, key)
+        self.watched.add(key)
+        return True
 
-        filepath = file_info['path']
-        local_size = file_info['size']
-
-        print(f"🔍 [{index}/{total_files}] {relative_path}...", end=" ")
-
-        # Get or calculate local MD5
-        log_entry = upload_log.get(relative_path, {})
-        local_md5 = log_entry.get('md5_hash')
-
-        if not local_md5:
-            local_md5 = calc_md5(filepath)
-            if local_md5:
-                update_upload_log(identifier, [{
-                    'relative_path': relative_path,
-                    'size': local_size,
-                    'uploaded': log_entry.get('uploaded', False),
-                    'md5_hash': local_md5
-                }])
-
-        # Compare with IA
-        if relative_path in ia_files:
-            ia_size = ia_files[relative_path]['size']
-            ia_md5 = ia_files[relative_path]['md5']
-
-            if ia_size == local_size and local_md5 == ia_md5:
-                print("✅ OK")
-            else:
-                print("❌ MISMATCH")
-                mismatched.append(relative_path)
+    def watch_snapshot(self) -> int:
+        """Watch the root and every directory in its last scan snapshot."""
+        self.add(self.root, '')
+        for path, *_, mtime_ns, _, _ in sorted(load_scan_dirs(self.root)):
+            if path and mtime_ns is not None:
+                self.add(os.path.join(self.root, path), path)
+        return len(self.watches)
+
+    def add_tree(self, dirpath: str, prefix: str) -> List[str]:
+        """Watch a new directory and everything below it; returns the files already inside."""
+        files = []
+        stack = [(dirpath, prefix)]
+        while stack:
+            path, path_prefix = stack.pop()
+            # Watch before listing, so no file slips in between
+            if not self.add(path, path_prefix):
+                continue
+            listed, subdirs, _ = _scan_one_directory(path, path_prefix)
+            files.extend(relative_path for relative_path, _ in listed)
+            stack.extend((subdir, subdir_prefix) for subdir, subdir_prefix, _, _ in subdirs)
+        return files
+
+    def read_events(self, timeout: float) -> List[str]:
+        """Wait up to `timeout` seconds and return relative paths of files that changed."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 1024 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+            elif mask & IN_IGNORED:
+                # Directory deleted or unmounted
+                _, key = self.watches.pop(wd, (None, None))
+                self.watched.discard(key)
+            elif wd in self.watches and name:
+                prefix = self.watches[wd][0]
+                if not mask & IN_ISDIR:
+                    changed.append(prefix + name)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self.add_tree(os.path.join(self.root, prefix + name), prefix + name + '/'))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _settled_files(local_dir: Path, pending: Dict[str, float], settle: float) -> List[Tuple[str, LocalFile]]:
+    """
+    Take files out of `pending` (relative path -> time of last change) once
+    they have been quiet for `settle` seconds, with a fresh stat.
+    """
+    ready = []
+    now = time.monotonic()
+    settled_ns = time.time_ns() - int(settle * 10 ** 9)
+    for relative_path, changed_at in list(pending.items()):
+        if now - changed_at < settle:
+            continue
+        path = os.path.join(local_dir, relative_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            del pending[relative_path]   # Deleted or renamed away
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            del pending[relative_path]
+        elif st.st_mtime_ns > settled_ns:
+            pending[relative_path] = now   # Still being written
         else:
-            print("❌ MISSING")
-            mismatched.append(relative_path)
+            del pending[relative_path]
+            ready.append((relative_path, LocalFile.from_stat(path, st)))
+    return ready
+
+
+def _settled_scan(local_dir: Path, pending: Dict[str, float], settle: float):
+    """Incremental rescan that leaves recently modified files in `pending`."""
+    settled_ns = time.time_ns() - int(settle * 10 ** 9)
+    for batch in iter_local_files(local_dir, snapshot=DirectorySnapshot(local_dir)):
+        ready = []
+        for relative_path, local_file in batch:
+            if local_file.mtime_ns > settled_ns:
+                pending[relative_path] = time.monotonic()
+            else:
+                ready.append((relative_path, local_file))
+        if ready:
+            yield ready
+
+
+def watch_directory(identifier: str, local_directory: str, force_upload: bool = False,
+                    metadata: Optional[Dict[str, Any]] = None, concurrency: Optional[int] = None,
+                    engine: str = 'ia', s3_endpoint: str = IA_S3_ENDPOINT,
+                    multipart_threshold: int = DEFAULT_MULTIPART_THRESHOLD, content_md5: bool = False,
+                    queue_size: int = PIPELINE_QUEUE_SIZE, full_rescan: bool = False,
+                    deep_verify: Optional[float] = None, check_limit: bool = False,
+                    pack_format: Optional[str] = None, pack_threshold: int = DEFAULT_PACK_THRESHOLD,
+                    pack_size: int = DEFAULT_PACK_SIZE, sync: Optional[bool] = None, verify: bool = True,
+                    poll_interval: float = WATCH_POLL_INTERVAL,
+                    settle: float = WATCH_SETTLE_SECONDS) -> Dict[str, Any]:
+    """
+    Upload the directory once, then keep uploading new and changed files
+    until interrupted. Returns the result of the first upload.
+
+    Changes come from inotify on Linux, or from an incremental rescan every
+    `poll_interval` seconds elsewhere. A file is uploaded once it has not
+    changed for `settle` seconds, so files still being written are left alone.
+    Only changed files go through the upload pipeline, and each one is
+    written to the upload log as soon as it is done.
+    """
+    listing = IAListing(identifier)
+    result = process_upload(identifier, local_directory, force_upload=force_upload, metadata=metadata,
+                            concurrency=concurrency, engine=engine, s3_endpoint=s3_endpoint,
+                            multipart_threshold=multipart_threshold, content_md5=content_md5,
+                            queue_size=queue_size, full_rescan=full_rescan, listing=listing,
+                            deep_verify=deep_verify, check_limit=check_limit, pack_format=pack_format,
+                            pack_threshold=pack_threshold, pack_size=pack_size, sync=sync, verify=verify)
+    if quit_flag or result['status'] == 'invalid':
+        return result
+
+    if concurrency is None:
+        concurrency = DEFAULT_ASYNC_CONCURRENCY if engine == 'async' else DEFAULT_UPLOAD_CONCURRENCY
+    local_dir = validate_path(local_directory)[2]
+    upload_metadata = prepare_upload_metadata(metadata)
+
+    def run_cycle(batches):
+        started = time.monotonic()
+        pipeline = UploadPipeline(identifier, local_dir, upload_metadata, engine=engine, concurrency=concurrency,
+                                  s3_endpoint=s3_endpoint, multipart_threshold=multipart_threshold,
+                                  content_md5=content_md5, listing=listing, queue_size=queue_size,
+                                  batches=batches, check_limit=check_limit, pack_format=pack_format,
+                                  pack_threshold=pack_threshold, pack_size=pack_size, verify=verify,
+                                  quiet=True)
+        pipeline.run()
+        stats = pipeline.stats
+        # One line, and only when something was uploaded or is wrong
+        if (stats['queued'] or pipeline.mismatched) and not quit_flag:
+            print(f"   📤 {stats['uploaded']} uploaded, {stats['failed']} failed, "
+                  f"{len(pipeline.mismatched)} with issues ({time.monotonic() - started:.1f}s)")
 
-    # Summary
-    print("\n" + "=" * 60)
-    if mismatched:
-        print(f"⚠️  Verification complete - {len(mismatched)} file(s) have issues:")
-        for f in mismatched[:10]:
-            print(f"   • {f}")
-        if len(mismatched) > 10:
-            print(f"   ... and {len(mismatched) - 10} more")
+    try:
+        watcher = InotifyWatcher(local_dir)
+        print(f"\n👀 Watching {watcher.watch_snapshot()} directories in '{local_dir}' - Ctrl+C to stop")
+    except OSError as e:
+        watcher = None
+        print(f"\n👀 Polling '{local_dir}' every {poll_interval:.0f}s ({e}) - Ctrl+C to stop")
+
+    pending: Dict[str, float] = {}   # relative path -> monotonic time of its last change
+    next_poll = time.monotonic() + poll_interval
+    try:
+        while not quit_flag:
+            rescan = False
+            if watcher is not None:
+                for relative_path in watcher.read_events(timeout=1.0):
+                    pending[relative_path] = time.monotonic()
+                if watcher.overflowed:
+                    # Events were dropped; find the changes by rescanning
+                    watcher.overflowed = False
+                    rescan = True
+            else:
+                time.sleep(1.0)
+                if time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + poll_interval
+                    rescan = True
+
+            if rescan:
+                run_cycle(_settled_scan(local_dir, pending, settle))
+            ready = _settled_files(local_dir, pending, settle)
+            if ready:
+                tqdm.write(f"🆕 {len(ready)} new or changed file(s)")
+                run_cycle([ready])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+    print("\n👀 Stopped watching.")
+    return result
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch Mode
+# ─────────────────────────────────────────────────────────────────────────────
+BATCH_REPORT_FIELDS = ('identifier', 'directory', 'status', 'files', 'unchanged', 'uploaded',
+                       'uploaded_bytes', 'failed', 'mismatched', 'seconds', 'error')
+BATCH_STATUS_ICONS = {'ok': '✅', 'empty': 'ℹ️ ', 'mismatch': '⚠️ ', 'partial': '⚠️ ', 'failed': '❌',
+                      'error': '❌', 'invalid': '🚫', 'interrupted': '⚠️ ', 'skipped': '⏭️ '}
+
+
+def load_manifest(path: Path) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    (identifier, directory, max_bandwidth) entries from a batch manifest:
+    CSV rows (with an optional identifier,directory,max_bandwidth header),
+    JSON Lines objects with "identifier", "directory" and optionally
+    "max_bandwidth", or JSON - a list of such objects or an identifiers.json
+    mapping. max_bandwidth is the entry's own cap as text, or None.
+    """
+    text = path.read_text(encoding='utf-8')
+    suffix = path.suffix.lower()
+    if suffix == '.jsonl':
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    elif suffix == '.json':
+        entries = json.loads(text)
+        if isinstance(entries, dict):
+            return [(str(identifier), str(directory), None) for identifier, directory in entries.items()]
     else:
-        print("✅ Verification complete - all files match!")
+        rows = [row for row in csv.reader(io.StringIO(text)) if row and not row[0].lstrip().startswith('#')]
+        if rows and rows[0][0].strip().lower() == 'identifier':
+            rows = rows[1:]
+        if any(len(row) < 2 for row in rows):
+            raise ValueError("every CSV row needs an identifier and a directory")
+        return [(row[0].strip(), row[1].strip(), row[2].strip() if len(row) > 2 and row[2].strip() else None)
+                for row in rows]
+    try:
+        return [(str(entry['identifier']), str(entry['directory']),
+                 str(entry['max_bandwidth']) if entry.get('max_bandwidth') else None) for entry in entries]
+    except (KeyError, TypeError, AttributeError):
+        raise ValueError('every entry needs an "identifier" and a "directory"')
+
+
+def write_batch_report(results: List[Dict[str, Any]], path: Path):
+    """Write one CSV row per identifier of a batch."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=BATCH_REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def batch_status(results: List[Dict[str, Any]]) -> str:
+    """
+    Overall status of a batch: 'ok' if every identifier is, 'failed' if none
+    got anything uploaded, else 'partial' or, if only verification found
+    issues, 'mismatch'.
+    """
+    statuses = {row['status'] for row in results}
+    if 'interrupted' in statuses:
+        return 'interrupted'
+    if statuses <= {'ok', 'empty'}:
+        return 'ok'
+    if not statuses & {'ok', 'partial', 'mismatch'}:
+        return 'failed'
+    if statuses & {'failed', 'error', 'invalid', 'partial', 'skipped'}:
+        return 'partial'
+    return 'mismatch'
+
+
+def run_batch(manifest: Path, jobs: int = DEFAULT_BATCH_JOBS, concurrency: Optional[int] = None,
+              engine: str = 'ia', s3_endpoint: str = IA_S3_ENDPOINT, check_limit: bool = False,
+              report_path: Optional[Path] = None, job_bandwidth: Optional[int] = None,
+              force_upload: bool = False, sync: bool = True, **pipeline_options) -> Dict[str, Any]:
+    """
+    Upload every identifier of a manifest, `jobs` of them at a time.
+
+    All identifiers share the upload log connection, the HTTP session and
+    one rate controller, so `concurrency` (like the bandwidth cap) is a
+    budget for the whole batch, not per item: the upload threads and hash
+    workers are split between the identifiers running at once. Progress
+    is shown for the batch as a whole too. Each identifier can also be held to its own cap: the manifest's max_bandwidth, else `job_bandwidth`.
+    `force_upload` and `sync` apply to every identifier as in
+    process_upload(). Each item's saved metadata is used and nothing is
+    asked. A line is printed as each identifier finishes
+    and a CSV report with one row per identifier is written at the end.
+    Returns the overall status (see batch_status()), the report path and
+    the per-identifier rows.
+    """
+    try:
+        entries = load_manifest(manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not read manifest '{manifest}': {e}")
+        return {'status': 'invalid', 'error': f"Could not read manifest '{manifest}': {e}"}
+
+    if concurrency is None:
+        concurrency = DEFAULT_ASYNC_CONCURRENCY if engine == 'async' else DEFAULT_UPLOAD_CONCURRENCY
+    if report_path is None:
+        report_path = BATCH_REPORT_DIR / f"batch-{time.strftime('%Y%m%d-%H%M%S')}.csv"
+    create_upload_log_db()
 
+    results: List[Dict[str, Any]] = []
+    runnable: List[Tuple[Dict[str, Any], Path, Optional[BandwidthLimiter]]] = []
+    seen = set()
+    for identifier, directory, max_bandwidth in entries:
+        row = dict.fromkeys(BATCH_REPORT_FIELDS, '')
+        row.update(identifier=identifier, directory=directory)
+        results.append(row)
+        valid, error, _ = validate_identifier(identifier)
+        local_dir = None
+        if valid:
+            valid, error, local_dir = validate_path(directory)
+        if valid and identifier in seen:
+            valid, error = False, "listed more than once"
+        seen.add(identifier)
+        rate = job_bandwidth
+        if valid and max_bandwidth is not None:
+            try:
+                rate = parse_bandwidth(max_bandwidth, bandwidth_limiter.base_rate)
+            except ValueError as e:
+                valid, error = False, f"max_bandwidth: {e}"
+        if valid:
+            limiter = BandwidthLimiter(rate, parent=bandwidth_limiter) if rate else None
+            runnable.append((row, local_dir, limiter))
+        else:
+            row.update(status='invalid', error=error)
+            print(f"   {BATCH_STATUS_ICONS['invalid']} {identifier}: {error}")
+
+    running = max(1, min(jobs, len(runnable)))
+    job_concurrency = -(-concurrency // running)
+    job_hash_workers = -(-DEFAULT_HASH_WORKERS // running)
+    if engine == 'ia':
+        get_shared_session(concurrency + HTTP_POOL_EXTRA)
+    access_key = get_s3_credentials()[0] if check_limit else None
+    controller = RateController(concurrency, s3_endpoint, access_key=access_key, check_limit=check_limit)
+    print(f"\n📚 Batch of {len(runnable)} identifiers from '{manifest}': {jobs} at a time, "
+          f"{concurrency} uploads in flight in total, {job_concurrency} per identifier ('{engine}' engine)")
+    started = time.monotonic()
+    finished = 0
+    finished_lock = threading.Lock()
+    progress = UploadProgress(desc="📚 Batch")
+    progress.status = f"0/{len(runnable)} identifiers"
+
+    def job(row: Dict[str, Any], local_dir: Path, limiter: Optional[BandwidthLimiter]):
+        nonlocal finished
+        if quit_flag:
+            return
+        identifier = row['identifier']
+        job_started = time.monotonic()
+        try:
+            if force_upload:
+                clear_upload_log(identifier)
+                clear_multipart_state(identifier)
+            listing = IAListing(identifier)
+            if sync:
+                sync_from_ia(identifier, listing, quiet=True)
+            pipeline = UploadPipeline(identifier, local_dir, prepare_upload_metadata(load_metadata(identifier)),
+                                      engine=engine, concurrency=job_concurrency,
+                                      hash_workers=job_hash_workers, s3_endpoint=s3_endpoint,
+                                      listing=listing, check_limit=check_limit, controller=controller,
+                                      limiter=limiter, progress=progress, quiet=True, **pipeline_options)
+            pipeline.run()
+            row.update(pipeline.result())
+        except Exception as e:
+            row.update(status='error', error=str(e) or type(e).__name__)
+        row['seconds'] = round(time.monotonic() - job_started, 1)
+        with finished_lock:
+            finished += 1
+            count = f"[{finished}/{len(runnable)}]"
+            progress.status = f"{finished}/{len(runnable)} identifiers"
+        tqdm.write(f"{BATCH_STATUS_ICONS[row['status']]} {count} {identifier}: {row['status']} - "
+                   f"{row['uploaded'] or 0} uploaded, {row['failed'] or 0} failed, "
+                   f"{row['mismatched'] or 0} with issues ({row['seconds']}s)"
+                   + (f" - {row['error']}" if row['error'] else ""))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="batch")
+    pending = {executor.submit(job, *entry) for entry in runnable}
+    try:
+        while pending:
+            # Short timeout keeps the main thread responsive to Ctrl+C
+            _, pending = wait(pending, timeout=0.5)
+    except KeyboardInterrupt:
+        tqdm.write("\n⚠️  Batch interrupted by user.")
+        for future in pending:
+            future.cancel()
+    finally:
+        executor.shutdown(wait=True)
+        progress.close()
+    for row in results:
+        if not row['status']:
+            row['status'] = 'skipped'
+
+    write_batch_report(results, report_path)
+    counts: Dict[str, int] = {}
+    for row in results:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    print("\n" + "=" * 60)
+    print("📚 Batch Summary")
+    print("=" * 60)
+    for status, count in counts.items():
+        print(f"   {BATCH_STATUS_ICONS[status]} {status + ':':<14} {count}")
+    uploaded_bytes = sum(row['uploaded_bytes'] or 0 for row in results)
+    print(f"   📤 Uploaded:      {sum(row['uploaded'] or 0 for row in results)} files "
+          f"({format_size(uploaded_bytes)})")
+    if controller.throttled:
+        print(f"   🐌 Rate control:  {controller.summary()}")
+    print(f"   ⏱️  Finished in {time.monotonic() - started:.1f}s")
+    print(f"   📄 Report: {report_path}")
+    return {'status': batch_status(results), 'report': str(report_path), 'identifiers': results}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Startup Benchmark
+# ─────────────────────────────────────────────────────────────────────────────
+# Run in a fresh interpreter: import this script as a module, then the
+# dependencies named on the command line, and print both durations
+_STARTUP_PROBE = '''
+import importlib, importlib.util, sys, time
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location('bulk_upload', sys.argv[1])
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+loaded = time.perf_counter()
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+print(loaded - started, time.perf_counter() - loaded)
+'''
+
+
+def benchmark_startup(runs: int = DEFAULT_BENCHMARK_RUNS, log_path: Path = STARTUP_BENCHMARK_LOG) -> bool:
+    """
+    Time a cold start of every entry point in STARTUP_ENTRY_POINTS: the
+    whole process, importing the script, and importing the dependencies
+    it loads on demand. Medians of `runs` fresh interpreters are printed
+    and appended to `log_path`, so regressions show up over time.
+    """
+    import statistics
+    import subprocess
+
+    script = str(Path(__file__).resolve())
+    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    print(f"\n⏱️  Startup time, median of {runs} runs (Python {sys.version.split()[0]})")
+    print("=" * 60)
+    for entry_point, modules in STARTUP_ENTRY_POINTS.items():
+        totals, scripts, deps = [], [], []
+        for _ in range(runs):
+            started = time.perf_counter()
+            proc = subprocess.run([sys.executable, '-c', _STARTUP_PROBE, script, *modules],
+                                  capture_output=True, text=True)
+            totals.append(time.perf_counter() - started)
+            if proc.returncode != 0:
+                print(f"   ❌ {entry_point}: {proc.stderr.strip().splitlines()[-1]}")
+                return False
+            script_time, deps_time = (float(x) for x in proc.stdout.split())
+            scripts.append(script_time)
+            deps.append(deps_time)
+        row = {'timestamp': timestamp, 'python': sys.version.split()[0], 'entry_point': entry_point,
+               'total_ms': round(statistics.median(totals) * 1000, 1),
+               'script_ms': round(statistics.median(scripts) * 1000, 1),
+               'dependencies_ms': round(statistics.median(deps) * 1000, 1),
+               'dependencies': ' '.join(modules)}
+        rows.append(row)
+        print(f"   {entry_point:<13} {row['total_ms']:>7.1f} ms total   {row['script_ms']:>6.1f} ms script"
+              f"   {row['dependencies_ms']:>6.1f} ms {row['dependencies'] or '(no dependencies)'}")
+
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    new_log = not log_path.exists()
+    with open(log_path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        if new_log:
+            writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n   📄 Appended to {log_path}")
+    return True
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload Body Benchmark
+# ─────────────────────────────────────────────────────────────────────────────
+def benchmark_upload_body(size: int = DEFAULT_BODY_BENCHMARK_SIZE) -> bool:
+    """
+    Send a scratch file of `size` bytes over loopback TCP each way an upload
+    body can go out: the old wrapper's fresh bytes per 16 KiB read, the
+    ProgressFile's reused upload_block_size buffer (both hash and count
+    every byte), and sendfile(). Prints throughput and the sender's CPU time.
+    """
+    import socket
+    import tempfile
+
+    def receive(conn):
+        buffer = bytearray(1024 * 1024)
+        with conn:
+            while conn.recv_into(buffer):
+                pass
+
+    def legacy(sock, f):
+        md5 = hashlib.md5()
+        transfer = UploadProgress(mode='off').transfer('benchmark', size)
+        while True:
+            data = f.read(LEGACY_BODY_READ_SIZE)
+            if not data:
+                break
+            bandwidth_limiter.throttle(len(data))
+            md5.update(data)
+            transfer.update(len(data))
+            sock.sendall(data)
+
+    def blocks(sock, f):
+        body = ProgressFile(f, UploadProgress(mode='off').transfer('benchmark', size))
+        while True:
+            data = body.read(upload_block_size)
+            if not data:
+                break
+            sock.sendall(data)
+
+    def sendfile(sock, f):
+        offset = 0
+        while offset < size:
+            offset += os.sendfile(sock.fileno(), f.fileno(), offset, min(upload_block_size, size - offset))
+
+    methods = [(f"read() {format_size(LEGACY_BODY_READ_SIZE)}, new bytes (old)", legacy),
+               (f"readinto() {format_size(upload_block_size)}, reused buffer", blocks)]
+    if hasattr(os, 'sendfile'):
+        methods.append(("sendfile(), plain HTTP only, no MD5", sendfile))
+
+    print(f"\n⏱️  Upload body throughput, {format_size(size)} over loopback TCP")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "body.bin"
+        block = os.urandom(1024 * 1024)
+        with open(path, 'wb') as f:
+            for offset in range(0, size, len(block)):
+                f.write(block[:size - offset])
+        with open(path, 'rb') as f:
+            # Warm the page cache so every method reads from memory
+            while f.read(len(block)):
+                pass
+
+        baseline = None
+        for name, send in methods:
+            with socket.create_server(('127.0.0.1', 0)) as server, \
+                    socket.create_connection(server.getsockname()) as sock:
+                receiver = threading.Thread(target=receive, args=(server.accept()[0],), daemon=True)
+                receiver.start()
+                with open(path, 'rb') as f:
+                    started, cpu_started = time.perf_counter(), time.thread_time()
+                    send(sock, f)
+                    elapsed, cpu = time.perf_counter() - started, time.thread_time() - cpu_started
+                sock.shutdown(socket.SHUT_WR)
+                receiver.join()
+            rate = size / max(elapsed, 1e-9)
+            baseline = baseline or rate
+            print(f"   {name:<40} {format_size(rate) + '/s':>12}   {cpu * 1000:>6.0f} ms CPU   "
+                  f"x{rate / baseline:.2f}")
     return True
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload Log Reports
+# ─────────────────────────────────────────────────────────────────────────────
+UPLOAD_REPORTS = ('failed', 'slow', 'duplicates')
+
+
+def show_upload_report(identifier: str, report: str):
+    """Print a report from the upload log without scanning or contacting IA."""
+    create_upload_log_db()
+    print(f"\n📋 {report.capitalize()} report for '{identifier}'")
+    print("=" * 60)
+
+    if report == 'failed':
+        rows = query_failed_uploads(identifier)
+        for filename, attempts, last_error in rows:
+            print(f"   ❌ {filename} ({attempts or 0} attempts): {last_error or 'unknown error'}")
+        print(f"\n   {len(rows)} file(s) failed")
+    elif report == 'slow':
+        rows = query_slow_uploads(identifier)
+        for filename, size, bytes_per_sec, duration in rows:
+            print(f"   🐢 {filename}: {format_size(size)} in {duration:.1f}s ({format_size(bytes_per_sec)}/s)")
+        if not rows:
+            print("   No timed uploads recorded yet")
+    elif report == 'duplicates':
+        rows = query_duplicate_uploads(identifier)
+        for md5_hash, copies in rows:
+            print(f"   🔁 {md5_hash}")
+            for copy_identifier, filename in copies:
+                print(f"      • {copy_identifier}/{filename}")
+        print(f"\n   {len(rows)} duplicated file(s)")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Script Generator
 # ─────────────────────────────────────────────────────────────────────────────
@@ -1180,19 +5407,287 @@ def create_configured_script(identifier: str, local_directory: str):
 # ─────────────────────────────────────────────────────────────────────────────
 # Main Entry Point
 # ─────────────────────────────────────────────────────────────────────────────
-def main():
-    """Main entry point."""
-    global quit_flag
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments. Without identifier/directory the interactive menu is shown."""
+    parser = argparse.ArgumentParser(
+        description="Bulk upload a directory to an Internet Archive item."
+    )
+    parser.add_argument('identifier', nargs='?', help="Internet Archive identifier")
+    parser.add_argument('directory', nargs='?', help="Local directory to upload")
+    sync = parser.add_mutually_exclusive_group()
+    sync.add_argument(
+        '--sync', dest='sync', action='store_true', default=None,
+        help="Merge the item's file list on IA into the upload log before uploading "
+             "(asked in a terminal, done by default otherwise)"
+    )
+    sync.add_argument(
+        '--no-sync', dest='sync', action='store_false',
+        help="Skip the IA sync and compare against the upload log only"
+    )
+    parser.add_argument(
+        '--force', action='store_true',
+        help="Clear the upload log and re-upload every file"
+    )
+    parser.add_argument(
+        '--metadata', metavar='FILE',
+        help="Item metadata as a JSON object with title, description, creator, date, subject, "
+             "language and mediatype (default: the metadata saved for IDENTIFIER)"
+    )
+    parser.add_argument(
+        '-j', '--concurrency', type=int, default=None,
+        help=(f"Number of files uploaded in parallel (default: {DEFAULT_UPLOAD_CONCURRENCY}, "
+              f"or {DEFAULT_ASYNC_CONCURRENCY} with --engine async)")
+    )
+    parser.add_argument(
+        '--engine', choices=UPLOAD_ENGINES, default='ia',
+        help="Upload backend: 'ia' (internetarchive library) or 'async' (asyncio IA-S3 client)"
+    )
+    parser.add_argument(
+        '--s3-endpoint', default=IA_S3_ENDPOINT,
+        help=f"IA-S3 endpoint for the async engine and multipart uploads (default: {IA_S3_ENDPOINT})"
+    )
+    parser.add_argument(
+        '--multipart-threshold', type=parse_size, default=DEFAULT_MULTIPART_THRESHOLD, metavar='SIZE',
+        help="Upload files of at least SIZE (e.g. 512M, 2G) as resumable multipart parts (default: 1G)"
+    )
+    parser.add_argument(
+        '--block-size', type=parse_size, default=DEFAULT_UPLOAD_BLOCK_SIZE, metavar='SIZE',
+        help="Read and send upload bodies SIZE bytes at a time (default: 1M)"
+    )
+    parser.add_argument(
+        '--no-sendfile', dest='sendfile', action='store_false',
+        help="Don't send files with sendfile() when the async engine talks plain HTTP "
+             "(bodies are then hashed as they go out)"
+    )
+    parser.add_argument(
+        '--page-cache', choices=PAGE_CACHE_MODES, default='keep',
+        help="How reads for hashing and uploading use the page cache: 'drop' evicts what was read "
+             "(posix_fadvise), 'direct' bypasses it with O_DIRECT; both spare the data other "
+             "services keep cached (default: keep)"
+    )
+    parser.add_argument(
+        '--max-bandwidth', type=parse_size, default=None, metavar='RATE',
+        help="Cap the upload rate of all uploads together at RATE bytes per second (e.g. 5M)"
+    )
+    parser.add_argument(
+        '--bandwidth-schedule', type=parse_bandwidth_window, action='append', default=[],
+        metavar='WINDOW',
+        help="Use another cap during a time window, e.g. 'mon-fri 09:00-18:00=20%%' "
+             "(RATE as in --max-bandwidth, a percentage of it, or 'off'); may be repeated"
+    )
+    parser.add_argument(
+        '--bandwidth-control', default=str(BANDWIDTH_CONTROL_FILE), metavar='FILE',
+        help=f"While FILE exists, its rate overrides the cap and schedule; it is re-read every "
+             f"{BANDWIDTH_CHECK_INTERVAL:.0f}s or on SIGUSR1 (default: {BANDWIDTH_CONTROL_FILE})"
+    )
+    parser.add_argument(
+        '--content-md5', action='store_true',
+        help="Send a Content-MD5 header so IA rejects corrupted bodies (hashes each file before upload)"
+    )
+    parser.add_argument(
+        '--check-limit', action='store_true',
+        help="Ask IA-S3 whether your account is over its rate limit before starting uploads"
+    )
+    parser.add_argument(
+        '--pack', choices=PACK_FORMATS, metavar='FORMAT',
+        help="Upload small files inside uncompressed 'zip' or 'tar' archives instead of one by one"
+    )
+    parser.add_argument(
+        '--pack-threshold', type=parse_size, default=DEFAULT_PACK_THRESHOLD, metavar='SIZE',
+        help="With --pack, pack files smaller than SIZE (default: 100K)"
+    )
+    parser.add_argument(
+        '--pack-size', type=parse_size, default=DEFAULT_PACK_SIZE, metavar='SIZE',
+        help="With --pack, close each archive once it reaches SIZE (default: 64M, at most 4G)"
+    )
+    parser.add_argument(
+        '--queue-size', type=int, default=PIPELINE_QUEUE_SIZE, metavar='N',
+        help=f"Files buffered between scan, hash, upload and verify stages (default: {PIPELINE_QUEUE_SIZE})"
+    )
+    parser.add_argument(
+        '--full-rescan', action='store_true',
+        help="List every directory instead of reusing unchanged ones from the last scan"
+    )
+    parser.add_argument(
+        '--deep-verify', type=float, nargs='?', const=100.0, default=None, metavar='PERCENT',
+        help="Also re-hash and check files that didn't change: all of them, or the PERCENT checked "
+             "longest ago (by default only files uploaded or changed in this run are verified)"
+    )
+    parser.add_argument(
+        '--no-verify', dest='verify', action='store_false',
+        help="Don't check files against IA after uploading"
+    )
+    parser.add_argument(
+        '--output', choices=OUTPUT_FORMATS, default='text',
+        help="'json' prints one result object on stdout, with all progress and messages on stderr"
+    )
+    parser.add_argument(
+        '--progress', choices=PROGRESS_MODES, default='auto',
+        help="'bar' shows one progress bar with the largest active transfers, 'lines' writes a "
+             f"status line every {PROGRESS_LOG_INTERVAL:.0f}s for logs (default 'auto': a bar on a terminal)"
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help="After uploading, keep running and upload new or changed files as they appear"
+    )
+    parser.add_argument(
+        '--settle', type=float, default=WATCH_SETTLE_SECONDS, metavar='SECONDS',
+        help=f"With --watch, upload a file once it has not changed for SECONDS (default: {WATCH_SETTLE_SECONDS})"
+    )
+    parser.add_argument(
+        '--poll-interval', type=float, default=WATCH_POLL_INTERVAL, metavar='SECONDS',
+        help=f"With --watch where inotify is unavailable, rescan every SECONDS (default: {WATCH_POLL_INTERVAL})"
+    )
+    parser.add_argument(
+        '--batch', nargs='?', const=str(IDENTIFIERS_FILE), metavar='MANIFEST',
+        help="Upload every identifier in MANIFEST (CSV or JSON Lines of identifier,directory), "
+             "or in identifiers.json if no file is given"
+    )
+    parser.add_argument(
+        '--batch-jobs', type=int, default=DEFAULT_BATCH_JOBS, metavar='N',
+        help=f"With --batch, upload N identifiers at once; --concurrency is shared by all "
+             f"(default: {DEFAULT_BATCH_JOBS})"
+    )
+    parser.add_argument(
+        '--batch-report', metavar='FILE',
+        help=f"With --batch, write the per-identifier CSV report to FILE (default: in {BATCH_REPORT_DIR})"
+    )
+    parser.add_argument(
+        '--job-bandwidth', metavar='RATE',
+        help="With --batch, also cap each identifier at RATE (or a percentage of --max-bandwidth); "
+             "a max_bandwidth column in the manifest overrides it"
+    )
+    parser.add_argument(
+        '--benchmark-startup', type=int, nargs='?', const=DEFAULT_BENCHMARK_RUNS, metavar='RUNS',
+        help=f"Time a cold start of each entry point over RUNS fresh interpreters "
+             f"(default: {DEFAULT_BENCHMARK_RUNS}), log it to {STARTUP_BENCHMARK_LOG} and exit"
+    )
+    parser.add_argument(
+        '--benchmark-body', type=parse_size, nargs='?', const=DEFAULT_BODY_BENCHMARK_SIZE, metavar='SIZE',
+        help="Compare ways of sending upload bodies (old 16K reads, --block-size blocks, sendfile) "
+             "with a SIZE scratch file over loopback (default: 256M) and exit"
+    )
+    parser.add_argument(
+        '--report', choices=UPLOAD_REPORTS,
+        help="Show failed, slow or duplicated files of IDENTIFIER from the upload log and exit"
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    if args.deep_verify is not None and not 0 < args.deep_verify <= 100:
+        parser.error("--deep-verify must be between 0 and 100")
+    if not 0 < args.pack_size <= PACK_MAX_SIZE:
+        parser.error("--pack-size must be between 1 byte and 4G")
+    if args.pack_threshold > args.pack_size:
+        parser.error("--pack-threshold can't be larger than --pack-size")
+    if args.settle < 0 or args.poll_interval <= 0:
+        parser.error("--settle must be at least 0 and --poll-interval positive")
+    if args.report and not args.identifier:
+        parser.error("--report requires an identifier")
+    if args.benchmark_startup is not None and args.benchmark_startup < 1:
+        parser.error("--benchmark-startup needs at least 1 run")
+    if args.benchmark_body is not None and args.benchmark_body < 1:
+        parser.error("--benchmark-body needs a size of at least 1 byte")
+    if not UPLOAD_BLOCK_SIZE_RANGE[0] <= args.block_size <= UPLOAD_BLOCK_SIZE_RANGE[1]:
+        parser.error("--block-size must be between 4K and 64M")
+    if args.identifier and not args.directory and not args.report:
+        parser.error("a directory is required after the identifier")
+    if args.deep_verify is not None and not args.verify:
+        parser.error("--deep-verify can't be combined with --no-verify")
+    if args.output == 'json' and args.watch:
+        parser.error("--output json needs a run that ends and can't be combined with --watch")
+    if args.metadata and args.batch:
+        parser.error("--metadata is for one identifier; --batch uses each item's saved metadata")
+    if args.batch and (args.identifier or args.watch):
+        parser.error("--batch takes its identifiers from the manifest and can't be combined with --watch")
+    if args.batch_jobs < 1:
+        parser.error("--batch-jobs must be at least 1")
+    if args.job_bandwidth and not args.batch:
+        parser.error("--job-bandwidth only applies to --batch; use --max-bandwidth instead")
+    try:
+        for window in args.bandwidth_schedule:
+            window['rate'] = parse_bandwidth(window['rate'], args.max_bandwidth)
+        if args.job_bandwidth:
+            args.job_bandwidth = parse_bandwidth(args.job_bandwidth, args.max_bandwidth)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def main() -> int:
+    """Main entry point; returns the process exit code (see STATUS_EXIT_CODES)."""
+    args = parse_args()
+    if args.output == 'json':
+        # Progress and messages go to stderr so stdout holds only the result
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_cli(args)
+        print(json.dumps(result, indent=2))
+    else:
+        result = run_cli(args)
+    return STATUS_EXIT_CODES.get(result['status'], EXIT_FAILED)
+
 
+def run_cli(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run what the arguments ask for and return its result: at least a
+    'status' (see UploadPipeline.outcome()). Without a terminal on stdin,
+    or with --output json, nothing is ever asked.
+    """
+    global progress_mode, upload_block_size, use_sendfile, page_cache_mode
+
+    progress_mode = args.progress
+    upload_block_size = args.block_size
+    use_sendfile = args.sendfile
+    page_cache_mode = args.page_cache
+    if page_cache_mode != 'keep' and not hasattr(os, 'posix_fadvise'):
+        print("⚠️  --page-cache needs posix_fadvise(), which this platform lacks; reading normally")
+        page_cache_mode = 'keep'
+    interactive = sys.stdin.isatty() and args.output == 'text'
+    if args.sync is None and not interactive:
+        args.sync = True
     try:
         print("\n" + "=" * 60)
         print("📦  Internet Archive Bulk Upload Script")
         print("=" * 60)
 
+        force_upload = args.force
+        metadata = {}
+
+        if args.report:
+            show_upload_report(args.identifier, args.report)
+            return {'status': 'ok'}
+        if args.benchmark_startup is not None:
+            return {'status': 'ok' if benchmark_startup(args.benchmark_startup) else 'error'}
+        if args.benchmark_body is not None:
+            return {'status': 'ok' if benchmark_upload_body(args.benchmark_body) else 'error'}
+
+        bandwidth_limiter.configure(args.max_bandwidth, args.bandwidth_schedule,
+                                    Path(args.bandwidth_control).expanduser())
+        if args.batch:
+            result = run_batch(Path(args.batch).expanduser(), jobs=args.batch_jobs,
+                               concurrency=args.concurrency, engine=args.engine,
+                               s3_endpoint=args.s3_endpoint, check_limit=args.check_limit,
+                               report_path=Path(args.batch_report) if args.batch_report else None,
+                               job_bandwidth=args.job_bandwidth, force_upload=force_upload,
+                               sync=args.sync is not False,
+                               multipart_threshold=args.multipart_threshold,
+                               content_md5=args.content_md5, queue_size=args.queue_size,
+                               full_rescan=args.full_rescan, deep_verify=args.deep_verify,
+                               pack_format=args.pack, pack_threshold=args.pack_threshold,
+                               pack_size=args.pack_size, verify=args.verify)
+            if result['status'] == 'ok':
+                print("\n🎉 Batch completed successfully!")
+            else:
+                print("\n⚠️  Batch completed with issues.")
+            print("\n👋 Goodbye!\n")
+            return result
+
         # Check for command-line arguments
-        if len(sys.argv) >= 3:
-            identifier = sys.argv[1]
-            local_directory = sys.argv[2]
+        if args.identifier and args.directory:
+            identifier = args.identifier
+            local_directory = args.directory
             
             # Validate identifier
             is_valid, error_msg, suggested = validate_identifier(identifier)
@@ -1200,17 +5695,30 @@ def main():
                 print(f"❌ Invalid identifier: {error_msg}")
                 if suggested:
                     print(f"   💡 Did you mean: {suggested}?")
-                return False
+                return {'status': 'invalid', 'identifier': identifier, 'error': error_msg}
             
             # Validate directory path
             is_valid, error_msg, resolved_path = validate_path(local_directory)
             if not is_valid:
                 print(f"❌ {error_msg}")
-                return False
+                return {'status': 'invalid', 'identifier': identifier, 'error': error_msg}
             
             print(f"✅ Using identifier: {identifier}")
             print(f"✅ Using directory: {resolved_path}")
             local_directory = str(resolved_path)
+
+            if args.metadata:
+                try:
+                    metadata = load_metadata_file(Path(args.metadata).expanduser())
+                except (OSError, ValueError) as e:
+                    print(f"❌ Could not read metadata file '{args.metadata}': {e}")
+                    return {'status': 'invalid', 'identifier': identifier, 'error': str(e)}
+            else:
+                metadata = load_metadata(identifier)
+        elif not interactive:
+            print("❌ An identifier and a directory (or --batch) are required when not running "
+                  "interactively in a terminal.")
+            return {'status': 'invalid', 'error': "identifier and directory required"}
         else:
             # Interactive mode
             identifiers = load_identifiers()
@@ -1218,7 +5726,7 @@ def main():
 
             if not identifier or not local_directory or quit_flag:
                 print("\n👋 Goodbye!")
-                return
+                return {'status': 'ok'}
 
             # Save the identifier/path
             identifiers[identifier] = local_directory
@@ -1272,24 +5780,43 @@ def main():
             except KeyboardInterrupt:
                 print("\n\n⚠️  Interrupted. Exiting...")
                 print("\n👋 Goodbye!\n")
-                return
+                return {'status': 'interrupted'}
 
         # Run the upload process
+        result = {'status': 'interrupted'}
         if not quit_flag:
-            success = process_upload(identifier, local_directory, force_upload=force_upload, metadata=metadata)
+            options = dict(force_upload=force_upload, metadata=metadata, sync=args.sync, verify=args.verify,
+                           concurrency=args.concurrency, engine=args.engine,
+                           s3_endpoint=args.s3_endpoint,
+                           multipart_threshold=args.multipart_threshold,
+                           content_md5=args.content_md5,
+                           queue_size=args.queue_size,
+                           full_rescan=args.full_rescan,
+                           deep_verify=args.deep_verify,
+                           check_limit=args.check_limit,
+                           pack_format=args.pack,
+                           pack_threshold=args.pack_threshold,
+                           pack_size=args.pack_size)
+            if args.watch:
+                result = watch_directory(identifier, local_directory, poll_interval=args.poll_interval,
+                                         settle=args.settle, **options)
+            else:
+                result = process_upload(identifier, local_directory, **options)
+            result = {'identifier': identifier, 'directory': local_directory, **result}
 
-            if success:
+            if result['status'] == 'ok':
                 print("\n🎉 Upload process completed successfully!")
             else:
                 print("\n⚠️  Upload process completed with issues.")
 
         print("\n👋 Goodbye!\n")
+        return result
     
     except KeyboardInterrupt:
         print("\n\n⚠️  Force exit...")
         print("\n👋 Goodbye!\n")
-        sys.exit(1)
+        return {'status': 'interrupted'}
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Shared fixtures: bulk-upload.py loaded as a module with its config directory
+in a temporary HOME, a fresh upload log per test and a local stub of IA-S3.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+SCRIPT = Path(__file__).resolve().parent.parent / "bulk-upload.py"
+
+
+@pytest.fixture(scope="session")
+def bulk_upload(tmp_path_factory):
+    """The script as a module; its config directory is fixed at import, so HOME is set first."""
+    home = os.environ.get('HOME')
+    os.environ['HOME'] = str(tmp_path_factory.mktemp("home"))
+    try:
+        spec = importlib.util.spec_from_file_location("bulk_upload", SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        if home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = home
+    module.ensure_config_dir()
+    yield module
+    module.close_upload_log_store()
+
+
+@pytest.fixture(autouse=True)
+def upload_log(bulk_upload, monkeypatch):
+    """Start every test from an empty, current upload log; keep retries and output short."""
+    reset_upload_log(bulk_upload)
+    bulk_upload.create_upload_log_db()
+    monkeypatch.setattr(bulk_upload, 'RETRY_BASE_DELAY', 0.05)
+    monkeypatch.setattr(bulk_upload, 'progress_mode', 'off')
+    yield
+    bulk_upload.close_upload_log_store()
+
+
+@pytest.fixture
+def no_upload_log(bulk_upload) -> Path:
+    """Path of the upload log database, closed and deleted."""
+    reset_upload_log(bulk_upload)
+    return bulk_upload.UPLOAD_LOG_DB
+
+
+def reset_upload_log(bulk_upload):
+    """Close the upload log store and delete the database."""
+    bulk_upload.close_upload_log_store()
+    for suffix in ('', '-wal', '-shm'):
+        path = Path(str(bulk_upload.UPLOAD_LOG_DB) + suffix)
+        if path.exists():
+            path.unlink()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Stub IA-S3 Server
+# ─────────────────────────────────────────────────────────────────────────────
+class StubS3:
+    """
+    Just enough of IA-S3 for the upload engines: PUT objects (ETag is the
+    body's MD5) and multipart initiate / part / complete. `scripted[path]`
+    holds responses to give instead of the next PUTs of that path, e.g.
+    ('slowdown', retry_after), ('bad_etag',) or ('error', status). The
+    metadata API lists the objects stored, as IA would once they are
+    derived. Every request is logged.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects: Dict[str, bytes] = {}
+        self.uploads: Dict[str, Dict[int, bytes]] = {}
+        self.scripted: Dict[str, List[Tuple]] = {}
+        self.requests: List[Tuple[str, str, float]] = []   # (method, path with query, time)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def puts(self, path: str) -> List[float]:
+        """Times of the PUTs of one object (not its multipart parts)."""
+        return [at for method, target, at in self.requests if method == 'PUT' and target == path]
+
+    def metadata(self, identifier: str) -> Dict[str, Any]:
+        """What /metadata/IDENTIFIER returns: the item's stored objects; {} if it has none."""
+        with self.lock:
+            files = [{'name': path.split('/', 2)[2], 'size': str(len(data)), 'md5': hashlib.md5(data).hexdigest()}
+                     for path, data in sorted(self.objects.items()) if path.startswith(f'/{identifier}/')]
+        if not files:
+            return {}
+        last_updated = int(hashlib.md5(json.dumps(files).encode()).hexdigest()[:8], 16)
+        return {'metadata': {'identifier': identifier}, 'files': files, 'item_last_updated': last_updated}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            def _reply(self, status: int, body: bytes = b'', headers: Dict[str, str] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                with stub.lock:
+                    stub.requests.append(('GET', self.path, time.monotonic()))
+                _, api, identifier, *rest = url.path.split('/')
+                if api != 'metadata':
+                    return self._reply(404)
+                metadata = stub.metadata(identifier)
+                if rest == ['item_last_updated']:
+                    metadata = {'result': metadata['item_last_updated']} if metadata else {}
+                self._reply(200, json.dumps(metadata).encode(), {'Content-Type': 'application/json'})
+
+            def do_PUT(self):
+                data = self._body()
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                with stub.lock:
+                    stub.requests.append(('PUT', self.path, time.monotonic()))
+                    script = stub.scripted.get(url.path)
+                    action = script.pop(0) if script and 'partNumber' not in query else None
+                etag = hashlib.md5(data).hexdigest()
+                if action and action[0] == 'slowdown':
+                    body = b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>'
+                    return self._reply(503, body, {'Retry-After': str(action[1])})
+                if action and action[0] == 'error':
+                    return self._reply(action[1], b'<Error><Code>AccessDenied</Code></Error>')
+                if action and action[0] == 'bad_etag':
+                    etag = hashlib.md5(data + b'corrupted').hexdigest()
+                with stub.lock:
+                    if 'partNumber' in query:
+                        stub.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = data
+                    else:
+                        stub.objects[url.path] = data
+                self._reply(200, headers={'ETag': f'"{etag}"'})
+
+            def do_POST(self):
+                self._body()
+                url = urlsplit(self.path)
+                query = parse_qs(url.query, keep_blank_values=True)
+                with stub.lock:
+                    stub.requests.append(('POST', self.path, time.monotonic()))
+                    if 'uploads' in query:
+                        upload_id = f"upload-{len(stub.requests)}"
+                        stub.uploads[upload_id] = {}
+                        body = (f'<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId>'
+                                f'</InitiateMultipartUploadResult>').encode()
+                    else:
+                        parts = stub.uploads.pop(query['uploadId'][0])
+                        stub.objects[url.path] = b''.join(parts[n] for n in sorted(parts))
+                        body = b'<CompleteMultipartUploadResult><ETag>"x"</ETag></CompleteMultipartUploadResult>'
+                self._reply(200, body)
+
+        return Handler
+
+
+@pytest.fixture
+def s3(bulk_upload, monkeypatch):
+    """A running StubS3; the script's S3 credentials are made up, the stub takes any."""
+    monkeypatch.setattr(bulk_upload, 'get_s3_credentials', lambda: ('access', 'secret'))
+    stub = StubS3()
+    yield stub
+    stub.close()
@@ -0,0 +1,132 @@
+"""Bandwidth caps: rate and schedule parsing, the token bucket, control file and per-job caps."""
+import time
+
+import pytest
+
+MON, FRI, SAT = 0, 4, 5
+
+
+def at(weekday: int, hour: int, minute: int = 0) -> time.struct_time:
+    """Local time on some `weekday` (0 is Monday); only the fields the schedule reads matter."""
+    return time.struct_time((2026, 1, 1, hour, minute, 0, weekday, 1, -1))
+
+
+def elapse(limiter, seconds: float):
+    """Pretend `seconds` passed since the bucket was last filled."""
+    limiter.updated -= seconds
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parsing
+# ─────────────────────────────────────────────────────────────────────────────
+def test_parse_bandwidth(bulk_upload):
+    assert bulk_upload.parse_bandwidth('5M') == 5 * 1024 ** 2
+    assert bulk_upload.parse_bandwidth('512k') == 512 * 1024
+    assert bulk_upload.parse_bandwidth('20%', 1000) == 200
+    assert bulk_upload.parse_bandwidth('full', 1000) == 1000
+    assert bulk_upload.parse_bandwidth(' Off ') is None
+    with pytest.raises(ValueError, match="needs --max-bandwidth"):
+        bulk_upload.parse_bandwidth('20%')
+    for text in ('0', '0%', 'fast'):
+        with pytest.raises(ValueError):
+            bulk_upload.parse_bandwidth(text, 1000)
+
+
+def test_parse_bandwidth_window(bulk_upload):
+    window = bulk_upload.parse_bandwidth_window('mon-fri 09:00-18:00=20%')
+    assert window == {'days': {0, 1, 2, 3, 4}, 'start': 9 * 60, 'end': 18 * 60, 'rate': '20%',
+                      'text': 'mon-fri 09:00-18:00=20%'}
+    # Day ranges wrap around the week; no days means every day
+    assert bulk_upload.parse_bandwidth_window('fri-mon,wed 22:00-06:30=1M')['days'] == {4, 5, 6, 0, 2}
+    assert bulk_upload.parse_bandwidth_window('00:00-24:00=off')['days'] == set()
+    for text in ('09:00-09:00=1M', '25:00-06:00=1M', '09:60-10:00=1M', 'funday 09:00-10:00=1M', '09:00=1M'):
+        with pytest.raises(ValueError):
+            bulk_upload.parse_bandwidth_window(text)
+
+
+def test_window_across_midnight_belongs_to_the_day_it_starts(bulk_upload):
+    window = bulk_upload.parse_bandwidth_window('fri 22:00-06:00=1M')
+    inside = bulk_upload.in_bandwidth_window
+
+    assert inside(window, at(FRI, 22))
+    assert inside(window, at(FRI, 23, 59))
+    assert inside(window, at(SAT, 0))
+    assert inside(window, at(SAT, 5, 59))
+    assert not inside(window, at(SAT, 6))
+    assert not inside(window, at(FRI, 21, 59))
+    # Friday early morning is the tail of Thursday night's window
+    assert not inside(window, at(FRI, 3))
+    assert not inside(window, at(SAT, 23))
+
+    every_night = bulk_upload.parse_bandwidth_window('22:00-06:00=1M')
+    assert inside(every_night, at(MON, 2)) and not inside(every_night, at(MON, 12))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Token bucket
+# ─────────────────────────────────────────────────────────────────────────────
+def test_bucket_refills_at_rate_up_to_the_burst(bulk_upload):
+    limiter = bulk_upload.BandwidthLimiter(1000)
+
+    assert limiter.reserve(500) == pytest.approx(0.5, abs=0.01)
+    # Later chunks queue behind the first
+    assert limiter.reserve(500) == pytest.approx(1.0, abs=0.01)
+    elapse(limiter, 1.5)
+    assert limiter.reserve(0) == 0.0
+    assert limiter.tokens == pytest.approx(500, abs=10)
+    # Idle time only builds up BANDWIDTH_BURST_SECONDS worth of tokens
+    elapse(limiter, 60)
+    assert limiter.reserve(1500) == pytest.approx(0.5, abs=0.01)
+
+
+def test_no_rate_never_waits(bulk_upload):
+    limiter = bulk_upload.BandwidthLimiter()
+    assert limiter.reserve(10 ** 12) == 0.0
+    limiter.throttle(10 ** 12)
+
+
+def test_job_limiter_waits_for_the_tighter_cap(bulk_upload):
+    parent = bulk_upload.BandwidthLimiter(1000)
+    job = bulk_upload.BandwidthLimiter(4000, parent=parent)
+    uncapped_job = bulk_upload.BandwidthLimiter(None, parent=parent)
+
+    assert job.reserve(2000) == pytest.approx(2.0, abs=0.01)
+    # The parent's bucket is shared by every job
+    assert uncapped_job.reserve(1000) == pytest.approx(3.0, abs=0.01)
+    assert job.tokens == pytest.approx(-2000, abs=50)
+
+    epochs = job.epochs()
+    parent.set_rate(2000)
+    assert job.epochs() != epochs   # Waits planned at the parent's old rate end early
+    assert job.reserve(4000) == pytest.approx(2.0, abs=0.05)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Schedule and control file
+# ─────────────────────────────────────────────────────────────────────────────
+def refresh(limiter):
+    limiter.request_refresh()
+    limiter.reserve(0)
+    return limiter.rate
+
+
+def test_control_file_overrides_schedule_while_it_exists(bulk_upload, tmp_path):
+    control = tmp_path / "bandwidth"
+    always = dict(bulk_upload.parse_bandwidth_window('00:00-24:00=x'), rate=3000)
+    limiter = bulk_upload.BandwidthLimiter()
+    limiter.configure(1000, [always], control)
+    assert limiter.rate == 3000
+
+    control.write_text("25%\n")
+    assert refresh(limiter) == 250
+    control.write_text("unlimited")
+    assert refresh(limiter) is None
+    control.write_text("5 megabits")   # Unparsable: ignored, as if absent
+    assert refresh(limiter) == 3000
+    control.write_text("2K")
+    assert refresh(limiter) == 2048
+    control.unlink()
+    assert refresh(limiter) == 3000
+
+    limiter.configure(1000, [], control)
+    assert limiter.rate == 1000
@@ -0,0 +1,114 @@
+"""The script run as a command: exit statuses and --output json, against the stub IA."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List
+
+from conftest import SCRIPT
+
+# Runs the script as __main__ with every internetarchive session (metadata
+# API, credentials) pointed at the stub instead of archive.org
+LAUNCHER = """
+import os, runpy, sys
+from internetarchive.session import ArchiveSession
+
+init = ArchiveSession.__init__
+
+def init_against_stub(self, *args, **kwargs):
+    init(self, *args, **kwargs)
+    self.protocol, self.host = 'http:', os.environ['STUB_IA_HOST']
+
+ArchiveSession.__init__ = init_against_stub
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+"""
+
+IDENTIFIER = 'test-item'
+RESULT_KEYS = {'identifier', 'directory', 'status', 'files', 'unchanged', 'uploaded', 'uploaded_bytes',
+               'failed', 'mismatched', 'error'}
+
+
+def run_script(s3, home: Path, *args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, HOME=str(home), STUB_IA_HOST=s3.url.split('//', 1)[1])
+    return subprocess.run(
+        [sys.executable, '-c', LAUNCHER, str(SCRIPT), *args,
+         '--engine', 'async', '--s3-endpoint', s3.url, '--progress', 'off'],
+        env=env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=120)
+
+
+def upload(s3, home: Path, directory: Path, *args: str) -> subprocess.CompletedProcess:
+    return run_script(s3, home, IDENTIFIER, str(directory), '--output', 'json', *args)
+
+
+def make_tree(root: Path, names: List[str]) -> Path:
+    root.mkdir()
+    for name in names:
+        (root / name).write_text(f"contents of {name}\n")
+    return root
+
+
+def test_json_result_of_successful_run(bulk_upload, s3, tmp_path):
+    files = make_tree(tmp_path / "files", ['a.txt', 'b.txt'])
+
+    run = upload(s3, tmp_path, files)
+
+    assert run.returncode == bulk_upload.EXIT_OK, run.stderr
+    result = json.loads(run.stdout)   # Nothing but the result on stdout
+    assert set(result) == RESULT_KEYS
+    assert result['identifier'] == IDENTIFIER
+    assert result['directory'] == str(files)
+    assert (result['status'], result['files'], result['uploaded'], result['failed']) == ('ok', 2, 2, 0)
+    assert result['uploaded_bytes'] == sum(p.stat().st_size for p in files.iterdir())
+    assert s3.objects[f'/{IDENTIFIER}/a.txt'] == b"contents of a.txt\n"
+
+    # Unchanged since: nothing is sent again
+    run = upload(s3, tmp_path, files)
+    assert run.returncode == bulk_upload.EXIT_OK, run.stderr
+    assert json.loads(run.stdout)['unchanged'] == 2
+    assert len(s3.puts(f'/{IDENTIFIER}/a.txt')) == 1
+
+
+def test_failed_upload_exits_partial(bulk_upload, s3, tmp_path):
+    files = make_tree(tmp_path / "files", ['a.txt', 'b.txt'])
+    s3.scripted[f'/{IDENTIFIER}/b.txt'] = [('error', 403)]
+
+    run = upload(s3, tmp_path, files)
+
+    assert run.returncode == bulk_upload.EXIT_PARTIAL, run.stderr
+    result = json.loads(run.stdout)
+    assert (result['status'], result['uploaded'], result['failed']) == ('partial', 1, 1)
+
+
+def test_damaged_copy_on_ia_exits_mismatch(bulk_upload, s3, tmp_path):
+    files = make_tree(tmp_path / "files", ['a.txt', 'b.txt'])
+    assert upload(s3, tmp_path, files).returncode == bulk_upload.EXIT_OK
+    s3.objects[f'/{IDENTIFIER}/a.txt'] = b"damaged on IA\n"
+
+    run = upload(s3, tmp_path, files, '--no-sync', '--deep-verify')
+
+    assert run.returncode == bulk_upload.EXIT_MISMATCH, run.stderr
+    result = json.loads(run.stdout)
+    assert (result['status'], result['unchanged'], result['mismatched']) == ('mismatch', 2, 1)
+    assert "a.txt: MISMATCH" in run.stderr
+
+
+def test_usage_errors(bulk_upload, s3, tmp_path):
+    files = make_tree(tmp_path / "files", ['a.txt'])
+
+    run = upload(s3, tmp_path, files, '--pack-size', '0')
+    assert run.returncode == bulk_upload.EXIT_USAGE
+    assert run.stdout == ''
+    assert "--pack-size must be between" in run.stderr
+
+    run = run_script(s3, tmp_path, 'no spaces allowed', str(files), '--output', 'json')
+    assert run.returncode == bulk_upload.EXIT_USAGE
+    result = json.loads(run.stdout)
+    assert result['status'] == 'invalid' and result['identifier'] == 'no spaces allowed' and result['error']
+
+    # No terminal to ask on: the identifier and directory must be given
+    run = run_script(s3, tmp_path)
+    assert run.returncode == bulk_upload.EXIT_USAGE
+    assert "are required when not running interactively" in run.stdout
+    assert s3.requests == []
@@ -0,0 +1,173 @@
+"""Change detection: which scanned files the pipeline uploads again."""
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+from unittest.mock import ANY
+
+IDENTIFIER = 'item'
+
+
+def scan_record(bulk_upload, path: Path, relative_path: str):
+    return [(relative_path, bulk_upload.LocalFile.from_stat(str(path), path.stat()))]
+
+
+def log_upload(bulk_upload, path: Path, relative_path: str, md5: Optional[str], **stat):
+    """Log `path` as uploaded, with its current stat unless overridden."""
+    local_file = bulk_upload.LocalFile.from_stat(str(path), path.stat())
+    entry = {'relative_path': relative_path, 'size': local_file.size, 'uploaded': True, 'md5_hash': md5,
+             **{field: getattr(local_file, field) for field in bulk_upload.STAT_FIELDS}}
+    entry.update(stat)
+    bulk_upload.update_upload_log(IDENTIFIER, [entry])
+
+
+def run_pipeline(bulk_upload, s3, root: Path, batches):
+    pipeline = bulk_upload.UploadPipeline(IDENTIFIER, root, {}, engine='async', s3_endpoint=s3.url,
+                                          batches=batches, verify=False, quiet=True)
+    pipeline.run()
+    return pipeline
+
+
+def logged_row(bulk_upload, relative_path: str):
+    return bulk_upload.load_upload_log_entries(IDENTIFIER, [relative_path])[relative_path]
+
+
+def test_stat_change_without_logged_md5_is_uploaded(bulk_upload, s3, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"new content")
+    # Same size, older mtime, no MD5 (legacy row or multipart upload)
+    log_upload(bulk_upload, path, "a.txt", None, mtime_ns=path.stat().st_mtime_ns - 10 ** 9)
+
+    pipeline = run_pipeline(bulk_upload, s3, tmp_path, [scan_record(bulk_upload, path, "a.txt")])
+
+    assert pipeline.stats['uploaded'] == 1
+    assert s3.objects[f'/{IDENTIFIER}/a.txt'] == b"new content"
+
+
+def test_stat_change_with_matching_md5_is_unchanged(bulk_upload, s3, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"same content")
+    old_mtime = path.stat().st_mtime_ns - 10 ** 9
+    log_upload(bulk_upload, path, "a.txt", hashlib.md5(b"same content").hexdigest(), mtime_ns=old_mtime)
+
+    pipeline = run_pipeline(bulk_upload, s3, tmp_path, [scan_record(bulk_upload, path, "a.txt")])
+
+    assert pipeline.stats['unchanged'] == 1
+    assert s3.requests == []
+    # The new stat is remembered, so the next run doesn't hash it again
+    assert logged_row(bulk_upload, "a.txt")['mtime_ns'] == path.stat().st_mtime_ns
+
+
+def test_stat_change_with_other_md5_is_uploaded(bulk_upload, s3, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"edited")
+    log_upload(bulk_upload, path, "a.txt", hashlib.md5(b"before").hexdigest(),
+               mtime_ns=path.stat().st_mtime_ns - 10 ** 9)
+
+    pipeline = run_pipeline(bulk_upload, s3, tmp_path, [scan_record(bulk_upload, path, "a.txt")])
+
+    assert pipeline.stats['uploaded'] == 1
+    assert s3.objects[f'/{IDENTIFIER}/a.txt'] == b"edited"
+
+
+def test_stat_unchanged_needs_every_field(bulk_upload, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"content")
+    local_file = bulk_upload.LocalFile.from_stat(str(path), path.stat())
+    entry = {'size': local_file.size, **{field: getattr(local_file, field) for field in bulk_upload.STAT_FIELDS}}
+
+    assert bulk_upload.stat_unchanged(entry, local_file)
+    for field in ('size',) + bulk_upload.STAT_FIELDS:
+        assert not bulk_upload.stat_unchanged({**entry, field: entry[field] + 1}, local_file), field
+    # Rows logged before the stat columns existed
+    assert not bulk_upload.stat_unchanged({**entry, 'ctime_ns': None}, local_file)
+
+
+def test_file_replaced_with_same_size_and_mtime_is_uploaded(bulk_upload, s3, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"version 1")
+    st = path.stat()
+    log_upload(bulk_upload, path, "a.txt", hashlib.md5(b"version 1").hexdigest())
+    # Replaced by rename, with the old mtime kept (as rsync --times or cp -p do)
+    replacement = tmp_path / "a.txt.tmp"
+    replacement.write_bytes(b"version 2")
+    os.utime(replacement, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(replacement, path)
+    assert path.stat().st_ino != st.st_ino
+
+    pipeline = run_pipeline(bulk_upload, s3, tmp_path, [scan_record(bulk_upload, path, "a.txt")])
+
+    assert pipeline.stats['uploaded'] == 1
+    assert s3.objects[f'/{IDENTIFIER}/a.txt'] == b"version 2"
+    assert logged_row(bulk_upload, "a.txt")['inode'] == path.stat().st_ino
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Directory snapshot
+# ─────────────────────────────────────────────────────────────────────────────
+def age(path: Path, seconds: int = 60):
+    """Set an mtime well outside the snapshot's racy window."""
+    mtime_ns = path.stat().st_mtime_ns - seconds * 10 ** 9
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def scan(bulk_upload, root: Path):
+    snapshot = bulk_upload.DirectorySnapshot(root)
+    files = {relative_path: local_file for batch in bulk_upload.iter_local_files(root, snapshot=snapshot)
+             for relative_path, local_file in batch}
+    return files, snapshot.reused
+
+
+def test_snapshot_lists_changed_directories_again(bulk_upload, tmp_path):
+    root = tmp_path / "tree"
+    (root / "sub").mkdir(parents=True)
+    for name in ("a.txt", "sub/b.txt"):
+        (root / name).write_bytes(b"12345")
+        age(root / name)
+    for directory in (root / "sub", root):
+        age(directory)
+
+    assert scan(bulk_upload, root) == ({'a.txt': ANY, 'sub/b.txt': ANY}, 0)
+    files, reused = scan(bulk_upload, root)
+    assert set(files) == {'a.txt', 'sub/b.txt'} and reused == 2
+
+    # A new entry changes the directory's mtime; even an old one isn't reused
+    (root / "sub/c.txt").write_bytes(b"new")
+    age(root / "sub/c.txt")
+    age(root / "sub", 30)
+    files, reused = scan(bulk_upload, root)
+    assert set(files) == {'a.txt', 'sub/b.txt', 'sub/c.txt'} and reused == 1
+
+    # Rewritten in place: same directory mtime, but the file's stat differs
+    (root / "a.txt").write_bytes(b"1234567")
+    age(root / "a.txt", 10)
+    files, reused = scan(bulk_upload, root)
+    assert files['a.txt'].size == 7 and reused == 1
+
+
+def test_partial_deep_verify_takes_files_checked_longest_ago(bulk_upload, s3, tmp_path, monkeypatch):
+    batch = []
+    for name in ('a', 'b', 'c', 'd'):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        log_upload(bulk_upload, path, name, hashlib.md5(name.encode()).hexdigest())
+        batch += scan_record(bulk_upload, path, name)
+    store = bulk_upload.get_upload_log_store()
+    store.write('UPDATE upload_log SET deep_verified_at = ? WHERE filename = ?', [(100.0, 'b'), (50.0, 'a')],
+                many=True)
+    hashed = []
+    md5_file = bulk_upload._md5_file
+    monkeypatch.setattr(bulk_upload, '_md5_file', lambda path: hashed.append(Path(path).name) or md5_file(path))
+
+    def deep_verify(percent: float):
+        hashed.clear()
+        bulk_upload.UploadPipeline(IDENTIFIER, tmp_path, {}, engine='async', s3_endpoint=s3.url, batches=[batch],
+                                   deep_verify=percent, verify=False, quiet=True).run()
+        return sorted(hashed)
+
+    assert deep_verify(50) == ['c', 'd']   # Never deep verified
+    bulk_upload.record_deep_verified(IDENTIFIER, ['c', 'd'])
+    assert deep_verify(50) == ['a', 'b']
+    assert deep_verify(25) == ['a']
+    assert deep_verify(100) == ['a', 'b', 'c', 'd']
+    assert s3.requests == []
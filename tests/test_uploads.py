@@ -0,0 +1,289 @@
+"""Upload engines against the stub IA-S3 server, and upload log migrations."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import types
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+CREDENTIALS = ('access', 'secret')
+
+
+def make_file(path: Path, size: int) -> Path:
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def file_info(path: Path, relative_path: str) -> Dict[str, Any]:
+    """A file_info dict as the pipeline hands it to the upload engines."""
+    return {'relative_path': relative_path, 'path': path, 'size': path.stat().st_size, 'uploaded': False}
+
+
+def async_engine(bulk_upload, s3, **kwargs):
+    return bulk_upload.AsyncUploadEngine('item', {}, endpoint=s3.url, credentials=CREDENTIALS, **kwargs)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PUT bodies and ETags
+# ─────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize('sendfile', [False, True])
+def test_put_bodies_match_files(bulk_upload, s3, tmp_path, monkeypatch, sendfile):
+    monkeypatch.setattr(bulk_upload, 'use_sendfile', sendfile)
+    monkeypatch.setattr(bulk_upload, 'upload_block_size', 64 * 1024)
+    files = [file_info(make_file(tmp_path / f"f{i}.bin", size), f"dir/f{i}.bin")
+             for i, size in enumerate((1, 1000, 64 * 1024, 300 * 1024 + 7))]
+
+    assert async_engine(bulk_upload, s3, concurrency=4).upload(list(files)) == len(files)
+
+    for info in files:
+        data = info['path'].read_bytes()
+        assert s3.objects[f"/item/{info['relative_path']}"] == data
+        assert info['uploaded']
+        if not sendfile:
+            # Hashed while streaming; sendfile() bodies aren't read by Python
+            assert info['md5_hash'] == hashlib.md5(data).hexdigest()
+    uploaded = bulk_upload.get_upload_log_store().query(
+        'SELECT COUNT(*) FROM upload_log WHERE identifier = ? AND uploaded = 1', ('item',))
+    assert uploaded == [(len(files),)]
+
+
+def test_etag_mismatch_is_retried(bulk_upload, s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_upload, 'use_sendfile', False)
+    info = file_info(make_file(tmp_path / "a.bin", 5000), "a.bin")
+    s3.scripted['/item/a.bin'] = [('bad_etag',)]
+
+    assert async_engine(bulk_upload, s3).upload([info]) == 1
+
+    assert len(s3.puts('/item/a.bin')) == 2
+    assert info['attempts'] == 2
+    assert info['md5_hash'] == hashlib.md5(info['path'].read_bytes()).hexdigest()
+    errors = bulk_upload.get_upload_log_store().query(
+        'SELECT error FROM upload_attempts WHERE filename = ? ORDER BY attempt', ('a.bin',))
+    assert errors == [('checksum mismatch',), (None,)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SlowDown
+# ─────────────────────────────────────────────────────────────────────────────
+def test_slowdown_halves_limit_and_honours_retry_after(bulk_upload, s3, tmp_path):
+    controller = bulk_upload.RateController(8, s3.url, 'item')
+    files = [file_info(make_file(tmp_path / f"f{i}", 100), f"f{i}") for i in range(4)]
+    s3.scripted['/item/f0'] = [('slowdown', 1)]
+
+    assert async_engine(bulk_upload, s3, concurrency=8, controller=controller).upload(files) == 4
+
+    assert controller.throttled == 1
+    assert controller.lowest == 4
+    throttled, retried = s3.puts('/item/f0')
+    assert retried - throttled >= 0.95
+    assert s3.objects['/item/f0'] == files[0]['path'].read_bytes()
+
+
+def test_throttle_pauses_new_uploads(bulk_upload):
+    controller = bulk_upload.RateController(8)
+    assert controller.on_throttle(3.0) >= 3.0
+    assert int(controller.limit) == 4
+    assert controller.try_acquire() > 2.5
+    # A second SlowDown within the cooldown doesn't halve the limit again
+    controller.on_throttle(None)
+    assert int(controller.limit) == 4
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Multipart resume
+# ─────────────────────────────────────────────────────────────────────────────
+def test_multipart_resumes_from_saved_parts(bulk_upload, s3, tmp_path):
+    part_size = 1024 * 1024
+    path = make_file(tmp_path / "big.bin", 3 * part_size + 123)
+    data = path.read_bytes()
+    # A previous run initiated the upload and finished parts 1 and 2
+    upload_id = 'upload-earlier'
+    s3.uploads[upload_id] = {n: data[(n - 1) * part_size:n * part_size] for n in (1, 2)}
+    bulk_upload.save_multipart_upload('item', 'big.bin', upload_id, len(data), path.stat().st_mtime_ns, part_size)
+    for n in (1, 2):
+        etag = hashlib.md5(s3.uploads[upload_id][n]).hexdigest()
+        bulk_upload.record_multipart_part('item', 'big.bin', upload_id, n, f'"{etag}"')
+    info = file_info(path, 'big.bin')
+
+    assert async_engine(bulk_upload, s3, multipart_threshold=part_size).upload([info]) == 1
+
+    sent = sorted(target for method, target, _ in s3.requests if method == 'PUT')
+    assert sent == [f'/item/big.bin?partNumber={n}&uploadId={upload_id}' for n in (3, 4)]
+    assert [target for method, target, _ in s3.requests if method == 'POST'] == [
+        f'/item/big.bin?uploadId={upload_id}']
+    assert s3.objects['/item/big.bin'] == data
+    assert info['md5_hash'] == hashlib.md5(data).hexdigest()
+    assert bulk_upload.load_multipart_state('item', 'big.bin') is None
+
+
+def test_multipart_reads_file_once_for_hashing(bulk_upload, s3, tmp_path, monkeypatch):
+    part_size = 1024 * 1024
+    path = make_file(tmp_path / "big.bin", 3 * part_size + 5)
+    data = path.read_bytes()
+    bytes_read = []
+    open_for_read = bulk_upload.open_for_read
+
+    class CountingReader:
+        def __init__(self, f):
+            self.f = f
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.f.close()
+
+        def seek(self, offset):
+            return self.f.seek(offset)
+
+        def readinto(self, buffer):
+            n = self.f.readinto(buffer)
+            bytes_read.append(n)
+            return n
+
+    monkeypatch.setattr(bulk_upload, 'open_for_read', lambda p: CountingReader(open_for_read(p)))
+    monkeypatch.setattr(bulk_upload, 'MULTIPART_PART_SIZE', part_size)
+    info = file_info(path, 'big.bin')
+
+    assert async_engine(bulk_upload, s3, multipart_threshold=part_size).upload([info]) == 1
+
+    assert s3.objects['/item/big.bin'] == data
+    # One pass hashes the parts and the whole file, one sends the parts
+    assert sum(bytes_read) == 2 * len(data)
+    assert info['md5_hash'] == hashlib.md5(data).hexdigest()
+    logged = bulk_upload.load_upload_log_entries('item', ['big.bin'])['big.bin']
+    assert logged['md5_hash'] == hashlib.md5(data).hexdigest()
+
+
+def test_multipart_ia_engine_reuses_one_pool(bulk_upload, s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk_upload, 'MULTIPART_PART_SIZE', 1024 * 1024)
+    files = [file_info(make_file(tmp_path / f"big{i}", 3 * 1024 * 1024 + i), f"big{i}") for i in range(3)]
+
+    # Multipart files never reach item.upload()
+    item = types.SimpleNamespace(identifier='item')
+    _, connections_before = bulk_upload.http_connection_stats()
+    assert bulk_upload.run_upload_pool('item', item, list(files), {}, concurrency=1,
+                                       multipart_threshold=1024 * 1024, s3_endpoint=s3.url) == 3
+
+    # Later files go over the connections the first one opened
+    _, connections = bulk_upload.http_connection_stats()
+    assert connections - connections_before <= bulk_upload.MULTIPART_PARALLEL_PARTS
+
+    for info in files:
+        assert s3.objects[f"/item/{info['relative_path']}"] == info['path'].read_bytes()
+
+
+def test_upload_pool_shuts_down_when_source_fails(bulk_upload, s3, tmp_path):
+    big = file_info(make_file(tmp_path / "big", 2 * 1024 * 1024), "big")
+
+    def source():
+        yield big
+        raise RuntimeError("pipeline source failed")
+
+    item = types.SimpleNamespace(identifier='item')
+    with pytest.raises(RuntimeError, match="pipeline source failed"):
+        bulk_upload.run_upload_pool('item', item, source(), {}, concurrency=2,
+                                    multipart_threshold=1024 * 1024, s3_endpoint=s3.url)
+
+    left = [t.name for t in threading.enumerate()
+            if t.name.startswith(('upload_', 'upload-feed_', 'multipart-loop', 'part-io_'))]
+    assert left == []
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch mode
+# ─────────────────────────────────────────────────────────────────────────────
+def test_batch_splits_concurrency_between_jobs(bulk_upload, s3, tmp_path, monkeypatch):
+    pipelines = []
+    pipeline_class = bulk_upload.UploadPipeline
+
+    def recording_pipeline(*args, **kwargs):
+        pipelines.append(pipeline_class(*args, **kwargs))
+        return pipelines[-1]
+
+    monkeypatch.setattr(bulk_upload, 'UploadPipeline', recording_pipeline)
+
+    def run_batch(identifiers, jobs: int):
+        manifest = {}
+        for identifier in identifiers:
+            (tmp_path / identifier).mkdir()
+            make_file(tmp_path / identifier / "a.bin", 1000)
+            manifest[identifier] = str(tmp_path / identifier)
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+        pipelines.clear()
+        result = bulk_upload.run_batch(tmp_path / "manifest.json", jobs=jobs, concurrency=8, engine='async',
+                                       s3_endpoint=s3.url, report_path=tmp_path / "report.csv",
+                                       sync=False, verify=False)
+        assert result['status'] == 'ok'
+        return sorted((p.identifier, p.concurrency, p.hash_workers) for p in pipelines)
+
+    hash_workers = -(-bulk_upload.DEFAULT_HASH_WORKERS // 2)
+    assert run_batch(['batch-one', 'batch-two', 'batch-three'], jobs=2) == [
+        ('batch-one', 4, hash_workers), ('batch-three', 4, hash_workers), ('batch-two', 4, hash_workers)]
+    # Fewer identifiers than jobs: the budget isn't split more than needed
+    assert run_batch(['batch-alone'], jobs=2) == [('batch-alone', 8, bulk_upload.DEFAULT_HASH_WORKERS)]
+    assert len(s3.objects) == 4
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Page cache
+# ─────────────────────────────────────────────────────────────────────────────
+def test_uncached_reader_drops_only_what_it_read(bulk_upload, tmp_path, monkeypatch):
+    path = make_file(tmp_path / "big.bin", 64 * 1024)
+    dropped = []
+    monkeypatch.setattr(bulk_upload, '_fadvise', lambda fd, offset, length, advice: dropped.append(
+        (offset, length)) if advice == 'POSIX_FADV_DONTNEED' else None)
+    monkeypatch.setattr(bulk_upload, 'PAGE_CACHE_DROP_INTERVAL', 16 * 1024)
+
+    # One multipart part's reader: bytes 10000-40000
+    with bulk_upload.UncachedReader(path, 'drop') as reader:
+        reader.seek(10000)
+        buffer = bytearray(6000)
+        while reader.tell() < 40000:
+            reader.readinto(buffer)
+        assert bytes(buffer) == path.read_bytes()[34000:40000]
+
+    assert dropped == [(10000, 18000), (28000, 12000)]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Upload log migrations
+# ─────────────────────────────────────────────────────────────────────────────
+def test_baseline_upload_log_migrates_to_current_schema(bulk_upload, no_upload_log):
+    # The upload_log table as the first release of the script created it
+    conn = sqlite3.connect(str(no_upload_log))
+    conn.execute('''
+        CREATE TABLE upload_log (
+            identifier TEXT,
+            filename TEXT,
+            size INTEGER,
+            uploaded INTEGER,
+            md5_hash TEXT,
+            PRIMARY KEY (identifier, filename)
+        )
+    ''')
+    conn.execute("INSERT INTO upload_log VALUES ('item', 'a.txt', 3, 1, 'abc')")
+    conn.commit()
+    conn.close()
+
+    bulk_upload.create_upload_log_db()
+    bulk_upload.create_upload_log_db()   # Already current: nothing to do
+
+    store = bulk_upload.get_upload_log_store()
+    assert store.query('PRAGMA user_version') == [(bulk_upload.UPLOAD_LOG_SCHEMA_VERSION,)]
+    assert bulk_upload.UPLOAD_LOG_SCHEMA_VERSION == 7
+    tables = {name for name, in store.query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'upload_log', 'multipart_uploads', 'multipart_parts', 'upload_attempts', 'scan_dirs',
+            'scan_files', 'ia_listings', 'ia_listing_files'} <= tables
+    columns = {row[1] for row in store.query('PRAGMA table_info(upload_log)')}
+    assert {'mtime_ns', 'inode', 'uploaded_at', 'attempts', 'deep_verified_at', 'archive'} <= columns
+    assert store.query('SELECT filename, size, uploaded, md5_hash, attempts, archive FROM upload_log') == [
+        ('a.txt', 3, 1, 'abc', None, None)]
+
+    bulk_upload.update_upload_log('item', [{'relative_path': 'a.txt', 'size': 4, 'uploaded': True,
+                                            'md5_hash': 'def', 'attempts': 1}])
+    assert store.query('SELECT size, md5_hash, attempts FROM upload_log') == [(4, 'def', 1)]